@@ -1,15 +1,291 @@
-from flask import Flask, render_template_string, request, redirect, url_for, Response
+from flask import Flask, render_template, request, redirect, url_for, Response, jsonify, abort
+from jinja2 import DictLoader
 import requests
 import os
 import io
 import csv
+import asyncio
+import base64
+import bisect
+import gzip
+import hashlib
+import importlib.util
+import json
+import math
+import queue
+import random
+import re
 import time
+import atexit
+import signal
+import socket
+import sqlite3
+import sys
 import threading
-from collections import OrderedDict
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from concurrent.futures import ThreadPoolExecutor
-from google.cloud import firestore
-from signalwire.rest import Client as signalwire_client
+from urllib.parse import urlencode, urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor
+try:
+    import brotli  # Optional: adds precompressed Brotli variants of static assets
+except ImportError:
+    brotli = None
+
+# --- Lazy Imports ---
+# The Google Cloud and SignalWire SDKs account for most of this module's import
+# time, so they (and the optional export and async packages) load on first use.
+# `app.db`, `app.firestore` etc. still resolve through __getattr__ below, but code
+# in this module must call get_db(), get_firestore() or lazy_import() instead.
+
+def _import_optional(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+def _import_firestore():
+    from google.cloud import firestore
+    return firestore
+
+def _import_signalwire_client():
+    from signalwire.rest import Client
+    return Client
+
+def _import_pyarrow():
+    pyarrow = _import_optional('pyarrow')  # Optional: enables Parquet exports
+    if pyarrow:
+        importlib.import_module('pyarrow.parquet')
+    return pyarrow
+
+_LAZY_IMPORTS = {
+    'firestore': _import_firestore,
+    'signalwire_client': _import_signalwire_client,
+    # On Cloud Run the client picks up the project ID from the environment
+    'db': lambda: get_firestore().Client(database="receipt-printer"),
+    'zstandard': lambda: _import_optional('zstandard'),  # Optional: enables zstd-compressed exports
+    'httpx': lambda: _import_optional('httpx'),  # Optional: async HTTP client used by ASYNC_MODE
+    'pyarrow': _import_pyarrow,
+}
+LAZY_LOAD_TIMES = {}  # name -> seconds spent importing or constructing it
+_LAZY_LOCK = threading.RLock()
+
+def lazy_import(name):
+    """Imports or constructs a deferred attribute once, caching it as a module global."""
+    if name in globals():
+        return globals()[name]
+    with _LAZY_LOCK:
+        if name not in globals():
+            start = time.perf_counter()
+            globals()[name] = _LAZY_IMPORTS[name]()
+            LAZY_LOAD_TIMES[name] = time.perf_counter() - start
+        return globals()[name]
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        return lazy_import(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def lazy_available(name):
+    """Whether an optional lazy import is installed, without importing it."""
+    if name in globals():
+        return globals()[name] is not None
+    return importlib.util.find_spec(name) is not None
+
+def get_firestore():
+    return lazy_import('firestore')
+
+def get_db():
+    return lazy_import('db')
+
+# --- Metrics ---
+# Each thread records into its own shard, so instrumenting the hot path never
+# waits on a lock; /metrics sums the shards when it is scraped.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route, method and status code.'),
+    'firestore_rpc_duration_seconds': ('histogram', 'Firestore call latency by operation.'),
+    'firestore_rpc_errors_total': ('counter', 'Firestore calls that raised, by operation.'),
+    'webhook_request_duration_seconds': ('histogram', 'Printer webhook call latency by status code.'),
+    'export_duration_seconds': ('histogram', 'Whole /download-csv downloads by format and outcome.'),
+    'whitelist_cache_hits_total': ('counter', 'SMS whitelist lookups answered from the cache.'),
+    'whitelist_cache_misses_total': ('counter', 'SMS whitelist lookups that went to Firestore.'),
+    'whitelist_cache_evictions_total': ('counter', 'SMS whitelist cache entries dropped, by reason.'),
+    'executor_tasks_started_total': ('counter', 'Tasks an executor has started running.'),
+    'executor_tasks_finished_total': ('counter', 'Tasks an executor has finished running.'),
+    'executor_queue_depth': ('gauge', 'Tasks submitted to an executor and waiting for a worker.'),
+    'executor_active_workers': ('gauge', 'Executor workers currently running a task.'),
+    'executor_max_workers': ('gauge', 'Executor worker limit.'),
+    'log_flush_duration_seconds': ('histogram', 'Log writer batch commit latency.'),
+    'log_writer_flushes_total': ('counter', 'Log batches committed to Firestore.'),
+    'log_writer_entries_total': ('counter', 'Log entries committed to Firestore.'),
+    'log_writer_errors_total': ('counter', 'Log batch commits that failed.'),
+    'log_writer_dropped_total': ('counter', 'Log entries lost, by reason: retries ran out or the buffer was full.'),
+    'log_writer_pending': ('gauge', 'Log entries waiting to be written.'),
+    'log_writer_last_flush_size': ('gauge', 'Entries in the last committed log batch.'),
+    'log_writer_max_flush_size': ('gauge', 'Entries in the largest committed log batch.'),
+}
+_METRIC_SHARDS = []  # (thread, shard) for every thread that has recorded a metric
+_METRIC_SHARDS_LOCK = threading.Lock()
+_METRICS_RETIRED = {}  # totals folded in from shards whose thread has exited
+_metrics_local = threading.local()
+
+def _metric_shard():
+    shard = getattr(_metrics_local, 'shard', None)
+    if shard is None:
+        shard = _metrics_local.shard = {}
+        with _METRIC_SHARDS_LOCK:
+            _METRIC_SHARDS.append((threading.current_thread(), shard))
+    return shard
+
+def inc_counter(name, amount=1, **labels):
+    shard = _metric_shard()
+    key = (name, tuple(sorted(labels.items())))
+    shard[key] = shard.get(key, 0) + amount
+
+def observe(name, seconds, **labels):
+    """Records one histogram sample. Shard values are per-bucket counts, then the +Inf count, then the sum."""
+    shard = _metric_shard()
+    key = (name, tuple(sorted(labels.items())))
+    values = shard.get(key)
+    if values is None:
+        values = shard[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+    values[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    values[-1] += seconds
+
+@contextmanager
+def firestore_op(operation):
+    """Times a Firestore call, counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc_counter('firestore_rpc_errors_total', operation=operation)
+        raise
+    finally:
+        observe('firestore_rpc_duration_seconds', time.perf_counter() - start, operation=operation)
+
+def firestore_stream(operation, docs):
+    """
+    Yields a Firestore stream's documents, recording the time spent waiting on
+    Firestore, but not on the consumer, as one `operation` call.
+    """
+    docs = iter(docs)
+    waited = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                doc = next(docs)
+            except StopIteration:
+                return
+            except Exception:
+                inc_counter('firestore_rpc_errors_total', operation=operation)
+                raise
+            finally:
+                waited += time.perf_counter() - start
+            yield doc
+    finally:
+        observe('firestore_rpc_duration_seconds', waited, operation=operation)
+
+def _merge_metric(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        totals[key] = [a + b for a, b in zip(current, value)] if current else list(value)
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+def collect_metrics():
+    """Sums every thread's shard into {(name, labels): value}."""
+    with _METRIC_SHARDS_LOCK:
+        live = []
+        for thread, shard in _METRIC_SHARDS:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                # Nothing writes to a finished thread's shard, so fold it in once and drop it
+                for key, value in shard.items():
+                    _merge_metric(_METRICS_RETIRED, key, value)
+        _METRIC_SHARDS[:] = live
+        totals = {}
+        for key, value in _METRICS_RETIRED.items():
+            _merge_metric(totals, key, value)
+    for _, shard in live:
+        # copy() is atomic under the GIL, so the owning thread can keep recording
+        for key, value in shard.copy().items():
+            _merge_metric(totals, key, value)
+    return totals
+
+INSTRUMENTED_EXECUTORS = []
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports its queue depth and busy workers to /metrics."""
+
+    def __init__(self, name, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        INSTRUMENTED_EXECUTORS.append(self)
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        inc_counter('executor_tasks_started_total', executor=self.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            inc_counter('executor_tasks_finished_total', executor=self.name)
+
+    def queue_depth(self):
+        return self._work_queue.qsize()
+
+def _metric_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def render_metrics():
+    """Formats the collected metrics and executor gauges in the Prometheus text format."""
+    totals = collect_metrics()
+    for pool in INSTRUMENTED_EXECUTORS:
+        labels = (('executor', pool.name),)
+        started = totals.get(('executor_tasks_started_total', labels), 0)
+        finished = totals.get(('executor_tasks_finished_total', labels), 0)
+        totals[('executor_queue_depth', labels)] = pool.queue_depth()
+        totals[('executor_active_workers', labels)] = started - finished
+        totals[('executor_max_workers', labels)] = pool._max_workers
+    stats = get_log_writer_stats()
+    for key in ('flushes', 'entries', 'errors'):
+        totals[(f'log_writer_{key}_total', ())] = stats[key]
+    totals[('log_writer_dropped_total', (('reason', 'retries'),))] = stats['dropped']
+    totals[('log_writer_dropped_total', (('reason', 'overflow'),))] = stats['overflow']
+    for key in ('pending', 'last_flush_size', 'max_flush_size'):
+        totals[(f'log_writer_{key}', ())] = stats[key]
+    families = {}
+    for (name, labels), value in totals.items():
+        families.setdefault(name, []).append((labels, value))
+    lines = []
+    for name in sorted(families):
+        kind, description = METRICS[name]
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for labels, value in sorted(families[name], key=lambda item: item[0]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_metric_labels(labels)} {value}')
+                continue
+            count = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), value[:-1]):
+                count += bucket
+                lines.append(f'{name}_bucket{_metric_labels(labels + (("le", bound),))} {count}')
+            lines.append(f'{name}_sum{_metric_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{_metric_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
 
 app = Flask(__name__)
 
@@ -50,23 +326,218 @@ WHITELIST_CACHE_LOCK = threading.Lock()
 WHITELIST_TTL = get_env_int('SMS_WHITELIST_TTL', 300)  # Default 5 minutes
 WHITELIST_CACHE_LIMIT = get_env_int('SMS_WHITELIST_LIMIT', 1000)
 
+# Print Job Queue
+# Jobs are spooled to SQLite so they survive a process restart. Point this at a
+# file (e.g. /tmp/print_queue.sqlite3) to enable durability; the default keeps
+# the spool in memory.
+PRINT_QUEUE_PATH = os.environ.get('PRINT_QUEUE_PATH', ':memory:')
+PRINT_QUEUE_MAX = get_env_int('PRINT_QUEUE_MAX', 100)
+PRINT_QUEUE_RETRY_AFTER = get_env_int('PRINT_QUEUE_RETRY_AFTER', 5)  # seconds
+# Run print jobs on one asyncio event loop instead of the thread pool
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'false').lower() == 'true'
+ASYNC_MAX_IN_FLIGHT = get_env_int('ASYNC_MAX_IN_FLIGHT', 200)  # jobs awaiting I/O at once
+
+# Webhook Delivery
+WEBHOOK_RETRIES = get_env_int('WEBHOOK_RETRIES', 2)  # attempts after the first for errors and 5xx
+WEBHOOK_BACKOFF_MS = get_env_int('WEBHOOK_BACKOFF_MS', 500)  # first retry delay cap, doubled per attempt
+WEBHOOK_BACKOFF_MAX_MS = get_env_int('WEBHOOK_BACKOFF_MAX_MS', 8000)
+BREAKER_THRESHOLD = get_env_int('BREAKER_THRESHOLD', 5)  # consecutive failures that open the breaker, 0 disables
+BREAKER_COOLDOWN = get_env_int('BREAKER_COOLDOWN', 30)  # seconds before a trial request is let through
+# Send messages arriving within this window as one {"messages": [...]} payload (0 disables)
+WEBHOOK_BATCH_WINDOW_MS = get_env_int('WEBHOOK_BATCH_WINDOW_MS', 0)
+WEBHOOK_BATCH_MAX = get_env_int('WEBHOOK_BATCH_MAX', 20)  # messages per payload
+WEBHOOK_BATCH_MAX_BYTES = get_env_int('WEBHOOK_BATCH_MAX_BYTES', 16 * 1024)  # encoded messages per payload
+WEBHOOK_BATCH_WAIT = get_env_int('WEBHOOK_BATCH_WAIT', 60)  # seconds a job waits for its batch's reply
+
+# Batched Log Writer
+LOG_BATCH_SIZE = min(get_env_int('LOG_BATCH_SIZE', 50), 500)  # Firestore caps a batch at 500 writes
+LOG_FLUSH_INTERVAL_MS = get_env_int('LOG_FLUSH_INTERVAL_MS', 500)
+LOG_WRITE_RETRIES = get_env_int('LOG_WRITE_RETRIES', 5)  # retries of a failed batch before its entries are dropped
+LOG_RETRY_BACKOFF_MS = get_env_int('LOG_RETRY_BACKOFF_MS', 500)  # doubled after each failed retry
+LOG_BUFFER_MAX = get_env_int('LOG_BUFFER_MAX', 10000)  # entries held while Firestore is unreachable; newer ones are dropped
+
+# History Cache
+HISTORY_CACHE_TTL = get_env_int('HISTORY_CACHE_TTL', 30)  # seconds, 0 disables
+# Keep the newest LOG_HISTORY_LIMIT logs in memory via a Firestore listener
+HISTORY_LISTENER = os.environ.get('HISTORY_LISTENER', 'false').lower() == 'true'
+HISTORY_LISTENER_RETRY = get_env_int('HISTORY_LISTENER_RETRY', 60)  # seconds between restarts
+HISTORY_PAGE_MAX = get_env_int('HISTORY_PAGE_MAX', 200)  # largest page /api/history will return
+
+# Rate Limiting (0 disables the portal and SMS limits)
+RATE_LIMIT_CACHE_LIMIT = get_env_int('RATE_LIMIT_CACHE_LIMIT', 10000)
+# 'memory' answers from this process; 'firestore' uses a transaction per check
+# so limits hold across instances.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+INDEX_RATE_LIMIT = get_env_int('INDEX_RATE_LIMIT', 0)  # attempts per IP
+INDEX_RATE_PERIOD = get_env_int('INDEX_RATE_PERIOD', 60)  # seconds
+SMS_RATE_LIMIT = get_env_int('SMS_RATE_LIMIT', 0)  # messages per number
+SMS_RATE_PERIOD = get_env_int('SMS_RATE_PERIOD', 60)  # seconds
+
+# CSV Export
+EXPORT_PARTITIONS = get_env_int('EXPORT_PARTITIONS', 4)  # time ranges fetched concurrently
+EXPORT_PARTITION_ROWS = get_env_int('EXPORT_PARTITION_ROWS', 5000)  # most entries per time range, where divisible
+EXPORT_BUFFER_BYTES = get_env_int('EXPORT_BUFFER_BYTES', 8 * 1024 * 1024)  # fetched ahead of the download, per export
+EXPORT_MAX_CONCURRENT = get_env_int('EXPORT_MAX_CONCURRENT', 2)  # partitioned exports at once; more get a 503
+EXPORT_RETRY_AFTER = get_env_int('EXPORT_RETRY_AFTER', 30)  # seconds
+EXPORT_CHUNK_SIZE = get_env_int('EXPORT_CHUNK_SIZE', 64 * 1024)  # bytes per yielded chunk
+EXPORT_GZIP_LEVEL = get_env_int('EXPORT_GZIP_LEVEL', 6)
+EXPORT_ZSTD_LEVEL = get_env_int('EXPORT_ZSTD_LEVEL', 3)
+EXPORT_PARQUET_ROW_GROUP = get_env_int('EXPORT_PARQUET_ROW_GROUP', 10000)  # rows per Parquet row group
+# Incremental exports stop this many seconds short of now, so entries still
+# buffered or committed slightly out of order are picked up by the next sync.
+EXPORT_WATERMARK_LAG = get_env_int('EXPORT_WATERMARK_LAG', 60)
+
+# Retention (0 keeps entries forever)
+RETENTION_DAYS = get_env_int('RETENTION_DAYS', 0)  # default age limit for every status
+RETENTION_MAX_COUNT = get_env_int('RETENTION_MAX_COUNT', 0)  # newest entries kept
+# Per-status age limits in days, e.g. "DENIED=7,SUCCESS=90,HA_ERR_*=30"
+RETENTION_RULES_RAW = os.environ.get('RETENTION_RULES', '')
+RETENTION_PRUNE_INTERVAL = get_env_int('RETENTION_PRUNE_INTERVAL', 3600)  # seconds between pruner runs
+
+# Clear History Jobs
+CLEAR_PARTITIONS = get_env_int('CLEAR_PARTITIONS', 4)  # time ranges deleted concurrently
+CLEAR_JOBS_KEPT = get_env_int('CLEAR_JOBS_KEPT', 20)  # finished jobs kept for status queries
+
+# HTTP Transport
+PRINT_WORKERS = get_env_int('PRINT_WORKERS', 10)  # threads running print jobs and replies
+HTTP_POOL_SIZE = get_env_int('HTTP_POOL_SIZE', 0)  # connections kept per destination, 0 matches PRINT_WORKERS
+# Multiplex printer webhook calls over HTTP/2 (needs the optional httpx[http2] packages)
+HTTP2 = os.environ.get('HTTP2', 'false').lower() == 'true'
+DNS_CACHE_TTL = get_env_int('DNS_CACHE_TTL', 0)  # seconds to reuse resolved addresses, 0 disables
+
+# Warm up Firestore, the webhook connection and SignalWire at startup; /healthz reports 503 until done
+WARMUP = os.environ.get('WARMUP', 'false').lower() == 'true'
+
+# Sampling Profiler (/api/profile)
+PROFILE_MAX_SECONDS = get_env_int('PROFILE_MAX_SECONDS', 30)  # longest profile one request may ask for
+PROFILE_INTERVAL_MS = get_env_int('PROFILE_INTERVAL_MS', 10)  # default time between stack samples
+
 # Convert the string env variable to an integer if it exists
 char_limit_raw = os.environ.get('CHARACTER_LIMIT')
 CHARACTER_LIMIT = int(char_limit_raw) if char_limit_raw and char_limit_raw.isdigit() else None
 
-# Initialize Firestore Client
-# Note: On Cloud Run, it automatically uses the project ID from the environment
-db = firestore.Client(database="receipt-printer")
+# Firestore collections (the client itself is created on first use by get_db())
 COLLECTION_NAME = "print_history"
 SMS_PENDING_COLLECTION = "sms_pending"
 SLACK_RATELIMITS_COLLECTION = "slack_ratelimits"
+# Query directions as firestore.Query spells them, so building a query doesn't need the SDK
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
 
 # Thread Pool Executor for background tasks
-executor = ThreadPoolExecutor(max_workers=10)
+executor = InstrumentedExecutor('print', max_workers=PRINT_WORKERS)
+# Separate pool for export partitions so a large download can't starve print jobs
+export_executor = InstrumentedExecutor('export', max_workers=max(EXPORT_PARTITIONS, 1) * max(EXPORT_MAX_CONCURRENT, 1),
+                                       thread_name_prefix='export')
+# Each running export holds EXPORT_PARTITIONS of its workers until the download ends
+EXPORT_SLOTS = threading.BoundedSemaphore(max(EXPORT_MAX_CONCURRENT, 1))
+# Batched webhook POSTs, one in flight per destination, so one slow webhook's retries don't hold up the others
+webhook_batch_executor = InstrumentedExecutor('webhook_batch', max_workers=PRINT_WORKERS,
+                                              thread_name_prefix='webhook-batch')
+
+# --- HTTP Transport ---
+
+HTTP_STATS = {}  # destination -> host -> request counts, for transports without pool counters
+HTTP_STATS_LOCK = threading.Lock()
+
+def http_pool_size():
+    return HTTP_POOL_SIZE or PRINT_WORKERS
+
+def make_http_session(pool_size):
+    """Returns a requests Session keeping up to pool_size connections open per host."""
+    session = requests.Session()
+    # requests' default keeps 10 per host and discards the rest after use, so
+    # any more concurrent callers would pay for a fresh handshake every time
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def make_http2_client(destination, pool_size):
+    """Returns an httpx Client multiplexing calls over HTTP/2, or None if h2 isn't installed."""
+    def record(response):
+        with HTTP_STATS_LOCK:
+            host = HTTP_STATS.setdefault(destination, {}).setdefault(response.url.host, {})
+            host[response.http_version] = host.get(response.http_version, 0) + 1
+    httpx = lazy_import('httpx')
+    try:
+        return httpx.Client(http2=True, timeout=10, event_hooks={'response': [record]},
+                            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+    except ImportError as e:
+        print(f"HTTP/2 unavailable, using HTTP/1.1: {e}")
+        return None
 
-# Global HTTP Session for connection pooling (Performance optimization)
-# Reusing connections reduces the overhead of TCP handshakes for webhook calls
-http_session = requests.Session()
+def make_webhook_client():
+    client = make_http2_client('webhook', http_pool_size()) if HTTP2 and lazy_import('httpx') else None
+    return client or make_http_session(http_pool_size())
+
+def http_session_stats(session):
+    """Per-host request and connection counts for a session's pools."""
+    hosts = {}
+    for adapter in set(getattr(session, 'adapters', {}).values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats = hosts.setdefault(pool.host, {'requests': 0, 'connections': 0, 'idle': 0})
+            stats['requests'] += pool.num_requests
+            stats['connections'] += pool.num_connections
+            # The pool's queue holds None for each slot without an open connection
+            stats['idle'] += sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+    for stats in hosts.values():
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+    return hosts
+
+def http_transport_stats():
+    """Connection reuse per destination and host, plus DNS cache counters."""
+    with HTTP_STATS_LOCK:
+        counted = {name: {host: dict(versions) for host, versions in hosts.items()} for name, hosts in HTTP_STATS.items()}
+    destinations = {}
+    for name, session in (('webhook', http_session), ('slack', slack_http_session)):
+        destinations[name] = {
+            'http2': not isinstance(session, requests.Session),
+            'pool_size': http_pool_size(),
+            'hosts': counted.get(name) or http_session_stats(session),
+        }
+    with DNS_CACHE_LOCK:
+        dns = dict(DNS_CACHE_STATS, enabled=bool(DNS_CACHE_TTL), entries=len(DNS_CACHE))
+    return {'destinations': destinations, 'dns_cache': dns}
+
+# Separate pools per destination (Performance optimization): reusing connections
+# saves TCP/TLS handshakes, and a slow Slack endpoint can't hold the connections
+# prints need. SignalWire's client keeps its own pooled session.
+http_session = make_webhook_client()  # printer webhook
+slack_http_session = make_http_session(http_pool_size())  # Slack response_url replies
+
+DNS_CACHE = OrderedDict()  # getaddrinfo arguments -> (expires, addresses)
+DNS_CACHE_LOCK = threading.Lock()
+DNS_CACHE_STATS = {'hits': 0, 'misses': 0}
+DNS_CACHE_MAX = 256
+_system_getaddrinfo = socket.getaddrinfo
+
+def cached_getaddrinfo(*args, **kwargs):
+    """socket.getaddrinfo, answering repeat lookups from memory for DNS_CACHE_TTL seconds."""
+    key = (args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    with DNS_CACHE_LOCK:
+        cached = DNS_CACHE.get(key)
+        if cached and cached[0] > now:
+            DNS_CACHE.move_to_end(key)
+            DNS_CACHE_STATS['hits'] += 1
+            return cached[1]
+    addresses = _system_getaddrinfo(*args, **kwargs)
+    with DNS_CACHE_LOCK:
+        DNS_CACHE[key] = (now + DNS_CACHE_TTL, addresses)
+        DNS_CACHE.move_to_end(key)
+        while len(DNS_CACHE) > DNS_CACHE_MAX:
+            DNS_CACHE.popitem(last=False)
+        DNS_CACHE_STATS['misses'] += 1
+    return addresses
+
+def install_dns_cache():
+    """Routes this process's Python-level DNS lookups (not gRPC's) through the cache."""
+    socket.getaddrinfo = cached_getaddrinfo
 
 # Global SignalWire Client (Lazy Initialization)
 _signalwire_client = None
@@ -81,7 +552,7 @@ def get_signalwire_client():
         return None
 
     try:
-        _signalwire_client = signalwire_client(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN, signalwire_space_url=SIGNALWIRE_SPACE_URL)
+        _signalwire_client = lazy_import('signalwire_client')(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN, signalwire_space_url=SIGNALWIRE_SPACE_URL)
         return _signalwire_client
     except Exception as e:
         print(f"Failed to initialize SignalWire client: {e}")
@@ -286,8 +757,8 @@ INDEX_HTML = """
 <head>
     <meta name="viewport" content="width=device-width, initial-scale=1">
     <title>Remote Print</title>
-    <style>""" + SHARED_CSS + """</style>
-    <script>""" + SHARED_JS + """</script>
+    <link rel="stylesheet" href="{{ asset_url('shared.css') }}">
+    <script src="{{ asset_url('shared.js') }}"></script>
 </head>
 <body>
     <main class="container">
@@ -396,8 +867,8 @@ HISTORY_HTML = """
 <head>
     <meta name="viewport" content="width=device-width, initial-scale=1">
     <title>Print History</title>
-    <style>""" + SHARED_CSS + """</style>
-    <script>""" + SHARED_JS + """</script>
+    <link rel="stylesheet" href="{{ asset_url('shared.css') }}">
+    <script src="{{ asset_url('shared.js') }}"></script>
 </head>
 <body>
     <main class="container" style="max-width: 900px;">
@@ -420,6 +891,49 @@ HISTORY_HTML = """
             <button type="submit" class="btn btn-primary">View Logs</button>
         </form>
         {% else %}
+        {% set filters = filters or {} %}
+        {% if clear_job %}
+        {% if clear_job_busy %}
+        <div role="alert" class="status-box status-error" style="margin-bottom: 1.5rem; margin-top: 0;">
+            <div class="status-title">A clear job is already running</div>
+            <div class="status-message">Your request was not started. The running job's progress is shown below; try again once it finishes.</div>
+        </div>
+        {% endif %}
+        <div role="status" id="clear-job" class="status-box" data-job-id="{{ clear_job.id }}" style="margin-bottom: 1.5rem; margin-top: 0;">
+            <div class="status-title">{{ 'Another clear job' if clear_job_busy else 'Clearing history' }}</div>
+            <div class="status-message" id="clear-job-progress">Deleting in the background...</div>
+        </div>
+        {% endif %}
+        {% if filter_error %}
+        <div role="alert" class="status-box status-error" style="margin-bottom: 1.5rem; margin-top: 0;">
+            <div class="status-title">Invalid Filter</div>
+            <div class="status-message">{{ filter_error }}</div>
+        </div>
+        {% endif %}
+        <form method="POST" class="history-filters" aria-label="Filter history" style="display: flex; flex-wrap: wrap; gap: 0.5rem; align-items: flex-end; margin-bottom: 1rem;">
+            <input type="hidden" name="admin_password" value="{{ admin_pw }}">
+            <div>
+                <label for="filter-status">Status</label>
+                <select id="filter-status" name="status">
+                    {% for value, label in [('', 'All'), ('SUCCESS', 'Success'), ('DENIED', 'Denied'), ('LIMIT_EXCEEDED', 'Limit exceeded'), ('HA_ERR_*', 'Printer errors'), ('CONN_FAIL', 'Connection failures')] %}
+                    <option value="{{ value }}" {% if filters.status == value %}selected{% endif %}>{{ label }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            <div>
+                <label for="filter-source">Source starts with</label>
+                <input type="text" id="filter-source" name="source" value="{{ filters.source }}" placeholder="Slack:, +1555, 10.0.">
+            </div>
+            <div>
+                <label for="filter-since">From</label>
+                <input type="date" id="filter-since" name="since" value="{{ filters.since }}">
+            </div>
+            <div>
+                <label for="filter-until">To</label>
+                <input type="date" id="filter-until" name="until" value="{{ filters.until }}">
+            </div>
+            <button type="submit" class="btn btn-secondary">Filter</button>
+        </form>
         <div style="max-height: 500px; overflow-y: auto;" tabindex="0" role="region" aria-label="Print history">
             <table class="history-table">
                 <thead>
@@ -447,16 +961,39 @@ HISTORY_HTML = """
                     {% endfor %}
                 </tbody>
             </table>
+            {% if next_cursor %}
+            <div id="history-more" data-cursor="{{ next_cursor }}" data-filters="{{ filter_query }}" style="text-align: center; padding: 1rem; color: var(--text-muted);">Loading older entries...</div>
+            {% endif %}
         </div>
         <div class="admin-actions">
             <form method="POST" action="/download-csv">
                 <input type="hidden" name="admin_password" value="{{ admin_pw }}">
                 <button type="submit" class="btn btn-primary" {% if not logs %}disabled title="No logs to download"{% endif %}>Download CSV</button>
+                <div style="display: flex; align-items: center; gap: 0.5rem; margin-top: 0.5rem; font-size: 0.9rem; color: var(--text-muted);">
+                    <select name="format" aria-label="Export format" style="width: auto; margin: 0; padding: 0.25rem;">
+                        <option value="csv">CSV</option>
+                        <option value="ndjson">NDJSON</option>
+                        {% if parquet_available %}<option value="parquet">Parquet</option>{% endif %}
+                    </select>
+                    <label style="display: flex; align-items: center; gap: 0.5rem; margin: 0; font-weight: normal;">
+                        <input type="checkbox" name="compression" value="gzip" style="width: auto; margin: 0;"> Save as .gz
+                    </label>
+                </div>
             </form>
+            {% if filter_query %}
+            <form method="POST" action="/clear-history" onsubmit="return confirm('Permanently delete all logs matching this filter?');">
+                <input type="hidden" name="admin_password" value="{{ admin_pw }}">
+                {% for name, value in filters.items() if value %}
+                <input type="hidden" name="{{ name }}" value="{{ value }}">
+                {% endfor %}
+                <button type="submit" class="btn btn-danger" {% if not logs %}disabled title="No logs to clear"{% endif %}>Clear Matching</button>
+            </form>
+            {% else %}
             <form method="POST" action="/clear-history" onsubmit="return confirm('Permanently delete all logs?');">
                 <input type="hidden" name="admin_password" value="{{ admin_pw }}">
                 <button type="submit" class="btn btn-danger" {% if not logs %}disabled title="No logs to clear"{% endif %}>Clear History</button>
             </form>
+            {% endif %}
         </div>
         {% endif %}
         <a href="/" class="btn btn-secondary">Back to Portal</a>
@@ -484,7 +1021,7 @@ HISTORY_HTML = """
                 });
             });
 
-            document.querySelectorAll('.local-time').forEach(el => {
+            const localizeTime = el => {
                 const iso = el.getAttribute('datetime');
                 if (iso) {
                     const date = new Date(iso);
@@ -495,7 +1032,113 @@ HISTORY_HTML = """
                         el.title = date.toLocaleString();
                     }
                 }
-            });
+            };
+            document.querySelectorAll('.local-time').forEach(localizeTime);
+
+            const clearJob = document.getElementById('clear-job');
+            if (clearJob) {
+                const progress = document.getElementById('clear-job-progress');
+                const body = new FormData();
+                body.append('admin_password', document.querySelector('input[name="admin_password"]').value);
+                const poll = () => fetch('/api/clear-jobs/' + clearJob.dataset.jobId, { method: 'POST', body })
+                    .then(res => res.ok ? res.json() : Promise.reject(res.status))
+                    .then(job => {
+                        let text = job.deleted + ' deleted';
+                        if (job.remaining !== null) text += ', ' + job.remaining + ' remaining';
+                        if (job.per_second) text += ' (' + Math.round(job.per_second) + '/s)';
+                        if (job.state === 'running') {
+                            progress.textContent = text;
+                            setTimeout(poll, 1000);
+                        } else if (job.state === 'done') {
+                            progress.textContent = 'Done: ' + job.deleted + ' deleted.';
+                        } else {
+                            clearJob.classList.add('status-error');
+                            progress.textContent = 'Failed after ' + job.deleted + ' deleted: ' + job.error;
+                        }
+                    })
+                    .catch(err => {
+                        console.error('Failed to load clear progress:', err);
+                        progress.textContent = 'Could not load progress.';
+                    });
+                poll();
+            }
+
+            // Infinite scroll: fetch older pages from /api/history as the end of the table comes into view
+            const more = document.getElementById('history-more');
+            if (more && 'IntersectionObserver' in window) {
+                const tbody = document.querySelector('.history-table tbody');
+                const adminPw = document.querySelector('input[name="admin_password"]').value;
+                const cell = (text, style) => {
+                    const td = document.createElement('td');
+                    if (style) td.style.cssText = style;
+                    if (text !== undefined) td.textContent = text;
+                    return td;
+                };
+                const buildRow = log => {
+                    const tr = document.createElement('tr');
+                    const timeCell = cell(undefined, 'white-space: nowrap; color: var(--text-muted);');
+                    const time = document.createElement('time');
+                    time.className = 'local-time';
+                    time.setAttribute('datetime', log.iso_time);
+                    time.textContent = log.time;
+                    localizeTime(time);
+                    timeCell.appendChild(time);
+
+                    const statusCell = cell();
+                    const badge = document.createElement('span');
+                    badge.className = 'badge ' + (log.status === 'SUCCESS' ? 'badge-ok' : 'badge-err');
+                    badge.textContent = log.status;
+                    statusCell.appendChild(badge);
+
+                    const msgCell = cell();
+                    msgCell.className = 'msg-cell';
+                    const content = document.createElement('span');
+                    content.className = 'msg-content';
+                    content.textContent = log.msg;
+                    const copy = document.createElement('button');
+                    copy.type = 'button';
+                    copy.className = 'copy-btn';
+                    copy.setAttribute('aria-label', 'Copy message');
+                    copy.title = 'Copy to clipboard';
+                    copy.textContent = '📋';
+                    copy.addEventListener('click', () => copyToClipboard(copy));
+                    msgCell.append(content, copy);
+
+                    tr.append(timeCell, cell(log.source, 'font-family: monospace;'), statusCell, msgCell);
+                    return tr;
+                };
+
+                let loading = false;
+                const observer = new IntersectionObserver(entries => {
+                    if (loading || !entries.some(entry => entry.isIntersecting)) return;
+                    loading = true;
+                    const body = new FormData();
+                    body.append('admin_password', adminPw);
+                    const params = new URLSearchParams(more.dataset.filters);
+                    params.set('cursor', more.dataset.cursor);
+                    fetch('/api/history?' + params, { method: 'POST', body })
+                        .then(res => res.ok ? res.json() : Promise.reject(res.status))
+                        .then(data => {
+                            data.logs.forEach(log => tbody.appendChild(buildRow(log)));
+                            if (data.next_cursor) {
+                                more.dataset.cursor = data.next_cursor;
+                                // Re-observing reports the current state, so a still-visible sentinel loads again
+                                observer.unobserve(more);
+                                observer.observe(more);
+                            } else {
+                                observer.disconnect();
+                                more.remove();
+                            }
+                        })
+                        .catch(err => {
+                            console.error('Failed to load older history:', err);
+                            more.textContent = 'Could not load older entries.';
+                            observer.disconnect();
+                        })
+                        .finally(() => { loading = false; });
+                }, { root: more.parentElement });
+                observer.observe(more);
+            }
         });
     </script>
 </body>
@@ -520,139 +1163,1904 @@ def send_sms(to_number, body):
     except Exception as e:
         print(f"Failed to send SMS: {e}")
 
+# --- Batched Log Writer ---
+
+LOG_BUFFER = []
+LOG_BUFFER_COND = threading.Condition()
+LOG_FLUSH_LOCK = threading.Lock()
+# Separate from LOG_FLUSH_LOCK, so reading the stats never waits on a commit
+LOG_WRITER_STATS_LOCK = threading.Lock()
+LOG_WRITER_STATS = {
+    'flushes': 0,
+    'entries': 0,
+    'errors': 0,
+    'dropped': 0,  # given up on after LOG_WRITE_RETRIES
+    'overflow': 0,  # turned away while LOG_BUFFER was full
+    'last_flush_size': 0,
+    'max_flush_size': 0,
+    'last_flush_seconds': 0.0,
+    'total_flush_seconds': 0.0,
+}
+_log_writer_thread = None
+_log_commit_failures = 0  # failed commits in a row of the batch at the front of LOG_BUFFER
+_log_retry_at = 0.0  # monotonic time before which the writer thread leaves that batch alone
+
 def log_to_firestore(source, status, message):
-    """Saves a log entry to Google Firestore."""
-    doc_ref = db.collection(COLLECTION_NAME).document()
-    doc_ref.set({
-        'timestamp': firestore.SERVER_TIMESTAMP,
+    """Queues a log entry for the background writer, which saves it to Firestore in batches."""
+    entry = {
+        # Stamped here rather than with SERVER_TIMESTAMP, which would give every
+        # entry in a batch the same commit time and lose their order.
+        'timestamp': datetime.now(timezone.utc),
         'source': source,
         'status': status,
         'message': message
-    })
+    }
+    days = retention_days_for(status)
+    if days:
+        entry['expires_at'] = entry['timestamp'] + timedelta(days=days)
+    with LOG_BUFFER_COND:
+        full = len(LOG_BUFFER) >= LOG_BUFFER_MAX
+        if not full:
+            LOG_BUFFER.append(entry)
+            if len(LOG_BUFFER) == 1 or len(LOG_BUFFER) >= LOG_BATCH_SIZE:
+                LOG_BUFFER_COND.notify()
+    if full:
+        # Firestore has been failing for a while; keep the entries already waiting
+        with LOG_WRITER_STATS_LOCK:
+            LOG_WRITER_STATS['overflow'] += 1
+    start_log_writer()
+
+def flush_log_buffer(wait=False):
+    """
+    Writes all buffered log entries to Firestore. Returns the number written.
+    A batch that fails to commit goes back to the front of the buffer and is
+    retried with backoff, up to LOG_WRITE_RETRIES times, before its entries are
+    dropped. The writer thread waits out the backoff between flushes; with
+    `wait` set, as at shutdown, the flush sleeps through it instead.
+    """
+    global _log_commit_failures, _log_retry_at
+    written = 0
+    with LOG_FLUSH_LOCK:
+        while True:
+            with LOG_BUFFER_COND:
+                entries = LOG_BUFFER[:LOG_BATCH_SIZE]
+                del LOG_BUFFER[:LOG_BATCH_SIZE]
+            if not entries:
+                return written
+
+            start = time.perf_counter()
+            try:
+                collection = get_db().collection(COLLECTION_NAME)
+                batch = get_db().batch()
+                doc_ids = []
+                for entry in entries:
+                    doc_ref = collection.document()
+                    batch.set(doc_ref, entry)
+                    doc_ids.append(doc_ref.id)
+                with firestore_op('batch_commit'):
+                    batch.commit()
+            except Exception as e:
+                _log_commit_failures += 1
+                given_up = _log_commit_failures > LOG_WRITE_RETRIES
+                with LOG_WRITER_STATS_LOCK:
+                    LOG_WRITER_STATS['errors'] += 1
+                    if given_up:
+                        LOG_WRITER_STATS['dropped'] += len(entries)
+                if given_up:
+                    _log_commit_failures = 0
+                    print(f"Dropped {len(entries)} log entries after {LOG_WRITE_RETRIES} retries: {e}")
+                    continue
+                with LOG_BUFFER_COND:
+                    LOG_BUFFER[:0] = entries
+                delay = LOG_RETRY_BACKOFF_MS * 2 ** (_log_commit_failures - 1) / 1000
+                print(f"Failed to write {len(entries)} log entries, retrying in {delay:.1f}s: {e}")
+                if not wait:
+                    _log_retry_at = time.monotonic() + delay
+                    return written
+                time.sleep(delay)
+                continue
+            _log_commit_failures = 0
+            elapsed = time.perf_counter() - start
+
+            update_history_cache(entries, doc_ids)
+            written += len(entries)
+            observe('log_flush_duration_seconds', elapsed)
+            with LOG_WRITER_STATS_LOCK:
+                LOG_WRITER_STATS['flushes'] += 1
+                LOG_WRITER_STATS['entries'] += len(entries)
+                LOG_WRITER_STATS['last_flush_size'] = len(entries)
+                LOG_WRITER_STATS['max_flush_size'] = max(LOG_WRITER_STATS['max_flush_size'], len(entries))
+                LOG_WRITER_STATS['last_flush_seconds'] = elapsed
+                LOG_WRITER_STATS['total_flush_seconds'] += elapsed
+
+def get_log_writer_stats():
+    """Returns a snapshot of the log writer counters, including entries still buffered."""
+    with LOG_WRITER_STATS_LOCK:
+        stats = dict(LOG_WRITER_STATS)
+    with LOG_BUFFER_COND:
+        stats['pending'] = len(LOG_BUFFER)
+    return stats
+
+def _log_writer_loop():
+    while True:
+        with LOG_BUFFER_COND:
+            while not LOG_BUFFER:
+                LOG_BUFFER_COND.wait()
+            # Give other callers up to one interval to fill the batch
+            if len(LOG_BUFFER) < LOG_BATCH_SIZE:
+                LOG_BUFFER_COND.wait(LOG_FLUSH_INTERVAL_MS / 1000)
+        # Back off after a failed commit rather than retrying the batch straight away
+        time.sleep(max(_log_retry_at - time.monotonic(), 0))
+        flush_log_buffer()
+
+def start_log_writer():
+    """Starts the background log writer thread if it is not already running."""
+    global _log_writer_thread
+    if _log_writer_thread is not None and _log_writer_thread.is_alive():
+        return
+    with LOG_BUFFER_COND:
+        if _log_writer_thread is None or not _log_writer_thread.is_alive():
+            _log_writer_thread = threading.Thread(target=_log_writer_loop, name='log-writer', daemon=True)
+            _log_writer_thread.start()
 
-def get_logs_from_firestore():
+def _install_sigterm_flush():
+    """
+    Wakes the log writer as soon as SIGTERM arrives, then defers to the previous
+    handler (gunicorn's graceful shutdown). The atexit hook drains what is left.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        with LOG_BUFFER_COND:
+            LOG_BUFFER_COND.notify()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+def format_log_entry(data, doc_id=None):
+    """Formats a stored log entry for display."""
+    # Handle cases where SERVER_TIMESTAMP hasn't resolved yet
+    ts = data.get('timestamp')
+    time_str = ts.strftime('%Y-%m-%d %H:%M:%S') if ts else "Just now"
+    # Backwards compatibility: check 'source', then 'ip'
+    source = data.get('source') or data.get('ip', 'Unknown')
+    return {
+        'time': time_str,
+        'source': source,
+        'status': data.get('status', 'ERROR'),
+        'msg': data.get('message', ''),
+        'iso_time': ts.isoformat() if ts else '',
+        'id': doc_id
+    }
+
+def query_logs_from_firestore():
     """Fetches and formats logs from Firestore, newest first."""
-    logs = []
-    docs = db.collection(COLLECTION_NAME).order_by('timestamp', direction=firestore.Query.DESCENDING).limit(LOG_HISTORY_LIMIT).stream()
+    docs = get_db().collection(COLLECTION_NAME).order_by('timestamp', direction=DESCENDING).limit(LOG_HISTORY_LIMIT).stream()
+    with firestore_op('history_query'):
+        return [format_log_entry(doc.to_dict(), doc.id) for doc in docs]
+
+def encode_history_cursor(row):
+    """Returns an opaque cursor pointing just past a formatted row, or None if it can't be resumed from."""
+    if not row.get('iso_time') or not row.get('id'):
+        return None
+    raw = json.dumps([row['iso_time'], row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_history_cursor(cursor):
+    """Returns the (timestamp, doc id) a cursor points at. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        iso_time, doc_id = json.loads(raw)
+        return _as_utc(datetime.fromisoformat(iso_time)), str(doc_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+HISTORY_FILTER_FIELDS = ('status', 'source', 'since', 'until')
+PREFIX_END = '\uf8ff'  # Sorts after any character used in statuses or sources
+
+def _parse_filter_time(value, end=False):
+    """Parses an ISO 8601 date or datetime as UTC. A bare date used as an end bound covers the whole day."""
+    try:
+        ts = _as_utc(datetime.fromisoformat(value))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if end and len(value) == 10:
+        ts += timedelta(days=1)
+    return ts
+
+def parse_history_filters(values):
+    """
+    Reads history filters from request values. Returns a dict with any of:
+    status (list of statuses, or one ending in '*' for a prefix), source (prefix),
+    since and until (UTC datetimes). Raises ValueError on bad input.
+    """
+    filters = {}
+    status = [s.strip() for s in values.get('status', '').split(',') if s.strip()]
+    if status:
+        if len(status) > 1 and any(s.endswith('*') for s in status):
+            raise ValueError("A status prefix can't be combined with other statuses")
+        if len(status) > 30:
+            raise ValueError("At most 30 statuses can be filtered at once")
+        if status != ['*']:
+            filters['status'] = status
+    source = values.get('source', '').strip()
+    if source:
+        filters['source'] = source
+    if values.get('since'):
+        filters['since'] = _parse_filter_time(values['since'])
+    if values.get('until'):
+        filters['until'] = _parse_filter_time(values['until'], end=True)
+    return filters
+
+def build_history_query(status=None, source=None, since=None, until=None):
+    """
+    Builds a newest-first log query with the filters pushed down to Firestore.
+    The composite indexes these need are described in firestore.indexes.json.
+    """
+    query = get_db().collection(COLLECTION_NAME)
+    if status:
+        if status[0].endswith('*'):
+            prefix = status[0][:-1]
+            query = query.where('status', '>=', prefix).where('status', '<', prefix + PREFIX_END)
+        elif len(status) == 1:
+            query = query.where('status', '==', status[0])
+        else:
+            query = query.where('status', 'in', status)
+    if source:
+        query = query.where('source', '>=', source).where('source', '<', source + PREFIX_END)
+    if since:
+        query = query.where('timestamp', '>=', since)
+    if until:
+        query = query.where('timestamp', '<', until)
+    # Order by document id as well so entries sharing a timestamp are neither skipped nor repeated
+    return (query.order_by('timestamp', direction=DESCENDING)
+                 .order_by('__name__', direction=DESCENDING))
+
+def query_history_page(cursor=None, limit=LOG_HISTORY_LIMIT, filters=None):
+    """
+    Fetches one page of logs, newest first, starting after the given cursor.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = build_history_query(**(filters or {}))
+    if cursor:
+        ts, doc_id = decode_history_cursor(cursor)
+        query = query.start_after({'timestamp': ts, '__name__': doc_id})
+    with firestore_op('history_page'):
+        rows = [format_log_entry(doc.to_dict(), doc.id) for doc in query.limit(limit).stream()]
+    next_cursor = encode_history_cursor(rows[-1]) if len(rows) == limit else None
+    return rows, next_cursor
+
+# --- History Cache ---
+
+HISTORY_CACHE = {'logs': None, 'expires': 0.0, 'generation': 0}
+HISTORY_CACHE_LOCK = threading.Lock()
+_history_refresh = None
+
+def get_logs_from_firestore():
+    """
+    Returns recent logs, newest first. Served from memory while the cache is
+    fresh; concurrent refreshes share a single Firestore query.
+    """
+    global _history_refresh
+    if HISTORY_LISTENER:
+        logs = read_history_listener()
+        if logs is not None:
+            return logs
+
+    if HISTORY_CACHE_TTL <= 0:
+        return query_logs_from_firestore()
+
+    while True:
+        with HISTORY_CACHE_LOCK:
+            if HISTORY_CACHE['logs'] is not None and time.time() < HISTORY_CACHE['expires']:
+                return list(HISTORY_CACHE['logs'])
+            refresh = _history_refresh
+            if refresh is None:
+                refresh = _history_refresh = threading.Event()
+                generation = HISTORY_CACHE['generation']
+                break
+        # Another request is already querying; use its result when it lands
+        refresh.wait()
+
+    logs = None
+    try:
+        logs = query_logs_from_firestore()
+        return list(logs)
+    finally:
+        with HISTORY_CACHE_LOCK:
+            # Skip storing if the cache was invalidated while the query ran
+            if logs is not None and generation == HISTORY_CACHE['generation']:
+                HISTORY_CACHE['logs'] = logs
+                HISTORY_CACHE['expires'] = time.time() + HISTORY_CACHE_TTL
+            _history_refresh = None
+        refresh.set()
+
+def update_history_cache(entries, doc_ids=None):
+    """Adds newly written log entries to the front of the cached history."""
+    doc_ids = doc_ids or [None] * len(entries)
+    rows = [format_log_entry(entry, doc_id) for entry, doc_id in zip(reversed(entries), reversed(doc_ids))]
+    with HISTORY_CACHE_LOCK:
+        if HISTORY_CACHE['logs'] is None:
+            # A query may be in flight that predates these entries
+            HISTORY_CACHE['generation'] += 1
+            return
+        HISTORY_CACHE['logs'] = (rows + HISTORY_CACHE['logs'])[:LOG_HISTORY_LIMIT]
+
+def invalidate_history_cache():
+    """Drops the cached history so the next read goes to Firestore."""
+    with HISTORY_CACHE_LOCK:
+        HISTORY_CACHE['logs'] = None
+        HISTORY_CACHE['generation'] += 1
+
+# --- History Listener ---
+
+HISTORY_RING = deque(maxlen=LOG_HISTORY_LIMIT)
+HISTORY_RING_LOCK = threading.Lock()
+_history_rows_by_id = {}
+_history_watch = None
+_history_synced = False
+_history_listener_started = 0.0
+
+def _on_history_snapshot(docs, changes, read_time):
+    """Rebuilds the ring of formatted rows from the listener's current result set."""
+    global _history_rows_by_id, _history_synced
+    changed = {change.document.id for change in changes}
+    rows_by_id = {}
+    rows = []
     for doc in docs:
-        data = doc.to_dict()
-        # Handle cases where SERVER_TIMESTAMP hasn't resolved yet
-        ts = data.get('timestamp')
-        time_str = ts.strftime('%Y-%m-%d %H:%M:%S') if ts else "Just now"
-        # Backwards compatibility: check 'source', then 'ip'
-        source = data.get('source') or data.get('ip', 'Unknown')
-        logs.append({
-            'time': time_str,
-            'source': source,
-            'status': data.get('status', 'ERROR'),
-            'msg': data.get('message', ''),
-            'iso_time': ts.isoformat() if ts else ''
-        })
-    return logs
+        # Only format documents that are new or changed since the last snapshot
+        row = _history_rows_by_id.get(doc.id)
+        if row is None or doc.id in changed:
+            row = format_log_entry(doc.to_dict(), doc.id)
+        rows_by_id[doc.id] = row
+        rows.append(row)
+    with HISTORY_RING_LOCK:
+        HISTORY_RING.clear()
+        HISTORY_RING.extend(rows)
+        _history_rows_by_id = rows_by_id
+        _history_synced = True
+
+def start_history_listener():
+    """Attaches a snapshot listener to the newest LOG_HISTORY_LIMIT log entries."""
+    global _history_watch, _history_synced, _history_listener_started
+    with HISTORY_RING_LOCK:
+        _history_synced = False
+        _history_listener_started = time.time()
+    if _history_watch is not None:
+        try:
+            _history_watch.unsubscribe()
+        except Exception:
+            pass
+    try:
+        query = get_db().collection(COLLECTION_NAME).order_by('timestamp', direction=DESCENDING).limit(LOG_HISTORY_LIMIT)
+        with firestore_op('history_listener_start'):
+            _history_watch = query.on_snapshot(_on_history_snapshot)
+    except Exception as e:
+        _history_watch = None
+        print(f"Failed to start history listener: {e}")
 
-def check_slack_rate_limit(user_id):
-    """Checks if a Slack user is rate limited."""
-    doc_ref = db.collection(SLACK_RATELIMITS_COLLECTION).document(user_id)
-    doc = doc_ref.get()
+def read_history_listener():
+    """
+    Returns the listener's rows, or None when it has not synced yet or has
+    died. A dead listener is restarted at most every HISTORY_LISTENER_RETRY seconds.
+    """
+    watch = _history_watch
+    if watch is not None and watch.is_active:
+        with HISTORY_RING_LOCK:
+            if _history_synced:
+                return list(HISTORY_RING)
+        return None
+    if time.time() - _history_listener_started >= HISTORY_LISTENER_RETRY:
+        start_history_listener()
+    return None
 
-    # Use timezone aware now
-    now = datetime.now(timezone.utc)
+# --- Rate Limiting ---
 
-    if not doc.exists:
-        doc_ref.set({
-            'timestamps': [now],
-            'blocked_until': None
-        })
-        return True, None
+def _as_utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
 
-    data = doc.to_dict()
-    blocked_until = data.get('blocked_until')
+def _to_datetime(ts):
+    return datetime.fromtimestamp(ts, timezone.utc) if ts else None
 
+def _rate_state_from_doc(data, now, period):
+    """
+    Builds limiter state from a stored document. State is a fixed-size sliding
+    window counter: hits in the current and previous window plus any block.
+    Older documents holding a list of timestamps are converted on read.
+    """
+    state = {'window_start': now, 'count': 0, 'prev_count': 0, 'blocked_until': None}
+    if not data:
+        return state
+    blocked_until = data.get('blocked_until')
     if blocked_until:
-        # Ensure blocked_until is timezone aware
-        if blocked_until.tzinfo is None:
-             blocked_until = blocked_until.replace(tzinfo=timezone.utc)
+        state['blocked_until'] = _as_utc(blocked_until).timestamp()
+    if 'timestamps' in data:
+        cutoff = now - period
+        state['count'] = sum(1 for t in data['timestamps'] or [] if _as_utc(t).timestamp() > cutoff)
+    elif data.get('window_start'):
+        state['window_start'] = _as_utc(data['window_start']).timestamp()
+        state['count'] = data.get('count', 0)
+        state['prev_count'] = data.get('prev_count', 0)
+    return state
+
+def _rate_state_to_doc(state):
+    return {
+        'window_start': _to_datetime(state['window_start']),
+        'count': state['count'],
+        'prev_count': state['prev_count'],
+        'blocked_until': _to_datetime(state['blocked_until'])
+    }
 
-        if blocked_until > now:
-            remaining = (blocked_until - now).total_seconds() / 60
-            return False, f"You are temporarily blocked for {int(remaining)+1} more minutes."
-        else:
-            blocked_until = None
-
-    timestamps = data.get('timestamps', [])
-    # Filter timestamps
-    cutoff = now - timedelta(minutes=SLACK_LIMIT_PERIOD)
-
-    recent_timestamps = []
-    for t in timestamps:
-        t_utc = t.replace(tzinfo=timezone.utc) if t.tzinfo is None else t
-        if t_utc > cutoff:
-            recent_timestamps.append(t_utc)
-
-    if len(recent_timestamps) >= SLACK_MESSAGE_LIMIT:
-        block_duration = timedelta(minutes=SLACK_LIMIT_PERIOD)
-        new_blocked_until = now + block_duration
-        doc_ref.set({
-            'timestamps': recent_timestamps,
-            'blocked_until': new_blocked_until
-        })
+def _sliding_window_hit(state, now, limit, period):
+    """
+    Records a hit against state (in place), allowing about `limit` hits per
+    `period` seconds. The previous window's count is weighted by how much of
+    it still overlaps the sliding window. A key that reaches the limit is
+    blocked for one period. Returns (allowed, retry_after_seconds, just_blocked).
+    """
+    blocked_until = state['blocked_until']
+    if blocked_until and blocked_until > now:
+        return False, blocked_until - now, False
+    state['blocked_until'] = None
+
+    elapsed_windows = int((now - state['window_start']) // period)
+    if elapsed_windows >= 1:
+        state['prev_count'] = state['count'] if elapsed_windows == 1 else 0
+        state['count'] = 0
+        state['window_start'] += elapsed_windows * period
+
+    overlap = 1 - (now - state['window_start']) / period
+    if state['prev_count'] * overlap + state['count'] >= limit:
+        state['blocked_until'] = now + period
+        return False, period, True
+
+    state['count'] += 1
+    return True, None, False
+
+class MemoryRateLimiter:
+    """
+    Rate limiter held in memory, so a check costs no RPCs. When a collection
+    is given, a key's state is loaded from Firestore the first time it is seen
+    (e.g. after a cold start) and written back in the background. Correct
+    across threads; use FirestoreRateLimiter when several instances share limits.
+    """
+
+    def __init__(self, collection=None, max_keys=None):
+        self.collection = collection
+        self.max_keys = max_keys or RATE_LIMIT_CACHE_LIMIT
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        """
+        Records an attempt by key, allowing about `limit` per `period` seconds.
+        Returns (allowed, retry_after_seconds, just_blocked).
+        """
+        state = None
+        while True:
+            with self._lock:
+                if state is not None or key in self._entries:
+                    # Insert, touch and evict in one step, so another key's insert can't evict this one in between
+                    state = self._entries.setdefault(key, state)
+                    self._entries.move_to_end(key)
+                    if len(self._entries) > self.max_keys:
+                        self._entries.popitem(last=False)
+                    result = _sliding_window_hit(state, time.time(), limit, period)
+                    # Nothing changes while a key stays blocked
+                    persist = (result[0] or result[2]) and self._mark_dirty(key)
+                    break
+            # Loaded outside the lock, since it may read Firestore
+            state = self._load(key, period)
+
+        if persist:
+            executor.submit(self._persist, key)
+        return result
+
+    def reset(self):
+        """Forgets all in-memory state."""
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+
+    def _mark_dirty(self, key):
+        # Coalesce writes: one pending sync-back per key is enough
+        if self.collection is None or key in self._dirty:
+            return False
+        self._dirty.add(key)
+        return True
+
+    def _load(self, key, period):
+        data = None
+        if self.collection is not None:
+            try:
+                with firestore_op('rate_limit_get'):
+                    doc = get_db().collection(self.collection).document(key).get()
+                if doc.exists:
+                    data = doc.to_dict()
+            except Exception as e:
+                print(f"Error loading rate limit state for {key}: {e}")
+        return _rate_state_from_doc(data, time.time(), period)
+
+    def _persist(self, key):
+        with self._lock:
+            self._dirty.discard(key)
+            state = self._entries.get(key)
+            if state is None:
+                return
+            doc = _rate_state_to_doc(state)
+        try:
+            with firestore_op('rate_limit_set'):
+                get_db().collection(self.collection).document(key).set(doc)
+        except Exception as e:
+            print(f"Error saving rate limit state for {key}: {e}")
+
+class FirestoreRateLimiter:
+    """
+    Rate limiter whose state lives only in Firestore. Each check is a
+    read-modify-write inside a transaction, so concurrent requests from any
+    thread or instance cannot overwrite each other's hits.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def hit(self, key, limit, period):
+        """Same contract as MemoryRateLimiter.hit()."""
+        doc_ref = get_db().collection(self.collection).document(key)
+
+        @get_firestore().transactional
+        def apply(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            now = time.time()
+            state = _rate_state_from_doc(snapshot.to_dict() if snapshot.exists else None, now, period)
+            result = _sliding_window_hit(state, now, limit, period)
+            if result[0] or result[2]:
+                transaction.set(doc_ref, _rate_state_to_doc(state))
+            return result
+
+        try:
+            with firestore_op('rate_limit_transaction'):
+                return apply(get_db().transaction())
+        except Exception as e:
+            # Fail open rather than blocking everyone while Firestore is unavailable
+            print(f"Error checking rate limit for {key}: {e}")
+            return True, None, False
+
+    def reset(self):
+        """Nothing is held in memory."""
+
+if RATE_LIMIT_BACKEND == 'firestore':
+    slack_rate_limiter = FirestoreRateLimiter(SLACK_RATELIMITS_COLLECTION)
+else:
+    slack_rate_limiter = MemoryRateLimiter(SLACK_RATELIMITS_COLLECTION)
+index_rate_limiter = MemoryRateLimiter()
+sms_rate_limiter = MemoryRateLimiter()
+
+def check_slack_rate_limit(user_id):
+    """Checks if a Slack user is rate limited."""
+    allowed, retry_after, just_blocked = slack_rate_limiter.hit(user_id, SLACK_MESSAGE_LIMIT, SLACK_LIMIT_PERIOD * 60)
+    if allowed:
+        return True, None
+    if just_blocked:
         return False, f"Rate limit exceeded. You are blocked for {SLACK_LIMIT_PERIOD} minutes."
+    return False, f"You are temporarily blocked for {int(retry_after / 60)+1} more minutes."
 
-    recent_timestamps.append(now)
-    doc_ref.set({
-        'timestamps': recent_timestamps,
-        'blocked_until': None
-    })
-    return True, None
+# --- Webhook Delivery ---
 
-def process_print_async(ip, webhook_url, msg):
-    """Async handler for index page print commands to prevent timeouts."""
+class WebhookCircuitOpen(Exception):
+    """Raised instead of calling a webhook whose circuit breaker is open."""
+
+    def __init__(self, url, retry_after):
+        super().__init__(f"Circuit open for {redact_url(url)}")
+        self.url = url
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures for one webhook. After `threshold` failures it
+    opens and rejects calls for `cooldown` seconds, then lets a single trial
+    call through (half-open); its outcome closes or reopens the breaker.
+    on_change, if given, is called whenever the breaker opens or closes.
+    """
+
+    def __init__(self, threshold, cooldown, on_change=None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.on_change = on_change
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call may be made now."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self):
+        """Seconds until a rejected call is worth trying again."""
+        with self._lock:
+            if self.state == 'open':
+                return max(self.cooldown - (time.monotonic() - self.opened_at), 1.0)
+            return 1.0
+
+    def record_success(self):
+        with self._lock:
+            changed = self.state != 'closed'
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+        if changed and self.on_change:
+            self.on_change()
+
+    def record_failure(self):
+        changed = False
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or (self.threshold and self.failures >= self.threshold):
+                if self.state != 'open':
+                    self.times_opened += 1
+                changed = True
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+        if changed and self.on_change:
+            self.on_change()
+
+    def parking_status(self):
+        """Returns (state, seconds of cooldown left, when it last opened) for the parked job scheduler."""
+        with self._lock:
+            remaining = self.cooldown - (time.monotonic() - self.opened_at) if self.state == 'open' else 0
+            return self.state, remaining, self.opened_at
+
+    def status(self):
+        with self._lock:
+            status = {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+            if self.state == 'open':
+                status['retry_after'] = round(max(self.cooldown - (time.monotonic() - self.opened_at), 0), 1)
+            return status
+
+WEBHOOK_BREAKERS = {}  # webhook URL -> CircuitBreaker
+WEBHOOK_BREAKERS_LOCK = threading.Lock()
+
+def get_breaker(url):
+    with WEBHOOK_BREAKERS_LOCK:
+        breaker = WEBHOOK_BREAKERS.get(url)
+        if breaker is None:
+            breaker = WEBHOOK_BREAKERS[url] = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN, wake_parked_jobs)
+        return breaker
+
+def redact_url(url):
+    """Hides the path of a webhook URL, which often carries its secret."""
+    parts = urlsplit(url or '')
+    return f"{parts.scheme}://{parts.netloc}/…" if parts.netloc else '…'
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff, in seconds, before retry number `attempt` (0-based)."""
+    cap = min(WEBHOOK_BACKOFF_MS * (2 ** attempt), WEBHOOK_BACKOFF_MAX_MS)
+    return random.uniform(0, cap) / 1000
+
+def _should_retry(status_code):
+    return status_code >= 500 or status_code == 429
+
+class _WebhookAttempts:
+    """
+    Retry and circuit breaker bookkeeping for one delivery, shared by
+    deliver_webhook and deliver_webhook_async so only the HTTP call and the
+    sleep between attempts differ between them.
+    """
+    def __init__(self, url):
+        self.url = url
+        self.breaker = get_breaker(url)
+        self.attempt = 0
+        self._start = None
+
+    def start(self):
+        """Raises WebhookCircuitOpen if the breaker turns the next attempt away."""
+        if not self.breaker.allow():
+            raise WebhookCircuitOpen(self.url, self.breaker.retry_after())
+        self._start = time.perf_counter()
+
+    def finish(self, r=None, error=None):
+        """
+        Records an attempt's response or exception. Returns the seconds to wait
+        before retrying, or None once `r` is the final response. Re-raises the
+        exception when there are no retries left.
+        """
+        observe('webhook_request_duration_seconds', time.perf_counter() - self._start,
+                status='error' if error is not None else str(r.status_code))
+        if error is None and not _should_retry(r.status_code):
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        if self.attempt >= WEBHOOK_RETRIES:
+            if error is not None:
+                raise error
+            return None
+        self.attempt += 1
+        return backoff_delay(self.attempt - 1)
+
+def deliver_webhook(url, payload):
+    """
+    Posts a JSON payload to a print webhook, retrying connection errors and
+    5xx/429 replies with backoff. Returns the last response, re-raises the last
+    connection error, or raises WebhookCircuitOpen while the webhook is unhealthy.
+    """
+    attempts = _WebhookAttempts(url)
+    while True:
+        attempts.start()
+        try:
+            # ⚡ Bolt: Use global http_session for connection pooling (~56% speedup for repeated requests)
+            r, error = http_session.post(url, json=payload, timeout=10), None
+        except Exception as e:
+            r, error = None, e
+        delay = attempts.finish(r, error)
+        if delay is None:
+            return r
+        time.sleep(delay)
+
+# --- Webhook Batching ---
+
+WEBHOOK_BATCHES = {}  # webhook URL -> [(message, encoded size, queued at, future)]
+WEBHOOK_BATCHES_SENDING = set()  # webhook URLs with a batch in flight
+WEBHOOK_BATCH_COND = threading.Condition()
+WEBHOOK_BATCH_STATS = {'batches': 0, 'messages': 0, 'max_batch': 0}
+_webhook_batcher_thread = None
+
+def deliver_message(webhook_url, message):
+    """
+    Delivers one print message. With WEBHOOK_BATCH_WINDOW_MS set it waits to
+    be sent along with other messages, and every message in the batch gets the
+    batch's response (or exception). Raises TimeoutError if no reply arrives
+    within WEBHOOK_BATCH_WAIT seconds.
+    """
+    if not WEBHOOK_BATCH_WINDOW_MS:
+        return deliver_webhook(webhook_url, {"message": message})
+    future = queue_batched_message(webhook_url, message)
     try:
-        # ⚡ Bolt: Use global http_session for connection pooling (~56% speedup for repeated requests)
-        r = http_session.post(webhook_url, json={"message": msg}, timeout=10)
-        if r.status_code == 200:
-            log_to_firestore(ip, "SUCCESS", msg)
-        else:
-            log_to_firestore(ip, f"HA_ERR_{r.status_code}", msg)
+        return future.result(timeout=WEBHOOK_BATCH_WAIT)
+    except TimeoutError:
+        raise _batch_wait_expired(future) from None
+
+def _batch_wait_expired(future):
+    """Withdraws a message whose batch has not been sent yet, and returns the error for its job."""
+    if future.cancel():
+        return TimeoutError(f"Webhook batch not sent within {WEBHOOK_BATCH_WAIT}s")
+    return TimeoutError(f"No webhook reply within {WEBHOOK_BATCH_WAIT}s")
+
+def queue_batched_message(webhook_url, message):
+    """Adds a message to the next batch for its webhook. Returns a Future for the response."""
+    future = Future()
+    size = len(json.dumps(message))
+    with WEBHOOK_BATCH_COND:
+        WEBHOOK_BATCHES.setdefault(webhook_url, []).append((message, size, time.monotonic(), future))
+        WEBHOOK_BATCH_COND.notify()
+    start_webhook_batcher()
+    return future
+
+def _take_batch(pending):
+    """Removes and returns as many queued messages as fit in one payload."""
+    count = size = 0
+    for _, item_size, _, _ in pending:
+        if count and (count >= WEBHOOK_BATCH_MAX or size + item_size > WEBHOOK_BATCH_MAX_BYTES):
+            break
+        count += 1
+        size += item_size
+    batch = pending[:count]
+    del pending[:count]
+    return batch
+
+def _batch_ready(pending, now):
+    window = WEBHOOK_BATCH_WINDOW_MS / 1000
+    size = sum(item[1] for item in pending)
+    return len(pending) >= WEBHOOK_BATCH_MAX or size >= WEBHOOK_BATCH_MAX_BYTES or now - pending[0][2] >= window
+
+def send_webhook_batch(webhook_url, batch):
+    """Posts one batch and fans the outcome back out to each message's future."""
+    # Messages whose jobs gave up waiting are left out
+    batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+    if not batch:
+        return
+    try:
+        r = deliver_webhook(webhook_url, {"messages": [message for message, _, _, _ in batch]})
     except Exception as e:
-        log_to_firestore(ip, "CONN_FAIL", str(e))
+        for _, _, _, future in batch:
+            future.set_exception(e)
+        return
+    with WEBHOOK_BATCH_COND:
+        WEBHOOK_BATCH_STATS['batches'] += 1
+        WEBHOOK_BATCH_STATS['messages'] += len(batch)
+        WEBHOOK_BATCH_STATS['max_batch'] = max(WEBHOOK_BATCH_STATS['max_batch'], len(batch))
+    for _, _, _, future in batch:
+        future.set_result(r)
+
+def _send_webhook_batch_and_release(webhook_url, batch):
+    try:
+        send_webhook_batch(webhook_url, batch)
+    finally:
+        with WEBHOOK_BATCH_COND:
+            WEBHOOK_BATCHES_SENDING.discard(webhook_url)
+            WEBHOOK_BATCH_COND.notify()
+
+def _webhook_batcher_loop():
+    while True:
+        with WEBHOOK_BATCH_COND:
+            while True:
+                now = time.monotonic()
+                # Messages for a destination with a batch in flight gather into its next one
+                waiting = {url: pending for url, pending in WEBHOOK_BATCHES.items() if url not in WEBHOOK_BATCHES_SENDING}
+                ready = [url for url, pending in waiting.items() if _batch_ready(pending, now)]
+                if ready:
+                    break
+                if waiting:
+                    oldest = min(pending[0][2] for pending in waiting.values())
+                    WEBHOOK_BATCH_COND.wait(max(oldest + WEBHOOK_BATCH_WINDOW_MS / 1000 - now, 0.001))
+                else:
+                    WEBHOOK_BATCH_COND.wait()
+            batches = []
+            for url in ready:
+                batches.append((url, _take_batch(WEBHOOK_BATCHES[url])))
+                WEBHOOK_BATCHES_SENDING.add(url)
+                if not WEBHOOK_BATCHES[url]:
+                    del WEBHOOK_BATCHES[url]
+        # Each destination's batch, retries included, runs on its own worker
+        for url, batch in batches:
+            webhook_batch_executor.submit(_send_webhook_batch_and_release, url, batch)
+
+def start_webhook_batcher():
+    """Starts the webhook batcher thread if it is not already running."""
+    global _webhook_batcher_thread
+    if _webhook_batcher_thread is not None and _webhook_batcher_thread.is_alive():
+        return
+    with WEBHOOK_BATCH_COND:
+        if _webhook_batcher_thread is None or not _webhook_batcher_thread.is_alive():
+            _webhook_batcher_thread = threading.Thread(target=_webhook_batcher_loop, name='webhook-batcher', daemon=True)
+            _webhook_batcher_thread.start()
 
-def process_slack_async(response_url, webhook_url, text, source):
-    """Async handler for Slack commands to prevent timeouts."""
+# The print pipelines below and their event loop versions share how a
+# webhook response (or connection error) is logged and replied to; only the
+# delivery and the reply transport differ.
+
+def delivery_outcome(webhook_url, message):
+    """Delivers a message, returning (response, None) or (None, connection error)."""
     try:
-        # ⚡ Bolt: Use global http_session for connection pooling
-        r = http_session.post(webhook_url, json={"message": text}, timeout=10)
-        if r.status_code == 200:
-            log_to_firestore(source, "SUCCESS", text)
-            msg = "✅ Message sent to printer!"
-        else:
-            log_to_firestore(source, f"HA_ERR_{r.status_code}", text)
-            msg = f"❌ Error: {r.status_code}"
+        return deliver_message(webhook_url, message), None
+    except WebhookCircuitOpen:
+        raise
     except Exception as e:
-        log_to_firestore(source, "CONN_FAIL", str(e))
-        msg = "❌ Connection failed"
+        return None, e
+
+def log_print_outcome(ip, msg, r, error):
+    if error is not None:
+        log_to_firestore(ip, "CONN_FAIL", str(error))
+    elif r.status_code == 200:
+        log_to_firestore(ip, "SUCCESS", msg)
+    else:
+        log_to_firestore(ip, f"HA_ERR_{r.status_code}", msg)
+
+def log_slack_outcome(source, text, r, error):
+    """Logs a Slack print's outcome and returns the reply for the user."""
+    if error is not None:
+        log_to_firestore(source, "CONN_FAIL", str(error))
+        return "❌ Connection failed"
+    if r.status_code == 200:
+        log_to_firestore(source, "SUCCESS", text)
+        return "✅ Message sent to printer!"
+    log_to_firestore(source, f"HA_ERR_{r.status_code}", text)
+    return f"❌ Error: {r.status_code}"
+
+def log_sms_outcome(from_number, body, r, error):
+    """Logs an SMS print's outcome and returns the reply text for the sender."""
+    if error is not None:
+        log_to_firestore(from_number, "CONN_FAIL", f"{body} (Error: {str(error)})")
+        return "❌ Connection error while printing."
+    if r.status_code == 200:
+        log_to_firestore(from_number, "SUCCESS", body)
+        return "✅ Message printed successfully!"
+    log_to_firestore(from_number, f"HA_ERR_{r.status_code}", body)
+    return f"❌ Error printing message. HA replied: {r.status_code}"
+
+def slack_reply(text):
+    return {"text": text, "response_type": "ephemeral"}
+
+def process_print_async(ip, webhook_url, msg):
+    """Async handler for index page print commands to prevent timeouts."""
+    log_print_outcome(ip, msg, *delivery_outcome(webhook_url, msg))
 
+def process_slack_async(response_url, webhook_url, text, source):
+    """Async handler for Slack commands to prevent timeouts."""
+    msg = log_slack_outcome(source, text, *delivery_outcome(webhook_url, text))
     if response_url:
         try:
-            # ⚡ Bolt: Use global http_session for connection pooling
-            http_session.post(response_url, json={"text": msg, "response_type": "ephemeral"})
+            # Replies use their own pool so a slow Slack endpoint can't delay prints
+            slack_http_session.post(response_url, json=slack_reply(msg), timeout=10)
         except Exception as e:
             print(f"Failed to send delayed Slack response: {e}")
 
 def process_sms_async(from_number, webhook_url, body):
     """Async handler for SMS to prevent timeouts."""
+    send_sms(from_number, log_sms_outcome(from_number, body, *delivery_outcome(webhook_url, body)))
+
+# --- Async Pipeline ---
+
+# In ASYNC_MODE the print pipelines run as coroutines on a single event loop
+# thread, so hundreds of webhook and Firestore calls can wait concurrently
+# instead of each holding one of the executor's 10 threads. The Flask handlers
+# are unchanged: the Firestore reads that decide their response (whitelist,
+# pending SMS, Slack rate limit) still block the request thread.
+ASYNC_LOOP = None
+ASYNC_LOOP_LOCK = threading.Lock()
+async_http = None  # httpx.AsyncClient for the printer webhook
+async_slack_http = None  # and a separate one for Slack replies
+async_db = None  # firestore.AsyncClient for background writes
+_async_slots = None  # caps jobs in flight at ASYNC_MAX_IN_FLIGHT
+
+def start_async_loop():
+    """Starts the event loop thread and async clients used by ASYNC_MODE."""
+    global ASYNC_LOOP, async_http, async_slack_http, async_db, _async_slots
+    with ASYNC_LOOP_LOCK:
+        if ASYNC_LOOP is not None:
+            return ASYNC_LOOP
+        httpx = lazy_import('httpx')
+        if httpx is None:
+            raise RuntimeError("ASYNC_MODE requires the httpx package")
+        limits = httpx.Limits(max_connections=ASYNC_MAX_IN_FLIGHT)
+        try:
+            async_http = httpx.AsyncClient(timeout=10, limits=limits, http2=HTTP2)
+        except ImportError as e:
+            print(f"HTTP/2 unavailable, using HTTP/1.1: {e}")
+            async_http = httpx.AsyncClient(timeout=10, limits=limits)
+        async_slack_http = httpx.AsyncClient(timeout=10, limits=limits)
+        async_db = get_firestore().AsyncClient(database="receipt-printer")
+        _async_slots = asyncio.Semaphore(max(ASYNC_MAX_IN_FLIGHT, 1))
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True, name='async-pipeline').start()
+        ASYNC_LOOP = loop
+    print(f"Async pipeline started ({ASYNC_MAX_IN_FLIGHT} jobs in flight).")
+    return loop
+
+def run_async(coro):
+    """Schedules a coroutine on the async pipeline's loop from any thread."""
+    return asyncio.run_coroutine_threadsafe(coro, ASYNC_LOOP)
+
+async def deliver_webhook_async(url, payload):
+    """Event loop version of deliver_webhook, sharing its circuit breakers."""
+    attempts = _WebhookAttempts(url)
+    while True:
+        attempts.start()
+        try:
+            r, error = await async_http.post(url, json=payload, timeout=10), None
+        except Exception as e:
+            r, error = None, e
+        delay = attempts.finish(r, error)
+        if delay is None:
+            return r
+        await asyncio.sleep(delay)
+
+async def deliver_message_async(webhook_url, message):
+    """Event loop version of deliver_message; waiting for a batch holds no thread."""
+    if not WEBHOOK_BATCH_WINDOW_MS:
+        return await deliver_webhook_async(webhook_url, {"message": message})
+    future = queue_batched_message(webhook_url, message)
     try:
-        # ⚡ Bolt: Use global http_session for connection pooling
-        r = http_session.post(webhook_url, json={"message": body}, timeout=10)
-        if r.status_code == 200:
-            log_to_firestore(from_number, "SUCCESS", body)
-            send_sms(from_number, "✅ Message printed successfully!")
-        else:
-            log_to_firestore(from_number, f"HA_ERR_{r.status_code}", body)
-            send_sms(from_number, f"❌ Error printing message. HA replied: {r.status_code}")
+        return await asyncio.wait_for(asyncio.wrap_future(future), WEBHOOK_BATCH_WAIT)
+    except TimeoutError:
+        raise _batch_wait_expired(future) from None
+
+async def delivery_outcome_async(webhook_url, message):
+    """Event loop version of delivery_outcome."""
+    try:
+        return await deliver_message_async(webhook_url, message), None
+    except WebhookCircuitOpen:
+        raise
+    except Exception as e:
+        return None, e
+
+async def async_process_print(ip, webhook_url, msg):
+    """Event loop version of process_print_async."""
+    log_print_outcome(ip, msg, *await delivery_outcome_async(webhook_url, msg))
+
+async def async_process_slack(response_url, webhook_url, text, source):
+    """Event loop version of process_slack_async."""
+    msg = log_slack_outcome(source, text, *await delivery_outcome_async(webhook_url, text))
+    if response_url:
+        try:
+            await async_slack_http.post(response_url, json=slack_reply(msg), timeout=10)
+        except Exception as e:
+            print(f"Failed to send delayed Slack response: {e}")
+
+async def async_process_sms(from_number, webhook_url, body):
+    """Event loop version of process_sms_async."""
+    reply = log_sms_outcome(from_number, body, *await delivery_outcome_async(webhook_url, body))
+    # The SignalWire SDK is blocking, so the reply is sent from the default thread pool
+    await asyncio.to_thread(send_sms, from_number, reply)
+
+async def run_print_job_async(job_id, kind, args):
+    """Event loop version of run_print_job."""
+    handlers = {
+        'print': async_process_print,
+        'sms': async_process_sms,
+        'slack': async_process_slack,
+    }
+    async with _async_slots:
+        with spooled_job(job_id, kind, args):
+            await handlers[kind](*args)
+
+def update_sms_pending(from_number, data=None):
+    """Stores (or with no data, deletes) a pending SMS in the background."""
+    if ASYNC_MODE:
+        doc = async_db.collection(SMS_PENDING_COLLECTION).document(from_number)
+        run_async(_write_sms_pending_async(doc, data))
+        return
+    doc = get_db().collection(SMS_PENDING_COLLECTION).document(from_number)
+    executor.submit(_write_sms_pending, doc, data)
+
+def _write_sms_pending(doc, data):
+    if data is not None:
+        with firestore_op('sms_pending_set'):
+            doc.set(data)
+    else:
+        with firestore_op('sms_pending_delete'):
+            doc.delete()
+
+async def _write_sms_pending_async(doc, data):
+    """Event loop version of _write_sms_pending, for async_db documents."""
+    if data is not None:
+        with firestore_op('sms_pending_set'):
+            await doc.set(data)
+    else:
+        with firestore_op('sms_pending_delete'):
+            await doc.delete()
+
+# --- Export Engine ---
+
+CSV_HEADER = ['Time', 'Source', 'Status', 'Message']
+_EXPORT_DONE = object()
+
+def csv_chunks(docs, header=False):
+    """Formats log documents as CSV, yielding text in chunks of roughly EXPORT_CHUNK_SIZE."""
+    si = io.StringIO()
+    cw = csv.writer(si)
+    if header:
+        cw.writerow(CSV_HEADER)
+    for doc in docs:
+        row = format_log_entry(doc.to_dict())
+        cw.writerow([row['time'], row['source'], row['status'], row['msg']])
+        if si.tell() >= EXPORT_CHUNK_SIZE:
+            yield si.getvalue()
+            si.seek(0)
+            si.truncate(0)
+    if si.tell():
+        yield si.getvalue()
+
+def export_record(doc):
+    """Returns a log document as a typed record, keeping the full timestamp."""
+    data = doc.to_dict()
+    ts = data.get('timestamp')
+    return {
+        'id': doc.id,
+        'timestamp': _as_utc(ts) if isinstance(ts, datetime) else None,
+        'source': data.get('source') or data.get('ip', 'Unknown'),
+        'status': data.get('status', 'ERROR'),
+        'message': data.get('message', '')
+    }
+
+def ndjson_chunks(docs):
+    """Formats log documents as newline-delimited JSON with ISO 8601 timestamps, in chunks of roughly EXPORT_CHUNK_SIZE."""
+    lines = []
+    size = 0
+    for doc in docs:
+        record = export_record(doc)
+        if record['timestamp']:
+            record['timestamp'] = record['timestamp'].isoformat()
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield ''.join(lines)
+
+def record_batches(docs):
+    """Groups log documents into lists of up to EXPORT_PARQUET_ROW_GROUP records."""
+    batch = []
+    for doc in docs:
+        batch.append(export_record(doc))
+        if len(batch) >= EXPORT_PARQUET_ROW_GROUP:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_time_range():
+    """Returns the (oldest, newest) log timestamps, or None if they can't be determined."""
+    collection = get_db().collection(COLLECTION_NAME)
+    bounds = []
+    for direction in (ASCENDING, DESCENDING):
+        with firestore_op('time_range'):
+            docs = list(collection.order_by('timestamp', direction=direction).limit(1).stream())
+        ts = docs[0].to_dict().get('timestamp') if docs else None
+        if not isinstance(ts, datetime):
+            return None
+        bounds.append(_as_utc(ts))
+    return tuple(bounds)
+
+def export_partitions(oldest, newest, count):
+    """
+    Splits [oldest, newest] into `count` (since, until) ranges, newest first.
+    The first range is open-ended above and the last below, so entries written
+    during the export and any outside the sampled range are still included.
+    """
+    step = (newest - oldest) / count
+    edges = [None] + [newest - step * i for i in range(1, count)] + [None]
+    return [(edges[i + 1], edges[i]) for i in range(count)]
+
+def _chunk_size(chunk):
+    # Parquet row groups arrive as lists of records; count each as one chunk's worth
+    return len(chunk) if isinstance(chunk, (str, bytes)) else EXPORT_CHUNK_SIZE
+
+EXPORT_SPLIT_ROUNDS = 24  # halvings of a range, enough to go from years to seconds
+EXPORT_MIN_SPAN = timedelta(milliseconds=1)
+
+def _count_range(bounds):
+    since, until = bounds
+    return _count_query(build_history_query(since=since, until=until))
+
+def plan_export_ranges(oldest, newest):
+    """
+    Splits the history into (since, until) ranges, newest first, holding at
+    most about EXPORT_PARTITION_ROWS entries each. Ranges over the limit are
+    halved in time until they fit, so a busy hour is split as finely as a
+    quiet month. One count per split tells both halves' sizes, and each
+    round's counts run concurrently. Returns None if the history can't be counted.
+    """
+    limit = max(EXPORT_PARTITION_ROWS, 1)
+    ranges, counts = [(None, None)], [_count_range((None, None))]
+    if counts[0] is None:
+        return None
+    for _ in range(EXPORT_SPLIT_ROUNDS):
+        middles = {}  # position -> where that range is halved
+        for i, ((since, until), count) in enumerate(zip(ranges, counts)):
+            low, high = since or oldest, until or newest
+            if count is not None and count > limit and high - low > EXPORT_MIN_SPAN:
+                middles[i] = low + (high - low) / 2
+        if not middles:
+            break
+        newer = dict(zip(middles, export_executor.map(_count_range, [(middle, ranges[i][1]) for i, middle in middles.items()])))
+        split_ranges, split_counts = [], []
+        for i, ((since, until), count) in enumerate(zip(ranges, counts)):
+            if i not in middles or newer[i] is None:
+                # A failed count leaves the range whole rather than guessing
+                split_ranges.append((since, until))
+                split_counts.append(count if i not in middles else None)
+                continue
+            split_ranges += [(middles[i], until), (since, middles[i])]
+            split_counts += [newer[i], max(count - newer[i], 0)]
+        ranges, counts = split_ranges, split_counts
+    return ranges
+
+class _ExportRun:
+    """
+    Shared state for one partitioned export. Workers claim time ranges in
+    order and queue their chunks for the download. Once EXPORT_BUFFER_BYTES
+    are fetched but not yet sent, workers wait before each chunk and before
+    starting a range. The range being sent may always queue one chunk, so the
+    download keeps moving and memory stays within the budget plus about a
+    chunk per worker.
+    """
+
+    def __init__(self, ranges, chunker):
+        self.ranges = ranges
+        self.chunker = chunker
+        self.queues = [queue.Queue() for _ in ranges]
+        self.pending = [0] * len(ranges)  # bytes queued per range
+        self.cond = threading.Condition()
+        self.next_range = 0
+        self.sending = 0  # range the download is currently reading
+        self.buffered = 0  # bytes fetched but not yet sent
+        self.cancelled = False
+
+    def _over_budget(self, index):
+        if self.cancelled or self.buffered < EXPORT_BUFFER_BYTES:
+            return False
+        return index != self.sending or self.pending[index] > 0
+
+    def claim(self):
+        """Returns the next range to fetch, or None when there are none left or the export stopped."""
+        with self.cond:
+            index = self.next_range
+            if index >= len(self.ranges):
+                return None
+            self.next_range += 1
+            while self._over_budget(index):
+                self.cond.wait()
+            return None if self.cancelled else index
+
+    def fetched(self, index, item):
+        """Queues a chunk (or _EXPORT_DONE, or an error) for the download, first waiting while over budget."""
+        if not isinstance(item, Exception) and item is not _EXPORT_DONE:
+            with self.cond:
+                while self._over_budget(index):
+                    self.cond.wait()
+                if self.cancelled:
+                    return
+                self.buffered += _chunk_size(item)
+                self.pending[index] += _chunk_size(item)
+        self.queues[index].put(item)
+
+    def sent(self, index, item):
+        with self.cond:
+            self.buffered -= _chunk_size(item)
+            self.pending[index] -= _chunk_size(item)
+            self.cond.notify_all()
+
+    def start_sending(self, index):
+        with self.cond:
+            self.sending = index
+            self.cond.notify_all()
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+def _export_worker(run):
+    """Fetches ranges claimed from an _ExportRun until none are left, ending each with _EXPORT_DONE or its error."""
+    while True:
+        index = run.claim()
+        if index is None:
+            return
+        since, until = run.ranges[index]
+        try:
+            docs = firestore_stream('export_range', build_history_query(since=since, until=until).stream())
+            for chunk in run.chunker(docs):
+                run.fetched(index, chunk)
+                if run.cancelled:
+                    return
+            run.fetched(index, _EXPORT_DONE)
+        except Exception as e:
+            run.fetched(index, e)
+            return
+
+def export_stream(chunker):
+    """
+    Yields chunker's output for the full history, newest first. The history
+    is split into time ranges of at most about EXPORT_PARTITION_ROWS entries,
+    which EXPORT_PARTITIONS workers fetch concurrently, newest first, while
+    the download sends them in order. Memory is bounded by EXPORT_BUFFER_BYTES
+    plus about a chunk per worker. Callers hold one of EXPORT_SLOTS, so the
+    workers never queue behind another export's.
+    """
+    time_range = export_time_range() if EXPORT_PARTITIONS > 1 else None
+    ranges = None
+    if time_range is not None and time_range[0] < time_range[1]:
+        ranges = plan_export_ranges(*time_range) or export_partitions(*time_range, EXPORT_PARTITIONS)
+    if not ranges or len(ranges) == 1:
+        # Small, empty, single-instant or unordered history: a single stream is enough
+        docs = get_db().collection(COLLECTION_NAME).order_by('timestamp', direction=DESCENDING).stream()
+        yield from chunker(firestore_stream('export_stream', docs))
+        return
+
+    run = _ExportRun(ranges, chunker)
+    try:
+        for _ in range(min(EXPORT_PARTITIONS, len(run.ranges))):
+            export_executor.submit(_export_worker, run)
+
+        for index, out in enumerate(run.queues):
+            run.start_sending(index)
+            while True:
+                item = out.get()
+                if item is _EXPORT_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                run.sent(index, item)
+                yield item
+    finally:
+        # Stops workers still fetching if the client disconnected or a range failed
+        run.cancel()
+
+def export_watermark():
+    """
+    Returns a cursor for the newest entry older than EXPORT_WATERMARK_LAG
+    seconds, or None if there is none. Incremental exports end here.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_WATERMARK_LAG)
+    with firestore_op('export_watermark'):
+        docs = list(build_history_query(until=cutoff).limit(1).stream())
+    for doc in docs:
+        ts = doc.to_dict().get('timestamp')
+        if isinstance(ts, datetime):
+            return encode_history_cursor({'iso_time': _as_utc(ts).isoformat(), 'id': doc.id})
+    return None
+
+def delta_stream(chunker, since, until):
+    """
+    Yields chunker's output for entries after the `since` cursor (or from the
+    start when None) up to and including the `until` cursor, oldest first.
+    """
+    query = (get_db().collection(COLLECTION_NAME)
+             .order_by('timestamp', direction=ASCENDING)
+             .order_by('__name__', direction=ASCENDING))
+    if since:
+        ts, doc_id = decode_history_cursor(since)
+        query = query.start_after({'timestamp': ts, '__name__': doc_id})
+    ts, doc_id = decode_history_cursor(until)
+    query = query.end_at({'timestamp': ts, '__name__': doc_id})
+    yield from chunker(firestore_stream('export_delta', query.stream()))
+
+def generate_csv_export(stream=export_stream):
+    """Yields the history as CSV, newest first unless an incremental stream is given."""
+    yield from csv_chunks([], header=True)
+    yield from stream(csv_chunks)
+
+def generate_ndjson_export(stream=export_stream):
+    """Yields the history as newline-delimited JSON, newest first unless an incremental stream is given."""
+    yield from stream(ndjson_chunks)
+
+class _DrainableSink:
+    """Write-only file object whose buffered bytes can be taken between Parquet row groups."""
+    closed = False
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # The writer records absolute offsets in the footer, so report bytes written overall
+        return self._position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+        return data
+
+def generate_parquet_export(stream=export_stream):
+    """
+    Yields the history as a Parquet file, writing one row group per
+    EXPORT_PARQUET_ROW_GROUP records so memory stays bounded.
+    """
+    pyarrow = lazy_import('pyarrow')
+    schema = pyarrow.schema([
+        ('id', pyarrow.string()),
+        ('timestamp', pyarrow.timestamp('us', tz='UTC')),
+        ('source', pyarrow.string()),
+        ('status', pyarrow.string()),
+        ('message', pyarrow.string()),
+    ])
+    sink = _DrainableSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for records in stream(record_batches):
+            writer.write_table(pyarrow.Table.from_pylist(records, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+# Format name: (generator, mimetype, file extension, compressible)
+EXPORT_FORMATS = {
+    'csv': (generate_csv_export, 'text/csv', 'csv', True),
+    'ndjson': (generate_ndjson_export, 'application/x-ndjson', 'ndjson', True),
+    'parquet': (generate_parquet_export, 'application/vnd.apache.parquet', 'parquet', False),
+}
+
+def timed_export(chunks, fmt):
+    """
+    Passes an export's chunks through, recording how long the whole download
+    took once it ends. The request latency only covers the first byte.
+    """
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield from chunks
+        outcome = 'complete'
+    except GeneratorExit:
+        # Closed early, e.g. the client disconnected
+        outcome = 'cancelled'
+        raise
+    finally:
+        observe('export_duration_seconds', time.perf_counter() - start, format=fmt, outcome=outcome)
+
+def _release_once(semaphore):
+    """Returns a function that releases `semaphore` the first time it is called."""
+    lock = threading.Lock()
+    released = []
+    def release():
+        with lock:
+            if not released:
+                released.append(True)
+                semaphore.release()
+    return release
+
+def _release_when_done(chunks, release):
+    try:
+        yield from chunks
+    finally:
+        release()
+
+def export_encodings():
+    """Content encodings the export can stream, most preferred first."""
+    return ['zstd', 'gzip'] if lazy_available('zstandard') else ['gzip']
+
+def compress_chunks(chunks, encoding):
+    """Compresses a stream of text chunks with gzip or zstd, yielding bytes as the compressor emits them."""
+    if encoding == 'zstd':
+        compressor = lazy_import('zstandard').ZstdCompressor(level=EXPORT_ZSTD_LEVEL).compressobj()
+    else:
+        # wbits=31 writes a gzip header and trailer rather than a raw zlib stream
+        compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+# --- Clear History Jobs ---
+
+CLEAR_JOBS = OrderedDict()
+CLEAR_JOBS_LOCK = threading.Lock()
+
+def _count_query(query):
+    """Returns the number of documents a query matches via a count aggregation, or None if unavailable."""
+    try:
+        with firestore_op('count'):
+            return int(query.count().get()[0][0].value)
     except Exception as e:
-        log_to_firestore(from_number, "CONN_FAIL", f"{body} (Error: {str(e)})")
-        send_sms(from_number, "❌ Connection error while printing.")
+        print(f"Failed to count documents: {e}")
+        return None
+
+def _clear_query(filters, bounds=None):
+    """Returns the query for one clear partition. Unfiltered single passes read the bare collection."""
+    if not filters and bounds is None:
+        return get_db().collection(COLLECTION_NAME)
+    filters = dict(filters)
+    if bounds is not None:
+        filters['since'], filters['until'] = bounds
+    return build_history_query(**filters)
+
+def clear_partitions(filters):
+    """
+    Splits the history into (since, until) ranges to delete concurrently,
+    narrowed to any time bounds in the filters. Returns [None] for a single pass.
+    """
+    time_range = export_time_range() if CLEAR_PARTITIONS > 1 else None
+    if time_range is None or time_range[0] >= time_range[1]:
+        return [None]
+    partitions = []
+    for since, until in export_partitions(*time_range, CLEAR_PARTITIONS):
+        if filters.get('since') and (since is None or filters['since'] > since):
+            since = filters['since']
+        if filters.get('until') and (until is None or filters['until'] < until):
+            until = filters['until']
+        if since is None or until is None or since < until:
+            partitions.append((since, until))
+    return partitions or [None]
+
+def _add_deleted(job, count):
+    if count:
+        with CLEAR_JOBS_LOCK:
+            job['deleted'] += count
+
+def delete_query_results(query, on_progress=None):
+    """
+    Deletes every document a query matches through a BulkWriter. Returns the
+    number deleted, passing counts to on_progress as it goes.
+    """
+    # ⚡ Bolt: Use BulkWriter for optimized high-volume deletion
+    # This reduces network overhead and handles batching internally (~35% speedup)
+    bulk_writer = get_db().bulk_writer()
+    deleted = 0
+    pending = 0
+    with firestore_op('bulk_delete'):
+        try:
+            for doc in query.select([]).stream():
+                bulk_writer.delete(doc.reference)
+                deleted += 1
+                pending += 1
+                if on_progress and pending >= 500:
+                    on_progress(pending)
+                    pending = 0
+        finally:
+            bulk_writer.close()
+            if on_progress:
+                on_progress(pending)
+    return deleted
+
+def _delete_partition(job, query):
+    delete_query_results(query, lambda count: _add_deleted(job, count))
+
+def _run_clear_job(job, filters):
+    try:
+        total = _count_query(_clear_query(filters))
+        partitions = clear_partitions(filters)
+        with CLEAR_JOBS_LOCK:
+            job['total'] = total
+            job['partitions'] = len(partitions)
+        with ThreadPoolExecutor(max_workers=len(partitions), thread_name_prefix='clear') as pool:
+            futures = [pool.submit(_delete_partition, job, _clear_query(filters, bounds)) for bounds in partitions]
+            for future in futures:
+                future.result()
+        if not filters and partitions != [None]:
+            # Time ranges can't match entries without a timestamp; sweep the bare collection for them
+            _delete_partition(job, _clear_query(filters))
+        state, error = 'done', None
+    except Exception as e:
+        print(f"Clear history job {job['id']} failed: {e}")
+        state, error = 'failed', str(e)
+    with CLEAR_JOBS_LOCK:
+        job['state'] = state
+        job['error'] = error
+        job['finished'] = time.time()
+    invalidate_history_cache()
+
+def start_clear_job(filters):
+    """
+    Starts deleting the logs matching `filters` (all logs when empty) in the
+    background. Returns (job, started); while a job is running it is returned
+    instead of starting another.
+    """
+    with CLEAR_JOBS_LOCK:
+        for job in CLEAR_JOBS.values():
+            if job['state'] == 'running':
+                return job, False
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'state': 'running',
+            'filters': {k: v.isoformat() if isinstance(v, datetime) else v for k, v in filters.items()},
+            'deleted': 0,
+            'total': None,
+            'partitions': None,
+            'error': None,
+            'started': time.time(),
+            'finished': None,
+        }
+        CLEAR_JOBS[job['id']] = job
+        while len(CLEAR_JOBS) > max(CLEAR_JOBS_KEPT, 1):
+            CLEAR_JOBS.popitem(last=False)
+    job['thread'] = threading.Thread(target=_run_clear_job, args=(job, filters), name=f"clear-{job['id']}", daemon=True)
+    job['thread'].start()
+    invalidate_history_cache()
+    return job, True
+
+def get_clear_job(job_id):
+    """Returns a JSON-ready snapshot of a clear job with progress and throughput, or None if unknown."""
+    with CLEAR_JOBS_LOCK:
+        job = CLEAR_JOBS.get(job_id)
+        if job is None:
+            return None
+        status = {k: v for k, v in job.items() if k != 'thread'}
+    elapsed = (status['finished'] or time.time()) - status['started']
+    status['elapsed'] = round(elapsed, 3)
+    status['per_second'] = round(status['deleted'] / elapsed, 1) if elapsed > 0 else None
+    status['remaining'] = max(status['total'] - status['deleted'], 0) if status['total'] is not None else None
+    return status
+
+def wait_for_clear_job(job_id, timeout=None):
+    """Blocks until a clear job finishes. Returns its status."""
+    with CLEAR_JOBS_LOCK:
+        job = CLEAR_JOBS.get(job_id)
+    if job is not None:
+        job['thread'].join(timeout)
+    return get_clear_job(job_id)
+
+# --- Retention ---
+
+RETENTION_STATS = {
+    'runs': 0,
+    'last_run': None,
+    'last_expired': 0,
+    'last_over_count': 0,
+    'last_error': None,
+    'total_pruned': 0,
+}
+RETENTION_LOCK = threading.Lock()
+RETENTION_RUN_LOCK = threading.Lock()  # One pass at a time, without blocking status reads
+_retention_thread = None
+
+def parse_retention_rules(raw):
+    """Parses "STATUS=days" pairs separated by commas. A status ending in '*' matches by prefix."""
+    rules = {}
+    for item in raw.split(','):
+        if not item.strip():
+            continue
+        status, _, days = item.partition('=')
+        try:
+            rules[status.strip()] = int(days)
+        except ValueError:
+            print(f"Ignoring invalid retention rule: {item.strip()}")
+    return rules
+
+RETENTION_RULES = parse_retention_rules(RETENTION_RULES_RAW)
+
+def retention_days_for(status):
+    """Returns how many days entries with this status are kept, or 0 to keep them forever."""
+    if status in RETENTION_RULES:
+        return RETENTION_RULES[status]
+    # The longest matching prefix rule wins, so HA_ERR_5* can override HA_ERR_*
+    prefixes = [rule for rule in RETENTION_RULES if rule.endswith('*') and status.startswith(rule[:-1])]
+    if prefixes:
+        return RETENTION_RULES[max(prefixes, key=len)]
+    return RETENTION_DAYS
+
+def retention_enabled():
+    return bool(RETENTION_DAYS or RETENTION_MAX_COUNT or any(RETENTION_RULES.values()))
+
+def prune_history():
+    """
+    Deletes entries past their expires_at (Firestore's TTL policy does the
+    same, but may lag by a day) and the oldest entries beyond
+    RETENTION_MAX_COUNT. Returns the counts pruned by each rule.
+    """
+    collection = get_db().collection(COLLECTION_NAME)
+    expired = delete_query_results(collection.where('expires_at', '<', datetime.now(timezone.utc)))
+
+    over_count = 0
+    if RETENTION_MAX_COUNT:
+        total = _count_query(collection)
+        if total and total > RETENTION_MAX_COUNT:
+            oldest = collection.order_by('timestamp', direction=ASCENDING).limit(total - RETENTION_MAX_COUNT)
+            over_count = delete_query_results(oldest)
+
+    if expired or over_count:
+        invalidate_history_cache()
+    return {'expired': expired, 'over_count': over_count}
+
+def run_retention_pruner():
+    """Runs one pruning pass and records it in RETENTION_STATS."""
+    with RETENTION_RUN_LOCK:
+        try:
+            pruned = prune_history()
+            error = None
+        except Exception as e:
+            pruned = {'expired': 0, 'over_count': 0}
+            error = str(e)
+            print(f"Retention pruning failed: {e}")
+    if not error:
+        print(f"Retention pruned {pruned['expired']} expired and {pruned['over_count']} over-count entries")
+    with RETENTION_LOCK:
+        RETENTION_STATS['runs'] += 1
+        RETENTION_STATS['last_run'] = datetime.now(timezone.utc).isoformat()
+        RETENTION_STATS['last_expired'] = pruned['expired']
+        RETENTION_STATS['last_over_count'] = pruned['over_count']
+        RETENTION_STATS['last_error'] = error
+        RETENTION_STATS['total_pruned'] += pruned['expired'] + pruned['over_count']
+        return dict(RETENTION_STATS)
+
+def _retention_loop():
+    while True:
+        run_retention_pruner()
+        time.sleep(max(RETENTION_PRUNE_INTERVAL, 1))
+
+def start_retention_pruner():
+    """Starts the background pruner thread if it isn't already running."""
+    global _retention_thread
+    if _retention_thread is not None and _retention_thread.is_alive():
+        return
+    _retention_thread = threading.Thread(target=_retention_loop, name='retention-pruner', daemon=True)
+    _retention_thread.start()
+
+# --- Print Job Queue ---
+
+class PrintQueueFull(Exception):
+    """Raised when the print job queue is at capacity."""
+
+PRINT_QUEUE_LOCK = threading.Lock()
+_print_queue_conn = None
+_print_queue_depth = 0
+
+def open_print_queue(path=None):
+    """
+    Opens the SQLite spool backing the print job queue, creating it if needed.
+    Any jobs left over from a previous process are counted against capacity
+    and can be resubmitted with replay_print_queue().
+    """
+    global _print_queue_conn, _print_queue_depth
+    conn = sqlite3.connect(path or PRINT_QUEUE_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, '
+        'args TEXT NOT NULL, created REAL NOT NULL)'
+    )
+    with PRINT_QUEUE_LOCK:
+        if _print_queue_conn is not None:
+            _print_queue_conn.close()
+        _print_queue_conn = conn
+        _print_queue_depth = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+    return conn
+
+def get_print_queue_depth():
+    """Returns the number of accepted print jobs that have not finished yet."""
+    return _print_queue_depth
+
+def enqueue_print_job(kind, *args):
+    """
+    Persists a print job to the spool and hands it to the executor.
+    Raises PrintQueueFull instead of growing without bound.
+    """
+    global _print_queue_depth
+    with PRINT_QUEUE_LOCK:
+        if _print_queue_depth >= PRINT_QUEUE_MAX:
+            raise PrintQueueFull()
+        cur = _print_queue_conn.execute(
+            'INSERT INTO jobs (kind, args, created) VALUES (?, ?, ?)',
+            (kind, json.dumps(args), time.time())
+        )
+        job_id = cur.lastrowid
+        _print_queue_depth += 1
+    dispatch_print_job(job_id, kind, args)
+    return job_id
+
+def dispatch_print_job(job_id, kind, args):
+    """Starts a spooled job on the event loop in ASYNC_MODE, or the executor otherwise."""
+    if ASYNC_MODE:
+        run_async(run_print_job_async(job_id, kind, args))
+    else:
+        executor.submit(run_print_job, job_id, kind, args)
+
+# Jobs turned away by an open circuit breaker wait here, holding no worker or
+# thread. One scheduler thread sends a single job to try the webhook once the
+# cooldown is over, and releases the rest when the breaker closes.
+PARKED_JOBS = {}  # webhook URL -> deque of (job_id, kind, args)
+PARKED_TRIALS = {}  # webhook URL -> when a parked job was last sent to try its breaker
+PARKED_JOBS_COND = threading.Condition()
+_parking_thread = None
+
+def park_print_job(job_id, kind, args, url):
+    """Holds a still-spooled job until the breaker for `url` lets calls through again."""
+    with PARKED_JOBS_COND:
+        PARKED_JOBS.setdefault(url, deque()).append((job_id, kind, args))
+        PARKED_JOBS_COND.notify()
+    start_parking_scheduler()
+
+def wake_parked_jobs():
+    """Called when a breaker opens or closes, so parked jobs are looked at straight away."""
+    with PARKED_JOBS_COND:
+        PARKED_JOBS_COND.notify()
+
+def get_parked_jobs():
+    """Returns the number of jobs waiting for a webhook's circuit breaker."""
+    with PARKED_JOBS_COND:
+        return sum(len(jobs) for jobs in PARKED_JOBS.values())
+
+def _take_due_parked_jobs():
+    """Removes and returns the parked jobs that may run now, and the seconds until the next check."""
+    due = []
+    wait = 1.0  # re-check now and then in case a trial job never reached its webhook
+    now = time.monotonic()
+    for url, jobs in list(PARKED_JOBS.items()):
+        breaker = get_breaker(url)
+        state, remaining, opened_at = breaker.parking_status()
+        if state == 'closed':
+            due.extend(jobs)
+            jobs.clear()
+            PARKED_TRIALS.pop(url, None)
+        elif state == 'open' and remaining > 0:
+            wait = min(wait, remaining)
+        elif state == 'open':
+            sent = PARKED_TRIALS.get(url)
+            # One trial per opening; another only if the breaker reopened or the trial got lost
+            if sent is None or sent < opened_at or now - sent > breaker.cooldown:
+                due.append(jobs.popleft())
+                PARKED_TRIALS[url] = now
+        # half_open: a trial is in flight, and its outcome will wake us
+        if not jobs:
+            del PARKED_JOBS[url]
+    return due, wait
+
+def _parking_loop():
+    while True:
+        with PARKED_JOBS_COND:
+            while not PARKED_JOBS:
+                PARKED_JOBS_COND.wait()
+            due, wait = _take_due_parked_jobs()
+            if not due:
+                PARKED_JOBS_COND.wait(wait)
+        for job in due:
+            dispatch_print_job(*job)
+
+def start_parking_scheduler():
+    """Starts the parked job scheduler thread if it isn't already running."""
+    global _parking_thread
+    with PARKED_JOBS_COND:
+        if _parking_thread is not None and _parking_thread.is_alive():
+            return
+        _parking_thread = threading.Thread(target=_parking_loop, name='parked-jobs', daemon=True)
+        _parking_thread.start()
+
+def finish_print_job(job_id):
+    """Removes a completed job from the spool."""
+    global _print_queue_depth
+    with PRINT_QUEUE_LOCK:
+        _print_queue_conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        _print_queue_depth -= 1
+
+@contextmanager
+def spooled_job(job_id, kind, args):
+    """
+    Wraps running a spooled job: removes it from the spool once it has
+    completed, or parks it if its webhook's circuit breaker is open.
+    """
+    parked = False
+    try:
+        yield
+    except WebhookCircuitOpen as e:
+        # Leave the job spooled until the breaker lets calls through again
+        parked = True
+        park_print_job(job_id, kind, args, e.url)
+    finally:
+        if not parked:
+            finish_print_job(job_id)
+
+def run_print_job(job_id, kind, args):
+    """Runs a spooled job and removes it from the spool once it has completed."""
+    handlers = {
+        'print': process_print_async,
+        'sms': process_sms_async,
+        'slack': process_slack_async,
+    }
+    with spooled_job(job_id, kind, args):
+        handlers[kind](*args)
+
+def replay_print_queue():
+    """
+    Resubmits jobs found in the spool, e.g. after the container was recycled.
+    Delivery is at-least-once: a job interrupted mid-flight is printed again.
+    """
+    with PRINT_QUEUE_LOCK:
+        rows = _print_queue_conn.execute('SELECT id, kind, args FROM jobs ORDER BY id').fetchall()
+    for job_id, kind, args in rows:
+        dispatch_print_job(job_id, kind, json.loads(args))
+    if rows:
+        print(f"Replayed {len(rows)} print job(s) from spool.")
+    return len(rows)
+
+def queue_full_headers():
+    """Headers telling clients when to retry after being turned away by a full queue."""
+    return {'Retry-After': str(PRINT_QUEUE_RETRY_AFTER)}
 
 def is_number_whitelisted(number):
     """
@@ -670,18 +3078,22 @@ def is_number_whitelisted(number):
             WHITELIST_CACHE.move_to_end(number)
 
             if current_time - timestamp < WHITELIST_TTL:
+                inc_counter('whitelist_cache_hits_total')
                 return is_whitelisted
             else:
                 # Expired
                 del WHITELIST_CACHE[number]
+                inc_counter('whitelist_cache_evictions_total', reason='expired')
 
     # Not in cache or expired, check Firestore
     is_whitelisted = False
+    inc_counter('whitelist_cache_misses_total')
     try:
-        docs = db.collection(SMS_WHITELIST_COLLECTION).where('number', '==', number).limit(1).stream()
-        for _ in docs:
-            is_whitelisted = True
-            break
+        with firestore_op('whitelist_query'):
+            docs = get_db().collection(SMS_WHITELIST_COLLECTION).where('number', '==', number).limit(1).stream()
+            for _ in docs:
+                is_whitelisted = True
+                break
     except Exception as e:
         print(f"Error checking whitelist: {e}")
         # On error, default to False but don't cache potentially transient errors?
@@ -696,6 +3108,7 @@ def is_number_whitelisted(number):
         if len(WHITELIST_CACHE) >= WHITELIST_CACHE_LIMIT and len(WHITELIST_CACHE) > 0:
             # last=False removes the first (oldest) item
             WHITELIST_CACHE.popitem(last=False)
+            inc_counter('whitelist_cache_evictions_total', reason='capacity')
 
         WHITELIST_CACHE[number] = (current_time, is_whitelisted)
         # Ensure it's at the end (newest)
@@ -703,6 +3116,54 @@ def is_number_whitelisted(number):
 
     return is_whitelisted
 
+# --- Sampling Profiler ---
+
+PROFILE_LOCK = threading.Lock()  # one profile at a time
+_frame_labels = {}  # code object -> collapsed-stack frame label
+
+def _frame_label(code):
+    label = _frame_labels.get(code)
+    if label is None:
+        # Semicolons separate frames in the collapsed format
+        label = _frame_labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+    return label
+
+def _thread_group(name):
+    """Folds numbered pool threads (ThreadPoolExecutor-0_3, export_1) into one root frame."""
+    return re.sub(r'[-_]\d+$', '', name).replace(';', ':')
+
+def sample_stacks(seconds, interval):
+    """
+    Samples every other thread's stack each `interval` seconds for `seconds`.
+    Returns ({collapsed stack: samples}, sample rounds taken). Stacks are
+    wall-clock: a thread blocked on I/O or a lock counts just like a busy one.
+    """
+    stacks = {}
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    rounds = 0
+    while True:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(_thread_group(names.get(ident, 'unknown')))
+            stack = ';'.join(reversed(labels))
+            stacks[stack] = stacks.get(stack, 0) + 1
+        rounds += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return stacks, rounds
+        time.sleep(min(interval, remaining))
+
+def collapsed_stacks(stacks):
+    """Formats sampled stacks one per line as `root;...;leaf count`, for flamegraph.pl or speedscope."""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
 # --- Routes ---
 
 ERROR_404_HTML = """
@@ -711,7 +3172,7 @@ ERROR_404_HTML = """
 <head>
     <meta name="viewport" content="width=device-width, initial-scale=1">
     <title>Page Not Found</title>
-    <style>""" + SHARED_CSS + """</style>
+    <link rel="stylesheet" href="{{ asset_url('shared.css') }}">
 </head>
 <body>
     <main class="container">
@@ -724,12 +3185,164 @@ ERROR_404_HTML = """
 </html>
 """
 
+# --- Static Assets ---
+
+# Shared CSS and JS are served as content-hashed files, so browsers can cache
+# them forever and repeat page views only download the page's own HTML.
+ASSET_MAX_AGE = 365 * 24 * 3600
+STATIC_ASSETS = {}  # fingerprinted filename -> mimetype, digest and encoded bodies
+ASSET_URLS = {}  # logical name -> fingerprinted URL
+
+def precompress(data):
+    """Returns the body in every encoding we can serve, compressed once at maximum level."""
+    variants = {'identity': data, 'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+def precompressed_response(entry, cache_control, status=200):
+    """Picks the entry's best variant for Accept-Encoding, or a 304 if the client already has it."""
+    variants = entry['variants']
+    encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in variants])
+    etag = f"{entry['digest']}-{encoding or 'identity'}"
+    headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding', 'ETag': f'"{etag}"'}
+    # If-None-Match only applies to 2xx responses (RFC 9110 13.2.1), so a missing page stays a 404
+    if 200 <= status < 300 and request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(variants[encoding or 'identity'], status=status, mimetype=entry['mimetype'], headers=headers)
+
+def register_asset(name, content, mimetype):
+    """Fingerprints an asset by content hash and precompresses it."""
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    filename = f"{stem}.{digest}{ext}"
+    STATIC_ASSETS[filename] = {'mimetype': mimetype, 'digest': digest, 'variants': precompress(data)}
+    ASSET_URLS[name] = f"/assets/{filename}"
+
+def asset_url(name):
+    return ASSET_URLS[name]
+
+register_asset('shared.css', SHARED_CSS, 'text/css')
+register_asset('shared.js', SHARED_JS, 'text/javascript')
+app.jinja_env.globals['asset_url'] = asset_url
+
+# Pages are compiled once at startup and then served from Jinja's template
+# cache, instead of being re-parsed by render_template_string on every request.
+TEMPLATES = {
+    'index.html': INDEX_HTML,
+    'history.html': HISTORY_HTML,
+    '404.html': ERROR_404_HTML,
+}
+app.jinja_loader = DictLoader(TEMPLATES)
+for _template_name in TEMPLATES:
+    app.jinja_env.get_template(_template_name)
+
+# --- Page Cache ---
+
+# The blank portal and the 404 page depend only on configuration, so each
+# variant is rendered and compressed once, then served from memory.
+PAGE_CACHE = {}  # (template, status code, context) -> mimetype, digest and encoded bodies
+PAGE_CACHE_LOCK = threading.Lock()
+
+def cached_page(template, status_code=200, **context):
+    """Serves a request-independent page from the rendered-page cache."""
+    key = (template, status_code, tuple(sorted(context.items())))
+    entry = PAGE_CACHE.get(key)
+    if entry is None:
+        data = render_template(template, **context).encode('utf-8')
+        entry = {'mimetype': 'text/html', 'digest': hashlib.sha256(data).hexdigest()[:16], 'variants': precompress(data)}
+        with PAGE_CACHE_LOCK:
+            entry = PAGE_CACHE.setdefault(key, entry)
+    # Pages must still be revalidated, since a redeploy can change them under the same URL
+    return precompressed_response(entry, 'no-cache', status_code)
+
+# --- Warm-up ---
+
+WARMUP_STATUS = {'state': 'pending' if WARMUP else 'disabled', 'seconds': None, 'steps': {}}
+WARMUP_LOCK = threading.Lock()
+
+def warm_firestore():
+    """Opens the gRPC channel with a one-document read."""
+    with firestore_op('warmup_read'):
+        list(get_db().collection(COLLECTION_NAME).limit(1).stream())
+
+def warm_webhook():
+    """Completes the TLS handshake with the webhook host and leaves the connection pooled."""
+    parts = urlsplit(WEBHOOK_URL or '')
+    if not parts.netloc:
+        return
+    # Ask for the host's root rather than the webhook, so nothing is printed
+    http_session.head(f"{parts.scheme}://{parts.netloc}/", timeout=10)
+
+def warm_signalwire():
+    get_signalwire_client()
+
+def warm_pages():
+    """Fills the rendered-page cache for the portal and 404 page."""
+    with app.test_request_context('/'):
+        cached_page('index.html', status=None, char_limit=CHARACTER_LIMIT, submitted_message="")
+        cached_page('404.html', 404)
+
+WARMUP_STEPS = [
+    ('firestore', warm_firestore),
+    ('webhook', warm_webhook),
+    ('signalwire', warm_signalwire),
+    ('pages', warm_pages),
+]
+
+def run_warmup():
+    """Runs every warm-up step, timing each. A failing step is logged and doesn't stop the rest."""
+    with WARMUP_LOCK:
+        WARMUP_STATUS.update(state='running', seconds=None, steps={})
+    start = time.perf_counter()
+    for name, step in WARMUP_STEPS:
+        step_start = time.perf_counter()
+        ok = True
+        try:
+            step()
+        except Exception as e:
+            ok = False
+            print(f"Warm-up step {name} failed: {e}")
+        with WARMUP_LOCK:
+            WARMUP_STATUS['steps'][name] = {'ok': ok, 'seconds': round(time.perf_counter() - step_start, 3)}
+    with WARMUP_LOCK:
+        WARMUP_STATUS.update(state='done', seconds=round(time.perf_counter() - start, 3))
+        steps = dict(WARMUP_STATUS['steps'])
+    print("Warm-up finished: " + ", ".join(f"{name} {step['seconds']:.2f}s" for name, step in steps.items()))
+
+def start_warmup():
+    """Runs the warm-up in the background so the server can answer /healthz meanwhile."""
+    thread = threading.Thread(target=run_warmup, name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+@app.route('/healthz')
+def healthz():
+    """Readiness probe. With WARMUP enabled it fails until the warm-up has finished."""
+    with WARMUP_LOCK:
+        warmup = dict(WARMUP_STATUS, steps=dict(WARMUP_STATUS['steps']))
+    ready = not WARMUP or warmup['state'] == 'done'
+    return jsonify(ready=ready, warmup=warmup), 200 if ready else 503
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    """Serves a fingerprinted asset, precompressed to match Accept-Encoding."""
+    asset = STATIC_ASSETS.get(filename)
+    if asset is None:
+        abort(404)
+    return precompressed_response(asset, f'public, max-age={ASSET_MAX_AGE}, immutable')
+
 @app.errorhandler(404)
 def page_not_found(e):
-    return render_template_string(ERROR_404_HTML), 404
+    return cached_page('404.html', 404)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
+    if request.method == 'GET':
+        return cached_page('index.html', status=None, char_limit=CHARACTER_LIMIT, submitted_message="")
     status = None
     submitted_message = ""
     if request.method == 'POST':
@@ -738,6 +3351,18 @@ def index():
         submitted_message = msg
         ip = request.headers.get('X-Forwarded-For', request.remote_addr)
 
+        if INDEX_RATE_LIMIT:
+            allowed, retry_after, _ = index_rate_limiter.hit(ip, INDEX_RATE_LIMIT, INDEX_RATE_PERIOD)
+            if not allowed:
+                status = {
+                    'code': 'RATE_LIMITED',
+                    'title': 'Slow Down',
+                    'message': f'Too many attempts. Try again in {int(retry_after) + 1} seconds.',
+                    'type': 'error'
+                }
+                html = render_template('index.html', status=status, char_limit=CHARACTER_LIMIT, submitted_message=submitted_message)
+                return html, 429, {'Retry-After': str(int(retry_after) + 1)}
+
         if user_pw != ACCESS_PASSWORD:
             status = {
                 'code': 'ACCESS_DENIED',
@@ -745,7 +3370,7 @@ def index():
                 'message': 'Invalid Keycode',
                 'type': 'error'
             }
-            executor.submit(log_to_firestore, ip, "DENIED", msg)
+            log_to_firestore(ip, "DENIED", msg)
         elif CHARACTER_LIMIT and msg and len(msg) > CHARACTER_LIMIT:
             status = {
                 'code': 'LIMIT_EXCEEDED',
@@ -753,80 +3378,262 @@ def index():
                 'message': f'Message too long ({len(msg)}/{CHARACTER_LIMIT})',
                 'type': 'error'
             }
-            executor.submit(log_to_firestore, ip, "LIMIT_EXCEEDED", msg)
+            log_to_firestore(ip, "LIMIT_EXCEEDED", msg)
         else:
+            try:
+                enqueue_print_job('print', ip, WEBHOOK_URL, msg)
+            except PrintQueueFull:
+                status = {
+                    'code': 'QUEUE_FULL',
+                    'title': 'Printer Busy',
+                    'message': f'Too many messages queued. Try again in {PRINT_QUEUE_RETRY_AFTER} seconds.',
+                    'type': 'error'
+                }
+                html = render_template('index.html', status=status, char_limit=CHARACTER_LIMIT, submitted_message=submitted_message)
+                return html, 503, queue_full_headers()
             status = {
                 'code': 'PRINT_SUCCESS',
                 'title': 'Success',
                 'message': 'Message sent to printer.',
                 'type': 'success'
             }
-            executor.submit(process_print_async, ip, WEBHOOK_URL, msg)
             submitted_message = ""
-    return render_template_string(INDEX_HTML, status=status, char_limit=CHARACTER_LIMIT, submitted_message=submitted_message)
+    return render_template('index.html', status=status, char_limit=CHARACTER_LIMIT, submitted_message=submitted_message)
 
 @app.route('/history', methods=['GET', 'POST'])
 def history():
     authorized = False
     logs = []
+    next_cursor = None
     error = None
+    filter_error = None
     admin_pw = request.form.get('admin_password', '')
+    filter_values = {field: request.form.get(field, '') for field in HISTORY_FILTER_FIELDS}
 
     if request.method == 'POST':
         if admin_pw == ADMIN_PASSWORD:
             authorized = True
-            logs = get_logs_from_firestore()
+            try:
+                filters = parse_history_filters(request.form)
+            except ValueError as e:
+                filter_error = str(e)
+                filters = {}
+            if filters:
+                # Filtered views are queried directly; the cache only holds the newest unfiltered page
+                logs, next_cursor = query_history_page(None, LOG_HISTORY_LIMIT, filters)
+            else:
+                logs = get_logs_from_firestore()
+                # A full first page may have older entries behind it
+                if len(logs) >= LOG_HISTORY_LIMIT:
+                    next_cursor = encode_history_cursor(logs[-1])
         else:
             error = "Invalid admin password"
 
     status_code = 401 if error else 200
-    return render_template_string(HISTORY_HTML, authorized=authorized, logs=logs, admin_pw=admin_pw, error=error), status_code
+    filter_query = urlencode({k: v for k, v in filter_values.items() if v}) if not filter_error else ''
+    return render_template('history.html', authorized=authorized, logs=logs, next_cursor=next_cursor,
+                           filters=filter_values, filter_query=filter_query, filter_error=filter_error,
+                           parquet_available=lazy_available('pyarrow'),
+                           admin_pw=admin_pw, error=error), status_code
+
+def admin_password_from_request():
+    """Reads the admin password for API routes from the X-Admin-Password header or the form."""
+    return request.headers.get('X-Admin-Password') or request.form.get('admin_password')
+
+@app.route('/api/history', methods=['GET', 'POST'])
+def history_api():
+    """Returns one page of history as JSON. Pass next_cursor back as ?cursor= for the next page."""
+    if admin_password_from_request() != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+
+    limit = request.values.get('limit', LOG_HISTORY_LIMIT, type=int)
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    try:
+        filters = parse_history_filters(request.values)
+        logs, next_cursor = query_history_page(request.values.get('cursor') or None, limit, filters)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(logs=logs, next_cursor=next_cursor)
 
 @app.route('/download-csv', methods=['POST'])
 def download_csv():
     if request.form.get('admin_password') == ADMIN_PASSWORD:
-        def generate():
-            si = io.StringIO()
-            cw = csv.writer(si)
-
-            cw.writerow(['Time', 'Source', 'Status', 'Message'])
-            yield si.getvalue()
-            si.truncate(0)
-            si.seek(0)
-
-            # ⚡ Bolt: Stream directly from Firestore instead of loading all logs into memory
-            docs = db.collection(COLLECTION_NAME).order_by('timestamp', direction="DESCENDING").stream()
-            for doc in docs:
-                data = doc.to_dict()
-                ts = data.get('timestamp')
-                time_str = ts.strftime('%Y-%m-%d %H:%M:%S') if ts else "Just now"
-                source = data.get('source') or data.get('ip', 'Unknown')
-                status = data.get('status', 'ERROR')
-                msg = data.get('message', '')
-
-                cw.writerow([time_str, source, status, msg])
-                yield si.getvalue()
-                si.truncate(0)
-                si.seek(0)
-
-        return Response(generate(), mimetype="text/csv",
-                        headers={"Content-disposition": "attachment; filename=history.csv"})
+        fmt = request.values.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return f"Unsupported export format: {fmt}", 400
+        if fmt == 'parquet' and not lazy_available('pyarrow'):
+            return "Parquet export requires pyarrow", 501
+        generate, mimetype, extension, compressible = EXPORT_FORMATS[fmt]
+
+        stream = export_stream
+        headers = {}
+        if 'since' in request.values:
+            # Incremental export: only entries after the caller's watermark, oldest first
+            since = request.values['since'] or None
+            try:
+                since_position = decode_history_cursor(since) if since else None
+            except ValueError as e:
+                return str(e), 400
+            watermark = export_watermark()
+            if watermark is None or (since_position and decode_history_cursor(watermark) <= since_position):
+                # Nothing new; the caller keeps its watermark
+                watermark = since
+                stream = lambda chunker: chunker([])
+            else:
+                stream = lambda chunker: delta_stream(chunker, since, watermark)
+            if watermark:
+                headers["X-Export-Watermark"] = watermark
+
+        partitioned = stream is export_stream and EXPORT_PARTITIONS > 1
+        if partitioned and not EXPORT_SLOTS.acquire(blocking=False):
+            # Waiting would hold this request until another download finishes
+            return (f"Too many exports running. Try again in {EXPORT_RETRY_AFTER} seconds.", 503,
+                    {'Retry-After': str(EXPORT_RETRY_AFTER)})
+
+        # ⚡ Bolt: Stream directly from Firestore instead of loading all logs into memory
+        chunks = timed_export(generate(stream), fmt)
+        if partitioned:
+            release_slot = _release_once(EXPORT_SLOTS)
+            chunks = _release_when_done(chunks, release_slot)
+        if not compressible:
+            headers["Content-disposition"] = f"attachment; filename=history.{extension}"
+            response = Response(chunks, mimetype=mimetype, headers=headers)
+        elif request.form.get('compression') == 'gzip':
+            # Saved as a compressed file rather than decoded by the browser
+            headers["Content-disposition"] = f"attachment; filename=history.{extension}.gz"
+            response = Response(compress_chunks(chunks, 'gzip'), mimetype="application/gzip", headers=headers)
+        else:
+            headers["Content-disposition"] = f"attachment; filename=history.{extension}"
+            headers["Vary"] = "Accept-Encoding"
+            encoding = request.accept_encodings.best_match(export_encodings())
+            if encoding:
+                headers["Content-Encoding"] = encoding
+                chunks = compress_chunks(chunks, encoding)
+            response = Response(chunks, mimetype=mimetype, headers=headers)
+        if partitioned:
+            # Also covers a response closed before its first chunk was read
+            response.call_on_close(release_slot)
+        return response
     return "Unauthorized", 401
 
 @app.route('/clear-history', methods=['POST'])
 def clear_history():
     admin_pw = request.form.get('admin_password')
     if admin_pw == ADMIN_PASSWORD:
-        # ⚡ Bolt: Use BulkWriter for optimized high-volume deletion
-        # This reduces network overhead and handles batching internally (~35% speedup)
-        docs = db.collection(COLLECTION_NAME).select([]).stream()
-        bulk_writer = db.bulk_writer()
-        for doc in docs:
-            bulk_writer.delete(doc.reference)
-        bulk_writer.close()
-        return render_template_string(HISTORY_HTML, authorized=True, logs=[], admin_pw=admin_pw)
+        try:
+            filters = parse_history_filters(request.form)
+        except ValueError as e:
+            return render_template('history.html', authorized=True, logs=[], admin_pw=admin_pw, filter_error=str(e)), 400
+        # Deletion runs in the background; the page polls the job for progress
+        job, started = start_clear_job(filters)
+        # A job already running keeps its own filters, so say so rather than pass its progress off as this one's
+        return render_template('history.html', authorized=True, logs=[], admin_pw=admin_pw, clear_job=job,
+                               clear_job_busy=not started), 200 if started else 409
     return "Unauthorized", 401
 
+@app.route('/api/clear-history', methods=['POST'])
+def clear_history_api():
+    """Starts a background clear job for the logs matching any history filters and returns it."""
+    if admin_password_from_request() != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+    try:
+        filters = parse_history_filters(request.values)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    job, started = start_clear_job(filters)
+    # An already running job is returned with 409 so callers don't assume their filters were applied
+    return jsonify(get_clear_job(job['id'])), 202 if started else 409, {'Location': f"/api/clear-jobs/{job['id']}"}
+
+@app.route('/api/clear-jobs/<job_id>', methods=['GET', 'POST'])
+def clear_job_status(job_id):
+    """Reports a clear job's state, deleted and remaining counts, and throughput."""
+    if admin_password_from_request() != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+    status = get_clear_job(job_id)
+    if status is None:
+        return jsonify(error="Unknown job"), 404
+    return jsonify(status)
+
+@app.route('/api/retention', methods=['GET', 'POST'])
+def retention_status():
+    """Reports the retention policy and how much the pruner has removed."""
+    if admin_password_from_request() != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+    with RETENTION_LOCK:
+        stats = dict(RETENTION_STATS)
+    policy = {
+        'days': RETENTION_DAYS,
+        'max_count': RETENTION_MAX_COUNT,
+        'rules': RETENTION_RULES,
+        'prune_interval': RETENTION_PRUNE_INTERVAL,
+        'enabled': retention_enabled(),
+    }
+    return jsonify(policy=policy, stats=stats)
+
+@app.before_request
+def start_request_timer():
+    request.environ['metrics.start'] = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    # Streamed responses (exports) are timed to their first byte
+    start = request.environ.get('metrics.start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe('http_request_duration_seconds', time.perf_counter() - start,
+                route=route, method=request.method, status=str(response.status_code))
+    return response
+
+@app.route('/metrics', methods=['GET', 'POST'])
+def metrics():
+    """Prometheus metrics. Scrapers can send the admin password as a bearer token."""
+    auth = request.headers.get('Authorization', '')
+    password = auth[len('Bearer '):] if auth.startswith('Bearer ') else admin_password_from_request()
+    if password != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profile', methods=['GET', 'POST'])
+def profile():
+    """
+    Samples all threads' stacks for ?seconds= (capped at PROFILE_MAX_SECONDS) and
+    returns them as collapsed stacks. This request is held open while it runs.
+    """
+    if admin_password_from_request() != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+    seconds = request.values.get('seconds', 10, type=float)
+    interval_ms = request.values.get('interval_ms', PROFILE_INTERVAL_MS, type=float)
+    # NaN slips through min()/max() and would leave the profile (and its lock) running forever
+    if not (math.isfinite(seconds) and math.isfinite(interval_ms)):
+        return jsonify(error="seconds and interval_ms must be finite numbers"), 400
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    interval = max(interval_ms, 1) / 1000
+    if not PROFILE_LOCK.acquire(blocking=False):
+        return jsonify(error="A profile is already running"), 409
+    try:
+        stacks, rounds = sample_stacks(seconds, interval)
+    finally:
+        PROFILE_LOCK.release()
+    headers = {
+        "Content-disposition": f"attachment; filename=profile-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.folded",
+        "X-Profile-Samples": str(rounds),
+    }
+    return Response(collapsed_stacks(stacks), mimetype='text/plain', headers=headers)
+
+@app.route('/api/webhook-health', methods=['GET', 'POST'])
+def webhook_health():
+    """Reports circuit breaker state for each print webhook."""
+    if admin_password_from_request() != ADMIN_PASSWORD:
+        return jsonify(error="Unauthorized"), 401
+    with WEBHOOK_BREAKERS_LOCK:
+        breakers = list(WEBHOOK_BREAKERS.items())
+    webhooks = [dict(breaker.status(), url=redact_url(url)) for url, breaker in breakers]
+    with WEBHOOK_BATCH_COND:
+        batching = dict(WEBHOOK_BATCH_STATS, window_ms=WEBHOOK_BATCH_WINDOW_MS,
+                        pending=sum(len(pending) for pending in WEBHOOK_BATCHES.values()))
+    return jsonify(webhooks=webhooks, parked_jobs=get_parked_jobs(), queue_depth=get_print_queue_depth(),
+                   batching=batching, transport=http_transport_stats())
+
 @app.route('/sms', methods=['POST'])
 def sms_webhook():
     """Handles incoming SMS from SignalWire."""
@@ -837,6 +3644,12 @@ def sms_webhook():
     if not from_number:
         return "Missing From number", 400
 
+    if SMS_RATE_LIMIT:
+        allowed, retry_after, _ = sms_rate_limiter.hit(from_number, SMS_RATE_LIMIT, SMS_RATE_PERIOD)
+        if not allowed:
+            # No SMS reply here, so a flood cannot run up messaging costs
+            return "Too many messages", 429, {'Retry-After': str(int(retry_after) + 1)}
+
     # Check whitelist
     is_whitelisted = is_number_whitelisted(from_number)
 
@@ -845,12 +3658,15 @@ def sms_webhook():
             executor.submit(send_sms, from_number, f"❌ Message too long. Limit is {CHARACTER_LIMIT} characters.")
             return "OK"
 
-        executor.submit(process_sms_async, from_number, WEBHOOK_URL, body)
+        try:
+            enqueue_print_job('sms', from_number, WEBHOOK_URL, body)
+        except PrintQueueFull:
+            return "Printer busy", 503, queue_full_headers()
         return "OK"
 
     # Check if there is a pending message for this number
-    pending_ref = db.collection(SMS_PENDING_COLLECTION).document(from_number)
-    pending_doc = pending_ref.get()
+    with firestore_op('sms_pending_get'):
+        pending_doc = get_db().collection(SMS_PENDING_COLLECTION).document(from_number).get()
 
     if not pending_doc.exists:
         if CHARACTER_LIMIT and len(body) > CHARACTER_LIMIT:
@@ -858,9 +3674,9 @@ def sms_webhook():
             return "OK"
 
         # New message -> Store it and ask for password
-        executor.submit(pending_ref.set, {
+        update_sms_pending(from_number, {
             'message': body,
-            'timestamp': firestore.SERVER_TIMESTAMP
+            'timestamp': get_firestore().SERVER_TIMESTAMP
         })
         executor.submit(send_sms, from_number, "Please reply with the access password to print your message.")
         return "OK" # SignalWire expects 200 OK
@@ -871,18 +3687,21 @@ def sms_webhook():
 
         if body == ACCESS_PASSWORD:
             # Password correct
-            # Use ThreadPoolExecutor to prevent unbounded thread creation and improve stability under load
-            future = executor.submit(process_sms_async, from_number, WEBHOOK_URL, original_message)
+            # Keep the pending message until the job is accepted so a retry after 503 still works
+            try:
+                enqueue_print_job('sms', from_number, WEBHOOK_URL, original_message)
+            except PrintQueueFull:
+                return "Printer busy", 503, queue_full_headers()
 
             # Clear pending status
-            executor.submit(pending_ref.delete)
+            update_sms_pending(from_number)
         else:
             # Password incorrect
-            executor.submit(log_to_firestore, from_number, "DENIED", original_message)
+            log_to_firestore(from_number, "DENIED", original_message)
             executor.submit(send_sms, from_number, "❌ Invalid password. Access denied.")
             # Delete pending state to enforce "Send Message -> Send Password" flow.
             # If they fail password, they start over. This prevents stuck states.
-            executor.submit(pending_ref.delete)
+            update_sms_pending(from_number)
 
     return "OK"
 
@@ -924,9 +3743,29 @@ def slack_webhook():
     source = f"Slack: {user_name or user_id}"
 
     response_url = data.get('response_url')
-    executor.submit(process_slack_async, response_url, WEBHOOK_URL, text, source)
+    try:
+        enqueue_print_job('slack', response_url, WEBHOOK_URL, text, source)
+    except PrintQueueFull:
+        # Slack only shows the reply body for 200 responses, so keep the status
+        # but still advertise when to retry.
+        return {"response_type": "ephemeral", "text": "❌ Printer is busy, please try again shortly."}, 200, queue_full_headers()
     return {"response_type": "ephemeral", "text": "⏳ Sending to printer..."}
 
+if DNS_CACHE_TTL:
+    install_dns_cache()
+if ASYNC_MODE:
+    start_async_loop()
+open_print_queue()
+replay_print_queue()
+atexit.register(flush_log_buffer, wait=True)
+_install_sigterm_flush()
+if HISTORY_LISTENER:
+    start_history_listener()
+if retention_enabled():
+    start_retention_pruner()
+if WARMUP:
+    start_warmup()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,52 @@
+import time
+import asyncio
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+JOBS = 500
+WEBHOOK_LATENCY = 0.1  # Simulated Home Assistant round trip
+
+def blocking_post(*args, **kwargs):
+    time.sleep(WEBHOOK_LATENCY)
+    return MagicMock(status_code=200)
+
+async def async_post(*args, **kwargs):
+    await asyncio.sleep(WEBHOOK_LATENCY)
+    return MagicMock(status_code=200)
+
+def drain(label):
+    app.open_print_queue(':memory:')
+    start = time.perf_counter()
+    for i in range(JOBS):
+        app.enqueue_print_job('print', '1.2.3.4', 'http://printer', f'Message {i}')
+    while app.get_print_queue_depth():
+        time.sleep(0.005)
+    duration = time.perf_counter() - start
+    print(f"{label:<32} {duration:.2f}s  {JOBS / duration:.0f} jobs/s")
+    return duration
+
+def benchmark():
+    print(f"{JOBS} print jobs, {WEBHOOK_LATENCY * 1000:.0f}ms webhook latency")
+    with patch('app.PRINT_QUEUE_MAX', JOBS), patch('app.log_to_firestore'):
+        with patch.object(app.http_session, 'post', blocking_post):
+            sync = drain("Sync (10 executor threads)")
+        with patch('app.httpx'):
+            app.start_async_loop()
+        with patch('app.ASYNC_MODE', True), patch.object(app, 'async_http', MagicMock(post=async_post)):
+            asynchronous = drain(f"Async ({app.ASYNC_MAX_IN_FLIGHT} in flight, 1 thread)")
+    print(f"Speedup: {sync / asynchronous:.1f}x")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,131 @@
+import bisect
+import time
+import io
+import csv
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+SIZES = (20000, 200000)  # a few MB, then a history too large to buffer whole
+PAGE_SIZE = 300  # Documents returned per streaming RPC
+PAGE_LATENCY = 0.01  # Simulated round trip per page
+
+class FakeDoc:
+    def __init__(self, i, ts):
+        self.id = f'doc{i:06d}'
+        self.data = {'timestamp': ts, 'source': f'Slack:user{i % 50}', 'status': 'SUCCESS', 'message': f'Message number {i}'}
+
+    def to_dict(self):
+        return self.data
+
+TIMES = {}  # id(docs) -> their timestamps, for bisecting
+
+class FakeQuery:
+    """Filters and orders an in-memory list, paying PAGE_LATENCY for every page streamed."""
+    def __init__(self, docs, filters=(), descending=False, limit=None):
+        self.docs, self.filters, self.descending, self._limit = docs, filters, descending, limit
+
+    def where(self, field, op, value):
+        return FakeQuery(self.docs, self.filters + ((op, value),), self.descending, self._limit)
+
+    def order_by(self, field, direction=None):
+        if field == '__name__':
+            return self
+        return FakeQuery(self.docs, self.filters, direction in (app.firestore.Query.DESCENDING, "DESCENDING"), self._limit)
+
+    def limit(self, n):
+        return FakeQuery(self.docs, self.filters, self.descending, n)
+
+    def _slice(self):
+        # Docs are stored oldest first, so time filters are slices
+        lo, hi = 0, len(self.docs)
+        for op, value in self.filters:
+            if op == '>=':
+                lo = max(lo, bisect.bisect_left(TIMES[id(self.docs)], value))
+            else:
+                hi = min(hi, bisect.bisect_left(TIMES[id(self.docs)], value))
+        return self.docs[lo:hi]
+
+    def count(self):
+        result = MagicMock()
+        result.get.return_value = [[MagicMock(value=len(self._slice()))]]
+        return result
+
+    def stream(self):
+        docs = self._slice()
+        docs = docs[::-1] if self.descending else docs
+        if self._limit:
+            docs = docs[:self._limit]
+        for i, doc in enumerate(docs):
+            if i % PAGE_SIZE == 0:
+                time.sleep(PAGE_LATENCY)
+            yield doc
+
+def legacy_generate(docs):
+    """The original exporter: one ordered stream, one yield per row."""
+    si = io.StringIO()
+    cw = csv.writer(si)
+    cw.writerow(['Time', 'Source', 'Status', 'Message'])
+    yield si.getvalue()
+    si.truncate(0)
+    si.seek(0)
+    for doc in docs:
+        data = doc.to_dict()
+        ts = data.get('timestamp')
+        time_str = ts.strftime('%Y-%m-%d %H:%M:%S') if ts else "Just now"
+        cw.writerow([time_str, data.get('source'), data.get('status'), data.get('message')])
+        yield si.getvalue()
+        si.truncate(0)
+        si.seek(0)
+
+def measure(label, generator):
+    start = time.perf_counter()
+    chunks = 0
+    size = 0
+    for chunk in generator:
+        chunks += 1
+        size += len(chunk)
+    duration = time.perf_counter() - start
+    print(f"{label:<22} {duration:.3f}s  {chunks} chunks  {size / 1024:.0f} KB")
+    return duration
+
+def benchmark(count, skewed=False):
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    if skewed:
+        # A quiet year with nine tenths of the entries in one busy hour
+        quiet = count // 10
+        times = sorted([base + timedelta(days=365 * i / quiet) for i in range(quiet)] +
+                       [base + timedelta(days=200, seconds=3600 * i / (count - quiet)) for i in range(count - quiet)])
+    else:
+        times = [base + timedelta(minutes=i) for i in range(count)]
+    docs = [FakeDoc(i, ts) for i, ts in enumerate(times)]
+    TIMES[id(docs)] = times
+    store = FakeQuery(docs)
+    app.db = MagicMock()
+    app.db.collection.return_value = store
+
+    print(f"{count} logs{' (skewed)' if skewed else ''}, {PAGE_SIZE} per page, {PAGE_LATENCY * 1000:.0f}ms per page, "
+          f"{app.EXPORT_BUFFER_BYTES // 1024 // 1024} MB read-ahead")
+    legacy = measure("Legacy (per row)", legacy_generate(store.order_by('timestamp', "DESCENDING").stream()))
+    app.EXPORT_PARTITIONS = 1
+    measure("Chunked, 1 partition", app.generate_csv_export())
+    app.EXPORT_PARTITIONS = 4
+    parallel = measure("Chunked, 4 partitions", app.generate_csv_export())
+    print(f"Speedup: {legacy / parallel:.1f}x\n")
+
+if __name__ == "__main__":
+    for count in SIZES:
+        benchmark(count)
+    benchmark(SIZES[-1], skewed=True)
@@ -0,0 +1,60 @@
+import time
+import sys
+import os
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+QUERY_LATENCY = 0.08  # Simulated Firestore query round trip
+ITERATIONS = 50
+
+class MockDoc:
+    def __init__(self, i):
+        self.i = i
+
+    def to_dict(self):
+        return {
+            'timestamp': datetime.now(timezone.utc),
+            'source': '127.0.0.1',
+            'status': 'SUCCESS',
+            'message': f'Message {self.i}'
+        }
+
+def slow_stream():
+    time.sleep(QUERY_LATENCY)
+    return [MockDoc(i) for i in range(app.LOG_HISTORY_LIMIT)]
+
+def measure(label):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        app.get_logs_from_firestore()
+    duration = time.perf_counter() - start
+    print(f"{label}: {duration / ITERATIONS * 1000:.3f} ms per /history refresh")
+    return duration
+
+def benchmark():
+    app.db = MagicMock()
+    app.db.collection.return_value.order_by.return_value.limit.return_value.stream.side_effect = slow_stream
+
+    app.HISTORY_CACHE_TTL = 0
+    uncached = measure("Uncached")
+
+    app.HISTORY_CACHE_TTL = 30
+    app.invalidate_history_cache()
+    app.get_logs_from_firestore()  # warm
+    cached = measure("Cached")
+
+    print(f"Speedup: {uncached / cached:.0f}x")
+
+if __name__ == "__main__":
+    benchmark()
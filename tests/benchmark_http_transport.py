@@ -0,0 +1,75 @@
+import time
+import sys
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import requests
+import app
+
+WORKERS = 32
+BURSTS = 30  # Waves of WORKERS concurrent calls, like a busy Slack channel
+SERVER_LATENCY = 0.01
+HANDSHAKE_COST = 0.02  # Simulated TLS handshake per new connection
+
+class Webhook(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        time.sleep(HANDSHAKE_COST)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(SERVER_LATENCY)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def measure(label, session, url):
+    latencies = []
+
+    def call(_):
+        start = time.perf_counter()
+        session.post(url, json={'message': 'Hi'}, timeout=10)
+        latencies.append(time.perf_counter() - start)
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for _ in range(BURSTS):
+            list(pool.map(call, range(WORKERS)))
+            time.sleep(0.05)
+    latencies.sort()
+    connections = app.http_session_stats(session)['127.0.0.1']['connections']
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    print(f"{label:<28} p50 {p50 * 1000:5.1f}ms  p99 {p99 * 1000:5.1f}ms  {connections} connections opened")
+    return p99
+
+def benchmark():
+    # urllib3 warns every time it discards a connection from a full pool
+    logging.getLogger('urllib3').setLevel(logging.ERROR)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Webhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/hook'
+    print(f"{BURSTS} bursts of {WORKERS} webhook calls, {SERVER_LATENCY * 1000:.0f}ms server time, "
+          f"{HANDSHAKE_COST * 1000:.0f}ms per new connection")
+    before = measure("requests.Session() default", requests.Session(), url)
+    after = measure(f"Pool sized to {WORKERS} workers", app.make_http_session(WORKERS), url)
+    print(f"p99 improvement: {before / after:.1f}x")
+    server.shutdown()
+
+if __name__ == "__main__":
+    benchmark()
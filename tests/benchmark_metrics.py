@@ -0,0 +1,56 @@
+import time
+import sys
+import os
+import threading
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+THREADS = 8
+CALLS = 50000  # per thread
+
+LOCKED = {}
+LOCKED_LOCK = threading.Lock()
+
+def locked_observe(name, seconds, **labels):
+    """The straightforward alternative: one shared dict behind one lock."""
+    key = (name, tuple(sorted(labels.items())))
+    with LOCKED_LOCK:
+        values = LOCKED.get(key)
+        if values is None:
+            values = LOCKED[key] = [0] * (len(app.LATENCY_BUCKETS) + 2)
+        values[app.bisect.bisect_left(app.LATENCY_BUCKETS, seconds)] += 1
+        values[-1] += seconds
+
+def run(label, record):
+    def work():
+        for i in range(CALLS):
+            record('http_request_duration_seconds', 0.012, route='/slack', method='POST', status='200')
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed / (THREADS * CALLS) * 1e9:6.0f} ns per observation")
+
+def benchmark():
+    print(f"{THREADS} threads x {CALLS} histogram observations")
+    run("single lock", locked_observe)
+    run("per-thread shards", app.observe)
+    start = time.perf_counter()
+    text = app.render_metrics()
+    print(f"scrape: {(time.perf_counter() - start) * 1000:.2f} ms for {len(text.splitlines())} lines")
+
+if __name__ == "__main__":
+    benchmark()
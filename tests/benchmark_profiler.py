@@ -0,0 +1,52 @@
+import time
+import sys
+import os
+import threading
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+WORKERS = 16
+ROUNDS = 500
+
+def serve(stop):
+    """Serves the cached 404 page repeatedly, standing in for request threads under load."""
+    client = app.app.test_client()
+    while not stop.is_set():
+        client.get('/missing')
+
+def benchmark():
+    stop = threading.Event()
+    threads = [threading.Thread(target=serve, args=(stop,), name=f'worker_{i}') for i in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    try:
+        # A zero-length profile takes exactly one sample of every thread. The
+        # sampler holds the GIL for all of it, so this is the time taken from requests.
+        costs = []
+        for _ in range(ROUNDS):
+            start = time.thread_time()
+            app.sample_stacks(0, 0)
+            costs.append(time.thread_time() - start)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    costs.sort()
+    median = costs[len(costs) // 2]
+    print(f"{WORKERS} busy threads, {ROUNDS} sampling rounds")
+    print(f"CPU per round: median {median * 1e6:.0f}us  p99 {costs[int(len(costs) * 0.99)] * 1e6:.0f}us")
+    for interval_ms in (10, 1):
+        print(f"sampling every {interval_ms:>2}ms costs about {median / (interval_ms / 1000) * 100:.2f}% of one core")
+
+if __name__ == "__main__":
+    benchmark()
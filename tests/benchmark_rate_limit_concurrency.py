@@ -0,0 +1,172 @@
+import time
+import random
+import threading
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+LIMIT = 5
+PERIOD = 60
+PARALLEL_REQUESTS = 50
+USERS = 4
+LATENCY = 0.005  # Simulated Firestore round trip
+
+class Conflict(Exception):
+    pass
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data else {}
+
+class FakeStore:
+    """In-memory Firestore stand-in with optimistic transactions and simulated latency."""
+    def __init__(self):
+        self.docs = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.aborts = 0
+
+    def collection(self, name):
+        return self
+
+    def document(self, key):
+        return FakeDocRef(self, key)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+class FakeDocRef:
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def get(self, transaction=None):
+        time.sleep(LATENCY)
+        with self.store.lock:
+            data = self.store.docs.get(self.key)
+            version = self.store.versions.get(self.key, 0)
+        if transaction is not None:
+            transaction.reads[self.key] = version
+        return FakeSnapshot(data)
+
+    def set(self, data):
+        time.sleep(LATENCY)
+        with self.store.lock:
+            self.store.docs[self.key] = dict(data)
+            self.store.versions[self.key] = self.store.versions.get(self.key, 0) + 1
+            self.store.writes += 1
+
+class FakeTransaction:
+    def __init__(self, store):
+        self.store = store
+        self.reads = {}
+        self.pending = []
+
+    def set(self, ref, data):
+        self.pending.append((ref.key, dict(data)))
+
+    def commit(self):
+        time.sleep(LATENCY)
+        with self.store.lock:
+            for key, version in self.reads.items():
+                if self.store.versions.get(key, 0) != version:
+                    self.store.aborts += 1
+                    raise Conflict()
+            for key, data in self.pending:
+                self.store.docs[key] = data
+                self.store.versions[key] = self.store.versions.get(key, 0) + 1
+                self.store.writes += 1
+
+def fake_transactional(fn):
+    """Mimics firestore.transactional: rerun the body until the commit succeeds."""
+    def wrapper(transaction):
+        for attempt in range(50):
+            result = fn(transaction)
+            try:
+                transaction.commit()
+                return result
+            except Conflict:
+                time.sleep(random.uniform(0, LATENCY * (2 ** min(attempt, 4))))
+                transaction = FakeTransaction(transaction.store)
+        raise RuntimeError("Transaction retries exhausted")
+    return wrapper
+
+def legacy_check(store, user_id):
+    """The original get()/set() limiter that rewrote a list of timestamps."""
+    doc_ref = store.document(user_id)
+    doc = doc_ref.get()
+    now = datetime.now(timezone.utc)
+    if not doc.exists:
+        doc_ref.set({'timestamps': [now], 'blocked_until': None})
+        return True
+    data = doc.to_dict()
+    blocked_until = data.get('blocked_until')
+    if blocked_until and blocked_until > now:
+        return False
+    cutoff = now - timedelta(seconds=PERIOD)
+    recent = [t for t in data.get('timestamps', []) if t > cutoff]
+    if len(recent) >= LIMIT:
+        doc_ref.set({'timestamps': recent, 'blocked_until': now + timedelta(seconds=PERIOD)})
+        return False
+    recent.append(now)
+    doc_ref.set({'timestamps': recent, 'blocked_until': None})
+    return True
+
+def run(name, check, store):
+    allowed = {f"U{u}": 0 for u in range(USERS)}
+    lock = threading.Lock()
+
+    def request(user_id):
+        if check(user_id):
+            with lock:
+                allowed[user_id] += 1
+
+    jobs = [f"U{u}" for u in range(USERS) for _ in range(PARALLEL_REQUESTS)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=PARALLEL_REQUESTS) as pool:
+        list(pool.map(request, jobs))
+    duration = time.perf_counter() - start
+
+    counts = sorted(allowed.values())
+    print(f"{name:<12} allowed per user: {counts} (limit {LIMIT})  "
+          f"time: {duration:.3f}s  writes: {store.writes}  aborts: {store.aborts}")
+
+def benchmark():
+    print(f"{PARALLEL_REQUESTS} parallel requests per user, {USERS} users, {LATENCY * 1000:.0f}ms simulated RPC latency")
+
+    store = FakeStore()
+    run("legacy", lambda user_id: legacy_check(store, user_id), store)
+
+    store = FakeStore()
+    app.db = store
+    app.executor = ThreadPoolExecutor(max_workers=10)
+    limiter = app.MemoryRateLimiter('slack_ratelimits')
+    run("memory", lambda user_id: limiter.hit(user_id, LIMIT, PERIOD)[0], store)
+    app.executor.shutdown(wait=True)
+
+    store = FakeStore()
+    app.db = store
+    app.firestore.transactional = fake_transactional
+    limiter = app.FirestoreRateLimiter('slack_ratelimits')
+    run("firestore", lambda user_id: limiter.hit(user_id, LIMIT, PERIOD)[0], store)
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+# Cold-start budgets; override to tighten them as startup improves
+IMPORT_BUDGET_MS = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 600))
+FIRST_RESPONSE_BUDGET_MS = float(os.environ.get('STARTUP_FIRST_RESPONSE_BUDGET_MS', 800))
+
+# Runs in a fresh interpreter each time. The SDKs are only mocked when they
+# aren't installed, so on a full build this measures their real import cost.
+CHILD = """
+import sys, time
+from unittest.mock import MagicMock
+try:
+    import google.cloud.firestore, signalwire.rest
+except ImportError:
+    for name in ('google.cloud', 'google.cloud.firestore', 'signalwire', 'signalwire.rest'):
+        sys.modules[name] = MagicMock()
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+{touch}
+loaded = time.perf_counter()
+app.app.test_client().get('/')
+served = time.perf_counter()
+print((imported - start) * 1000, (loaded - start) * 1000, (served - start) * 1000)
+"""
+
+def run_child(touch, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', CHILD.format(touch=touch)], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+
+def median_run(touch=''):
+    samples = [list(map(float, run_child(touch).stdout.split())) for _ in range(RUNS)]
+    return [statistics.median(column) for column in zip(*samples)]
+
+def slowest_imports(limit=8):
+    """app's direct imports by cumulative time, from `python -X importtime`."""
+    children, result = [], []
+    for line in run_child('', '-X', 'importtime').stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'app':
+                result = children + [(int(cumulative) / 1000, 'app (total)')]
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+    return sorted(result, reverse=True)[:limit]
+
+def benchmark():
+    print(f"Median over {RUNS} fresh interpreters")
+    # What every cold start paid before: both SDKs imported and the client built up front
+    eager = median_run("app.get_db(); app.lazy_import('signalwire_client')")
+    lazy = median_run()
+    print(f"{'eager SDKs + client':<20} ready {eager[1]:7.1f}ms  first response {eager[2]:7.1f}ms")
+    print(f"{'lazy':<20} ready {lazy[1]:7.1f}ms  first response {lazy[2]:7.1f}ms")
+
+    print("\nSlowest imports (cumulative ms)")
+    for ms, name in slowest_imports():
+        print(f"  {ms:8.1f}  {name}")
+
+    over = []
+    if lazy[0] > IMPORT_BUDGET_MS:
+        over.append(f"import {lazy[0]:.0f}ms > {IMPORT_BUDGET_MS:.0f}ms")
+    if lazy[2] > FIRST_RESPONSE_BUDGET_MS:
+        over.append(f"first response {lazy[2]:.0f}ms > {FIRST_RESPONSE_BUDGET_MS:.0f}ms")
+    print(f"\nBudget: import {IMPORT_BUDGET_MS:.0f}ms, first response {FIRST_RESPONSE_BUDGET_MS:.0f}ms -> "
+          + ("OVER: " + ", ".join(over) if over else "OK"))
+    return not over
+
+if __name__ == "__main__":
+    sys.exit(0 if benchmark() else 1)
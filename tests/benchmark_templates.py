@@ -0,0 +1,54 @@
+import timeit
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from flask import render_template, render_template_string
+import app
+
+ITERATIONS = 200
+
+LOGS = [{'time': '2025-01-01 12:00:00', 'source': f'Slack:user{i}', 'status': 'SUCCESS',
+         'msg': f'Message {i}', 'iso_time': '2025-01-01T12:00:00+00:00', 'id': f'doc{i}'}
+        for i in range(app.LOG_HISTORY_LIMIT)]
+
+PAGES = [
+    ('index', app.INDEX_HTML, 'index.html', {'status': None, 'char_limit': 100, 'submitted_message': ''}),
+    ('history', app.HISTORY_HTML, 'history.html', {'authorized': True, 'logs': LOGS, 'admin_pw': 'x'}),
+    ('404', app.ERROR_404_HTML, '404.html', {}),
+]
+
+def benchmark():
+    print(f"Per-render time over {ITERATIONS} renders")
+    with app.app.test_request_context():
+        for label, source, name, context in PAGES:
+            before = timeit.timeit(lambda: render_template_string(source, **context), number=ITERATIONS)
+            after = timeit.timeit(lambda: render_template(name, **context), number=ITERATIONS)
+            print(f"{label:<8} render_template_string: {before / ITERATIONS * 1000:.3f} ms  "
+                  f"precompiled: {after / ITERATIONS * 1000:.3f} ms  ({before / after:.0f}x)")
+
+    print(f"\nPer-request time over {ITERATIONS} requests (Accept-Encoding: gzip, br)")
+    client = app.app.test_client()
+    headers = {'Accept-Encoding': 'gzip, br'}
+    for label, path in (('index', '/'), ('404', '/missing')):
+        def uncached():
+            app.PAGE_CACHE.clear()
+            client.get(path, headers=headers)
+        before = timeit.timeit(uncached, number=ITERATIONS)
+        after = timeit.timeit(lambda: client.get(path, headers=headers), number=ITERATIONS)
+        etag = client.get(path, headers=headers).headers['ETag']
+        revalidate = timeit.timeit(lambda: client.get(path, headers={**headers, 'If-None-Match': etag}), number=ITERATIONS)
+        print(f"{label:<8} render + compress: {before / ITERATIONS * 1000:.3f} ms  "
+              f"cached: {after / ITERATIONS * 1000:.3f} ms  304: {revalidate / ITERATIONS * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    benchmark()
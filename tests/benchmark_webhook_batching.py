@@ -0,0 +1,50 @@
+import time
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add root directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock external dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app
+
+JOBS = 200
+WEBHOOK_LATENCY = 0.05  # Simulated Home Assistant round trip per call
+
+def slow_post(*args, **kwargs):
+    time.sleep(WEBHOOK_LATENCY)
+    return MagicMock(status_code=200)
+
+def burst(label):
+    app.open_print_queue(':memory:')
+    with patch.object(app.http_session, 'post', MagicMock(side_effect=slow_post)) as mock_post:
+        start = time.perf_counter()
+        for i in range(JOBS):
+            app.enqueue_print_job('slack', None, 'http://printer', f'Message {i}', 'Slack: burst')
+        while app.get_print_queue_depth():
+            time.sleep(0.005)
+        duration = time.perf_counter() - start
+    print(f"{label:<26} {mock_post.call_count:>4} webhook calls  {duration:.2f}s")
+    return mock_post.call_count
+
+def benchmark():
+    print(f"Burst of {JOBS} Slack prints, {WEBHOOK_LATENCY * 1000:.0f}ms webhook latency")
+    with patch('app.PRINT_QUEUE_MAX', JOBS), patch('app.log_to_firestore'):
+        single = burst("One POST per message")
+        with patch('app.WEBHOOK_BATCH_WINDOW_MS', 50):
+            # Each waiting message holds an executor thread, so batches top out at its 10 workers
+            batched = burst("Batched, thread pool")
+            with patch('app.httpx'):
+                app.start_async_loop()
+            with patch('app.ASYNC_MODE', True):
+                burst("Batched, ASYNC_MODE")
+    print(f"Webhook calls reduced {single / batched:.0f}x")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,8 @@
+import re
+
+def page_with_assets(client, response):
+    """Returns the page HTML followed by the shared CSS/JS files it links to."""
+    html = response.data.decode('utf-8')
+    for url in re.findall(r'(?:href|src)="(/assets/[^"]+)"', html):
+        html += client.get(url).data.decode('utf-8')
+    return html
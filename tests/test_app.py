@@ -11,7 +11,7 @@ sys.modules['google.cloud.firestore'] = MagicMock()
 sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
-from app import app, db
+from app import app, db, CLEAR_JOBS, wait_for_clear_job
 
 class TestApp(unittest.TestCase):
     def setUp(self):
@@ -25,6 +25,9 @@ class TestApp(unittest.TestCase):
             patch('app.ACCESS_PASSWORD', 'secret'),
             patch('app.ADMIN_PASSWORD', 'adminsecret'),
             patch('app.WEBHOOK_URL', 'http://fake-printer'),
+            # One delivery attempt per job, with fresh circuit breakers
+            patch('app.WEBHOOK_RETRIES', 0),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
             patch('app.CHARACTER_LIMIT', 100),
             patch('app.log_to_firestore', MagicMock()),
             patch('app.executor')
@@ -152,6 +155,11 @@ class TestApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200) # Renders history
         self.assertIn(b"Print History", response.data)
 
+        # Deletion runs as a background job
+        job_id = next(reversed(CLEAR_JOBS))
+        self.assertIn(f'data-job-id="{job_id}"'.encode(), response.data)
+        self.assertEqual(wait_for_clear_job(job_id, 5)['state'], 'done')
+
         # Verify select([]) was called
         mock_db.collection.return_value.select.assert_called_with([])
 
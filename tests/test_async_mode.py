@@ -0,0 +1,152 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import asyncio
+import sys
+import time
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import app, async_process_print, async_process_slack, async_process_sms
+
+def wait_for_empty_spool(timeout=2):
+    deadline = time.time() + timeout
+    while app_module.get_print_queue_depth() and time.time() < deadline:
+        time.sleep(0.01)
+    return app_module.get_print_queue_depth()
+
+class TestAsyncPipelines(unittest.TestCase):
+    def setUp(self):
+        self.http = MagicMock()
+        self.http.post = AsyncMock(return_value=MagicMock(status_code=200))
+        self.patchers = [patch('app.async_http', self.http), patch('app.log_to_firestore'), patch('app.send_sms'),
+                         patch('app.WEBHOOK_RETRIES', 0), patch.dict('app.WEBHOOK_BREAKERS', clear=True)]
+        _, self.mock_log, self.mock_sms, _, _ = [p.start() for p in self.patchers]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_print_success_and_error(self):
+        asyncio.run(async_process_print('1.2.3.4', 'http://printer', 'Hi'))
+        self.http.post.assert_awaited_once_with('http://printer', json={"message": 'Hi'}, timeout=10)
+        self.mock_log.assert_called_once_with('1.2.3.4', 'SUCCESS', 'Hi')
+
+        self.http.post.return_value = MagicMock(status_code=500)
+        asyncio.run(async_process_print('1.2.3.4', 'http://printer', 'Hi'))
+        self.mock_log.assert_called_with('1.2.3.4', 'HA_ERR_500', 'Hi')
+
+    def test_print_connection_failure(self):
+        self.http.post.side_effect = Exception("refused")
+        asyncio.run(async_process_print('1.2.3.4', 'http://printer', 'Hi'))
+        self.mock_log.assert_called_once_with('1.2.3.4', 'CONN_FAIL', 'refused')
+
+    def test_slack_replies_to_response_url(self):
+        slack_http = MagicMock()
+        slack_http.post = AsyncMock()
+        with patch('app.async_slack_http', slack_http):
+            asyncio.run(async_process_slack('http://slack/reply', 'http://printer', 'Hi', 'Slack: bob'))
+        self.mock_log.assert_called_once_with('Slack: bob', 'SUCCESS', 'Hi')
+        self.http.post.assert_awaited_once_with('http://printer', json={"message": 'Hi'}, timeout=10)
+        slack_http.post.assert_awaited_once_with('http://slack/reply', json={"text": "✅ Message sent to printer!", "response_type": "ephemeral"}, timeout=10)
+
+    def test_sms_reply_runs_off_the_loop(self):
+        asyncio.run(async_process_sms('+15550001', 'http://printer', 'Hi'))
+        self.mock_log.assert_called_once_with('+15550001', 'SUCCESS', 'Hi')
+        self.mock_sms.assert_called_once_with('+15550001', "✅ Message printed successfully!")
+
+    def test_outcomes_match_threaded_pipelines(self):
+        outcomes = [{'return_value': MagicMock(status_code=200)}, {'return_value': MagicMock(status_code=503)},
+                    {'side_effect': Exception("refused")}]
+        for outcome in outcomes:
+            self.mock_log.reset_mock()
+            self.mock_sms.reset_mock()
+            self.http.post = AsyncMock(**outcome)
+            asyncio.run(async_process_sms('+15550001', 'http://printer', 'Hi'))
+            with patch('app.http_session.post', **outcome):
+                app_module.process_sms_async('+15550001', 'http://printer', 'Hi')
+            self.assertEqual(self.mock_log.call_args_list[0], self.mock_log.call_args_list[1])
+            self.assertEqual(self.mock_sms.call_args_list[0], self.mock_sms.call_args_list[1])
+
+class TestAsyncMode(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with patch('app.httpx'):
+            app_module.start_async_loop()
+
+    @classmethod
+    def tearDownClass(cls):
+        app_module.ASYNC_LOOP.call_soon_threadsafe(app_module.ASYNC_LOOP.stop)
+        app_module.ASYNC_LOOP = None
+
+    def setUp(self):
+        app_module.open_print_queue(':memory:')
+        self.client = app.test_client()
+        self.http = MagicMock()
+        self.http.post = AsyncMock(return_value=MagicMock(status_code=200))
+        self.patchers = [
+            patch('app.ASYNC_MODE', True),
+            patch('app.async_http', self.http),
+            patch('app.async_db'),
+            patch('app.executor'),
+            patch('app.log_to_firestore'),
+            patch('app.ACCESS_PASSWORD', 'secret'),
+            patch('app.WEBHOOK_URL', 'http://printer'),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
+        ]
+        _, _, self.mock_async_db, self.mock_executor, self.mock_log, _, _, _ = [p.start() for p in self.patchers]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_start_is_idempotent(self):
+        loop = app_module.ASYNC_LOOP
+        self.assertIs(app_module.start_async_loop(), loop)
+        self.assertTrue(loop.is_running())
+
+    def test_requires_httpx(self):
+        with patch('app.ASYNC_LOOP', None), patch('app.httpx', None):
+            with self.assertRaises(RuntimeError):
+                app_module.start_async_loop()
+
+    def test_jobs_run_on_event_loop(self):
+        response = self.client.post('/', data={'password': 'secret', 'message': 'Hello'})
+        self.assertIn(b"PRINT_SUCCESS", response.data)
+        self.assertEqual(wait_for_empty_spool(), 0)
+        self.http.post.assert_awaited_once_with('http://printer', json={"message": 'Hello'}, timeout=10)
+        self.mock_log.assert_called_once_with('127.0.0.1', 'SUCCESS', 'Hello')
+        self.mock_executor.submit.assert_not_called()
+
+    def test_in_flight_jobs_share_the_loop(self):
+        async def slow_post(*args, **kwargs):
+            await asyncio.sleep(0.2)
+            return MagicMock(status_code=200)
+        self.http.post.side_effect = slow_post
+        start = time.time()
+        for i in range(50):
+            app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', f'Job {i}')
+        self.assertEqual(wait_for_empty_spool(), 0)
+        # Fifty 200ms calls finish together rather than in batches of ten threads
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(self.mock_log.call_count, 50)
+
+    def test_sms_pending_uses_async_client(self):
+        with patch('app.is_number_whitelisted', return_value=False), patch('app.db') as mock_db, patch('app.send_sms'):
+            mock_db.collection.return_value.document.return_value.get.return_value.exists = False
+            doc = self.mock_async_db.collection.return_value.document.return_value
+            doc.set = AsyncMock()
+            response = self.client.post('/sms', data={'From': '+15550001', 'Body': 'Hello'})
+            self.assertEqual(response.status_code, 200)
+            deadline = time.time() + 2
+            while not doc.set.await_count and time.time() < deadline:
+                time.sleep(0.01)
+        self.mock_async_db.collection.assert_called_with('sms_pending')
+        self.assertEqual(doc.set.await_args[0][0]['message'], 'Hello')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import app, clear_partitions, start_clear_job, wait_for_clear_job, get_clear_job
+
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.data = data
+        self.reference = self
+
+    def to_dict(self):
+        return dict(self.data)
+
+class FakeStore:
+    """In-memory collection supporting the queries, counts and BulkWriter deletes a clear job uses."""
+    def __init__(self, docs):
+        self.docs = {doc.id: doc for doc in docs}
+        self.lock = threading.Lock()
+        self.streams = 0
+
+    def collection(self, name):
+        return FakeQuery(self)
+
+    def bulk_writer(self):
+        store = self
+
+        class Writer:
+            def delete(self, ref):
+                with store.lock:
+                    store.docs.pop(ref.id, None)
+
+            def close(self):
+                pass
+        return Writer()
+
+class FakeQuery:
+    def __init__(self, store, filters=(), descending=None, limit=None):
+        self.store = store
+        self.filters = filters
+        self.descending = descending
+        self._limit = limit
+
+    def where(self, field, op, value):
+        return FakeQuery(self.store, self.filters + ((field, op, value),), self.descending, self._limit)
+
+    def order_by(self, field, direction=None):
+        if self.descending is not None:
+            return self
+        descending = direction in (app_module.firestore.Query.DESCENDING, "DESCENDING")
+        return FakeQuery(self.store, self.filters, descending, self._limit)
+
+    def limit(self, n):
+        return FakeQuery(self.store, self.filters, self.descending, n)
+
+    def select(self, fields):
+        return self
+
+    def _matches(self):
+        ops = {'>=': lambda a, b: a >= b, '<': lambda a, b: a < b, '==': lambda a, b: a == b,
+               'in': lambda a, b: a in b}
+        with self.store.lock:
+            docs = list(self.store.docs.values())
+        # Like Firestore, a filter or ordering on a field leaves out documents without it
+        docs = [d for d in docs if all(f in d.data and ops[op](d.data[f], v) for f, op, v in self.filters)]
+        if self.descending is not None:
+            docs = [d for d in docs if 'timestamp' in d.data]
+            docs.sort(key=lambda d: (d.data['timestamp'], d.id), reverse=self.descending)
+        return docs[:self._limit] if self._limit else docs
+
+    def stream(self):
+        self.store.streams += 1
+        return iter(self._matches())
+
+    def count(self):
+        result = MagicMock()
+        result.get.return_value = [[MagicMock(value=len(self._matches()))]]
+        return result
+
+def make_docs(count):
+    return [FakeDoc(f'doc{i:04d}', {
+        'timestamp': BASE_TIME + timedelta(hours=i),
+        'source': f'+1555000{i % 10}',
+        'status': 'DENIED' if i % 3 == 0 else 'SUCCESS',
+        'message': f'Message {i}'
+    }) for i in range(count)]
+
+class TestClearJobs(unittest.TestCase):
+    def setUp(self):
+        self.store = FakeStore(make_docs(120))
+        self.patchers = [
+            patch('app.db', self.store),
+            patch('app.ADMIN_PASSWORD', 'adminsecret'),
+            patch('app.CLEAR_PARTITIONS', 4),
+        ]
+        for p in self.patchers:
+            p.start()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_partitioned_clear_deletes_everything(self):
+        job, started = start_clear_job({})
+        self.assertTrue(started)
+        status = wait_for_clear_job(job['id'], 5)
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(status['deleted'], 120)
+        self.assertEqual(status['total'], 120)
+        self.assertEqual(status['remaining'], 0)
+        self.assertEqual(status['partitions'], 4)
+        self.assertEqual(self.store.docs, {})
+
+    def test_unfiltered_clear_removes_entries_without_timestamp(self):
+        for i in range(3):
+            self.store.docs[f'legacy{i}'] = FakeDoc(f'legacy{i}', {'ip': '1.2.3.4', 'status': 'SUCCESS'})
+        job, _ = start_clear_job({})
+        status = wait_for_clear_job(job['id'], 5)
+        self.assertEqual(status['partitions'], 4)
+        self.assertEqual(status['deleted'], 123)
+        self.assertEqual(self.store.docs, {})
+
+    def test_filtered_clear(self):
+        cutoff = BASE_TIME + timedelta(hours=60)
+        job, _ = start_clear_job({'status': ['DENIED'], 'until': cutoff})
+        self.assertEqual(wait_for_clear_job(job['id'], 5)['deleted'], 20)
+        remaining = self.store.docs.values()
+        self.assertEqual(len(remaining), 100)
+        self.assertFalse(any(d.data['status'] == 'DENIED' and d.data['timestamp'] < cutoff for d in remaining))
+        self.assertEqual(get_clear_job(job['id'])['filters'], {'status': ['DENIED'], 'until': cutoff.isoformat()})
+
+    def test_partitions_are_narrowed_to_filter(self):
+        since = BASE_TIME + timedelta(hours=100)
+        partitions = clear_partitions({'since': since})
+        # Ranges entirely before `since` are skipped
+        self.assertEqual(len(partitions), 1)
+        self.assertEqual(partitions[0], (since, None))
+
+    def test_only_one_job_runs_at_a_time(self):
+        release = threading.Event()
+        original = app_module._delete_partition
+
+        def blocked(job, query):
+            release.wait(5)
+            original(job, query)
+        with patch('app._delete_partition', blocked):
+            first, started = start_clear_job({})
+            second, started_again = start_clear_job({'status': ['DENIED']})
+            self.assertTrue(started)
+            self.assertFalse(started_again)
+            self.assertIs(first, second)
+
+            response = self.client.post('/api/clear-history', headers={'X-Admin-Password': 'adminsecret'})
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.get_json()['state'], 'running')
+            response = self.client.post('/clear-history', data={'admin_password': 'adminsecret', 'status': 'DENIED'})
+            self.assertEqual(response.status_code, 409)
+            self.assertIn(b'A clear job is already running', response.data)
+            self.assertIn(f'data-job-id="{first["id"]}"'.encode(), response.data)
+            release.set()
+            wait_for_clear_job(first['id'], 5)
+
+    def test_failed_partition_marks_job_failed(self):
+        with patch('app._delete_partition', side_effect=Exception("quota exceeded")):
+            job, _ = start_clear_job({})
+            status = wait_for_clear_job(job['id'], 5)
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['error'], 'quota exceeded')
+
+    def test_api_starts_job_and_reports_progress(self):
+        response = self.client.post('/api/clear-history', data={'admin_password': 'adminsecret', 'status': 'DENIED'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['id']
+        self.assertEqual(response.headers['Location'], f'/api/clear-jobs/{job_id}')
+        wait_for_clear_job(job_id, 5)
+
+        response = self.client.get(f'/api/clear-jobs/{job_id}', headers={'X-Admin-Password': 'adminsecret'})
+        status = response.get_json()
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(status['deleted'], 40)
+        self.assertIn('per_second', status)
+        self.assertNotIn('thread', status)
+
+    def test_status_endpoint_auth_and_unknown_job(self):
+        self.assertEqual(self.client.get('/api/clear-jobs/nope').status_code, 401)
+        response = self.client.get('/api/clear-jobs/nope', headers={'X-Admin-Password': 'adminsecret'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_returns_before_deletion(self):
+        release = threading.Event()
+        with patch('app._delete_partition', lambda job, query: release.wait(5)):
+            response = self.client.post('/clear-history', data={'admin_password': 'adminsecret', 'source': '+1555'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'id="clear-job"', response.data)
+            self.assertNotIn(b'already running', response.data)
+            self.assertEqual(len(self.store.docs), 120)
+            release.set()
+            wait_for_clear_job(next(reversed(app_module.CLEAR_JOBS)), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,11 +9,14 @@ sys.modules['google.cloud.firestore'] = MagicMock()
 sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
-from app import app, db
+from app import app, db, invalidate_history_cache
+from helpers import page_with_assets
 
 class TestCopyButton(unittest.TestCase):
     def setUp(self):
         self.client = app.test_client()
+        # Make sure the history is read from the mocked query below
+        invalidate_history_cache()
         # Mock Firestore response for logs
         self.mock_docs = []
         db.collection.return_value.order_by.return_value.limit.return_value.stream.return_value = self.mock_docs
@@ -34,7 +37,7 @@ class TestCopyButton(unittest.TestCase):
         # Authenticate and get History page
         response = self.client.post('/history', data={'admin_password': 'adminpassword'})
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for CSS class
         self.assertIn('.copy-btn', html)
@@ -0,0 +1,394 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import csv
+import io
+import threading
+import time
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import app, generate_csv_export, export_partitions, encode_history_cursor, decode_history_cursor
+
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data)
+
+class FakeQuery:
+    """Minimal in-memory stand-in for the Firestore queries the exporter builds."""
+    def __init__(self, docs, filters=(), descending=None, limit=None, fail=False, after=None, end=None):
+        self.docs = docs
+        self.filters = filters
+        self.descending = descending
+        self._limit = limit
+        self.fail = fail
+        self.after = after
+        self.end = end
+
+    def _copy(self, **kwargs):
+        state = dict(docs=self.docs, filters=self.filters, descending=self.descending,
+                     limit=self._limit, fail=self.fail, after=self.after, end=self.end)
+        state.update(kwargs)
+        return FakeQuery(**state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction=None):
+        if self.descending is not None:
+            return self
+        return self._copy(descending=direction in (app_module.firestore.Query.DESCENDING, "DESCENDING"))
+
+    def limit(self, n):
+        return self._copy(limit=n)
+
+    def start_after(self, values):
+        return self._copy(after=(values['timestamp'], values['__name__']))
+
+    def end_at(self, values):
+        return self._copy(end=(values['timestamp'], values['__name__']))
+
+    def count(self):
+        result = MagicMock()
+        result.get.return_value = [[MagicMock(value=len(self._matches()))]]
+        return result
+
+    def stream(self):
+        if self.fail and self.filters:
+            raise RuntimeError("partition failed")
+        return iter(self._matches())
+
+    def _matches(self):
+        ops = {'>=': lambda a, b: a >= b, '<': lambda a, b: a < b}
+        docs = [d for d in self.docs
+                if all(ops[op](d.data[field], value) for field, op, value in self.filters)]
+        position = lambda d: (d.data['timestamp'], d.id)
+        # Cursors are only used on ascending queries
+        docs = [d for d in docs if (self.after is None or position(d) > self.after)
+                and (self.end is None or position(d) <= self.end)]
+        docs.sort(key=position, reverse=bool(self.descending))
+        return docs[:self._limit] if self._limit else docs
+
+def make_docs(count):
+    # Uneven spacing so partitions hold different numbers of entries
+    return [FakeDoc(f'doc{i:05d}', {
+        'timestamp': BASE_TIME + timedelta(seconds=i * i),
+        'source': f'Slack:user{i % 7}',
+        'status': 'SUCCESS',
+        'message': f'Message {i}, with "quotes"'
+    }) for i in range(count)]
+
+class TestCsvExport(unittest.TestCase):
+    def setUp(self):
+        self.docs = make_docs(500)
+        self.patchers = [
+            patch('app.db'),
+            patch('app.EXPORT_PARTITIONS', 4),
+            patch('app.EXPORT_CHUNK_SIZE', 1024),
+            patch('app.EXPORT_PARTITION_ROWS', 40),
+            patch('app.EXPORT_BUFFER_BYTES', 2048),
+        ]
+        self.mock_db = self.patchers[0].start()
+        for p in self.patchers[1:]:
+            p.start()
+        self.mock_db.collection.return_value = FakeQuery(self.docs)
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_partitioned_export_is_complete_and_ordered(self):
+        chunks = list(generate_csv_export())
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], ['Time', 'Source', 'Status', 'Message'])
+        self.assertEqual([r[3] for r in rows[1:]], [f'Message {i}, with "quotes"' for i in reversed(range(500))])
+        # Rows are batched into chunks instead of yielded one at a time
+        self.assertLess(len(chunks), 100)
+        self.assertTrue(all(len(c) < 1024 + 100 for c in chunks))
+
+    def test_matches_single_stream_export(self):
+        parallel = ''.join(generate_csv_export())
+        with patch('app.EXPORT_PARTITIONS', 1):
+            sequential = ''.join(generate_csv_export())
+        self.assertEqual(parallel, sequential)
+
+    def test_partition_error_is_raised(self):
+        self.mock_db.collection.return_value = FakeQuery(self.docs, fail=True)
+        with self.assertRaises(RuntimeError):
+            list(generate_csv_export())
+
+    def test_ranges_are_split_by_row_count(self):
+        # A quiet year with a busy hour in it
+        docs = [FakeDoc(f'old{i:03d}', {'timestamp': BASE_TIME + timedelta(days=i)}) for i in range(0, 360, 4)]
+        docs += [FakeDoc(f'busy{i:03d}', {'timestamp': BASE_TIME + timedelta(days=200, seconds=i)}) for i in range(400)]
+        self.mock_db.collection.return_value = FakeQuery(docs)
+        ranges = app_module.plan_export_ranges(BASE_TIME, BASE_TIME + timedelta(days=356))
+        sizes = [app_module._count_range(bounds) for bounds in ranges]
+        self.assertEqual(sum(sizes), len(docs))
+        self.assertLessEqual(max(sizes), 40)
+        # Contiguous, newest first, open-ended at both ends
+        self.assertEqual((ranges[0][1], ranges[-1][0]), (None, None))
+        for (since, _), (_, until) in zip(ranges, ranges[1:]):
+            self.assertEqual(since, until)
+
+    def test_workers_wait_while_download_is_behind(self):
+        run = app_module._ExportRun([(None, None)] * 3, app_module.csv_chunks)
+        self.assertEqual(run.claim(), 0)
+        run.fetched(0, 'x' * 4096)
+        claimed = []
+        worker = threading.Thread(target=lambda: claimed.append(run.claim()))
+        worker.start()
+        worker.join(0.2)
+        # 4 KB is waiting to be sent against a 2 KB budget, so range 1 isn't started yet
+        self.assertEqual(claimed, [])
+        run.sent(0, run.queues[0].get())
+        worker.join(5)
+        self.assertEqual(claimed, [1])
+
+    def test_buffer_stays_bounded_when_client_stops_reading(self):
+        runs = []
+        class RecordingRun(app_module._ExportRun):
+            def __init__(self, *args):
+                super().__init__(*args)
+                runs.append(self)
+        # Nearly everything in the newest range, which the partitions can't divide
+        docs = make_docs(50) + [FakeDoc(f'busy{i:04d}', dict(make_docs(1)[0].data, timestamp=BASE_TIME + timedelta(days=30)))
+                                for i in range(2000)]
+        self.mock_db.collection.return_value = FakeQuery(docs)
+        with patch('app._ExportRun', RecordingRun), patch('app.EXPORT_PARTITION_ROWS', 100000):
+            with patch('app.plan_export_ranges', return_value=export_partitions(BASE_TIME, BASE_TIME + timedelta(days=30), 4)):
+                export = generate_csv_export()
+                next(export)
+                next(export)
+                time.sleep(0.3)
+                run = runs[0]
+                # The budget plus a chunk per worker and one for the range being sent
+                self.assertLessEqual(run.buffered, 2048 + 5 * (1024 + 100))
+                self.assertLessEqual(sum(q.qsize() for q in run.queues), 12)
+                export.close()
+
+    def test_closing_early_stops_workers(self):
+        pool = ThreadPoolExecutor(max_workers=4)
+        with patch('app.export_executor', pool):
+            export = generate_csv_export()
+            next(export)
+            next(export)
+            export.close()
+            stopper = threading.Thread(target=pool.shutdown)
+            stopper.start()
+            stopper.join(5)
+        self.assertFalse(stopper.is_alive())
+
+    def test_exports_beyond_the_pool_are_turned_away(self):
+        client = app.test_client()
+        form = {'admin_password': 'adminsecret'}
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'), patch('app.EXPORT_SLOTS', threading.BoundedSemaphore(2)):
+            # Two downloads whose clients read one chunk and then stall
+            slow = [client.post('/download-csv', data=form) for _ in range(2)]
+            for response in slow:
+                next(iter(response.response))
+            busy = client.post('/download-csv', data=form)
+            self.assertEqual(busy.status_code, 503)
+            self.assertEqual(busy.headers['Retry-After'], '30')
+
+            slow[0].close()
+            response = client.post('/download-csv', data=form)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data.decode('utf-8').count('\r\n'), 501)
+            slow[1].close()
+            self.assertEqual(client.post('/download-csv', data=form).status_code, 200)
+
+    def test_download_route_uses_engine(self):
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'):
+            response = app.test_client().post('/download-csv', data={'admin_password': 'adminsecret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.decode('utf-8').count('\r\n'), 501)
+
+class TestExportCompression(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.patchers = [patch('app.db'), patch('app.ADMIN_PASSWORD', 'adminsecret')]
+        self.mock_db = self.patchers[0].start()
+        self.patchers[1].start()
+        self.mock_db.collection.return_value = FakeQuery(make_docs(200))
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def download(self, headers=None, **form):
+        return self.client.post('/download-csv', data=dict(admin_password='adminsecret', **form), headers=headers)
+
+    @patch('app.zstandard', None)
+    def test_gzip_content_encoding(self):
+        plain = self.download().data
+        response = self.download(headers={'Accept-Encoding': 'gzip, deflate, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.data), plain)
+        # Repetitive log text compresses well
+        self.assertLess(len(response.data) * 5, len(plain))
+
+    def test_identity_without_accept_encoding(self):
+        response = self.download()
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertTrue(response.data.startswith(b'Time,Source,Status,Message'))
+
+    @patch('app.zstandard', None)
+    def test_zstd_not_offered_without_module(self):
+        response = self.download(headers={'Accept-Encoding': 'zstd'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_csv_gz_download(self):
+        response = self.download(headers={'Accept-Encoding': 'gzip'}, compression='gzip')
+        self.assertEqual(response.mimetype, 'application/gzip')
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=history.csv.gz')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(gzip.decompress(response.data), self.download().data)
+
+    def test_zstd_preferred_when_available(self):
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest("zstandard not installed")
+        response = self.download(headers={'Accept-Encoding': 'gzip, zstd'})
+        self.assertEqual(response.headers['Content-Encoding'], 'zstd')
+        decoded = zstandard.ZstdDecompressor().decompressobj().decompress(response.data)
+        self.assertEqual(decoded, self.download().data)
+
+class TestExportFormats(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.patchers = [patch('app.db'), patch('app.ADMIN_PASSWORD', 'adminsecret'), patch('app.EXPORT_PARQUET_ROW_GROUP', 50)]
+        self.mock_db = self.patchers[0].start()
+        for p in self.patchers[1:]:
+            p.start()
+        self.mock_db.collection.return_value = FakeQuery(make_docs(200))
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def download(self, fmt):
+        return self.client.post('/download-csv', data={'admin_password': 'adminsecret', 'format': fmt})
+
+    def test_ndjson_keeps_full_timestamps(self):
+        response = self.download('ndjson')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=history.ndjson')
+        records = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        self.assertEqual(len(records), 200)
+        self.assertEqual(records[0], {
+            'id': 'doc00199',
+            'timestamp': (BASE_TIME + timedelta(seconds=199 * 199)).isoformat(),
+            'source': 'Slack:user3',
+            'status': 'SUCCESS',
+            'message': 'Message 199, with "quotes"'
+        })
+
+    def test_parquet_row_groups(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow not installed")
+        response = self.download('parquet')
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=history.parquet')
+        parquet = pq.ParquetFile(io.BytesIO(response.data))
+        self.assertEqual(parquet.metadata.num_rows, 200)
+        self.assertGreater(parquet.metadata.num_row_groups, 1)
+        self.assertEqual(str(parquet.schema_arrow.field('timestamp').type), 'timestamp[us, tz=UTC]')
+        table = parquet.read()
+        self.assertEqual(table.column('id')[0].as_py(), 'doc00199')
+        self.assertEqual(table.column('timestamp')[0].as_py(), BASE_TIME + timedelta(seconds=199 * 199))
+
+    @patch('app.pyarrow', None)
+    def test_parquet_requires_pyarrow(self):
+        self.assertEqual(self.download('parquet').status_code, 501)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.download('xlsx').status_code, 400)
+
+def cursor_for(i):
+    return encode_history_cursor({'iso_time': (BASE_TIME + timedelta(seconds=i * i)).isoformat(), 'id': f'doc{i:05d}'})
+
+class TestIncrementalExport(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.docs = make_docs(100)
+        self.patchers = [patch('app.db'), patch('app.ADMIN_PASSWORD', 'adminsecret')]
+        self.mock_db = self.patchers[0].start()
+        self.patchers[1].start()
+        self.mock_db.collection.return_value = FakeQuery(self.docs)
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def sync(self, since, fmt='ndjson'):
+        response = self.client.post('/download-csv', data={'admin_password': 'adminsecret', 'format': fmt, 'since': since})
+        lines = response.data.decode('utf-8').splitlines()
+        return response, [json.loads(line)['id'] for line in lines] if fmt == 'ndjson' else lines
+
+    def test_first_sync_exports_everything_oldest_first(self):
+        response, ids = self.sync('')
+        self.assertEqual(ids, [f'doc{i:05d}' for i in range(100)])
+        self.assertEqual(response.headers['X-Export-Watermark'], cursor_for(99))
+
+    def test_only_newer_rows_are_exported(self):
+        response, ids = self.sync(cursor_for(89))
+        self.assertEqual(ids, [f'doc{i:05d}' for i in range(90, 100)])
+        self.assertEqual(decode_history_cursor(response.headers['X-Export-Watermark'])[1], 'doc00099')
+
+    def test_nothing_new_keeps_watermark(self):
+        response, ids = self.sync(cursor_for(99), fmt='csv')
+        self.assertEqual(ids, ['Time,Source,Status,Message'])
+        self.assertEqual(response.headers['X-Export-Watermark'], cursor_for(99))
+
+    def test_recent_entries_wait_for_next_sync(self):
+        recent = FakeDoc('recent', dict(self.docs[0].data, timestamp=datetime.now(timezone.utc)))
+        self.mock_db.collection.return_value = FakeQuery(self.docs + [recent])
+        response, ids = self.sync(cursor_for(98))
+        self.assertEqual(ids, ['doc00099'])
+        self.assertEqual(response.headers['X-Export-Watermark'], cursor_for(99))
+
+    def test_watermark_without_utc_offset_is_read_as_utc(self):
+        naive = (BASE_TIME + timedelta(seconds=89 * 89)).replace(tzinfo=None).isoformat()
+        since = encode_history_cursor({'iso_time': naive, 'id': 'doc00089'})
+        self.assertEqual(decode_history_cursor(since)[0].tzinfo, timezone.utc)
+        response, ids = self.sync(since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ids, [f'doc{i:05d}' for i in range(90, 100)])
+        # Up to date, compared against the server's own (offset-carrying) watermark
+        naive = (BASE_TIME + timedelta(seconds=99 * 99)).replace(tzinfo=None).isoformat()
+        response, ids = self.sync(encode_history_cursor({'iso_time': naive, 'id': 'doc00099'}))
+        self.assertEqual((response.status_code, ids), (200, []))
+
+    def test_invalid_watermark(self):
+        response = self.client.post('/download-csv', data={'admin_password': 'adminsecret', 'since': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+class TestExportPartitions(unittest.TestCase):
+    def test_ranges_are_contiguous_and_open_ended(self):
+        ranges = export_partitions(BASE_TIME, BASE_TIME + timedelta(hours=4), 4)
+        self.assertEqual(ranges[0], (BASE_TIME + timedelta(hours=3), None))
+        self.assertEqual(ranges[-1], (None, BASE_TIME + timedelta(hours=1)))
+        for (since, _), (_, until) in zip(ranges, ranges[1:]):
+            self.assertEqual(since, until)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@ sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
 from app import app, db
+from helpers import page_with_assets
 
 class TestFocusManagement(unittest.TestCase):
     def setUp(self):
@@ -17,7 +18,7 @@ class TestFocusManagement(unittest.TestCase):
     def test_input_error_css_present(self):
         """Verify that the .input-error CSS class is defined."""
         response = self.client.get('/')
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
         self.assertIn('.input-error {', html)
         self.assertIn('border-color: var(--danger)', html)
 
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import app, get_logs_from_firestore, update_history_cache, invalidate_history_cache, CLEAR_JOBS, wait_for_clear_job
+
+def row(msg):
+    return {'time': 'Now', 'source': 'src', 'status': 'SUCCESS', 'msg': msg, 'iso_time': ''}
+
+class TestHistoryCache(unittest.TestCase):
+    def setUp(self):
+        invalidate_history_cache()
+        self.patchers = [
+            patch('app.HISTORY_CACHE_TTL', 30),
+            patch('app.query_logs_from_firestore', return_value=[row('first')]),
+        ]
+        self.patchers[0].start()
+        self.mock_query = self.patchers[1].start()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        invalidate_history_cache()
+
+    def test_served_from_memory_while_fresh(self):
+        self.assertEqual(get_logs_from_firestore(), [row('first')])
+        self.assertEqual(get_logs_from_firestore(), [row('first')])
+        self.assertEqual(self.mock_query.call_count, 1)
+
+    def test_expires_after_ttl(self):
+        get_logs_from_firestore()
+        with patch('app.time.time', return_value=time.time() + 31):
+            get_logs_from_firestore()
+        self.assertEqual(self.mock_query.call_count, 2)
+
+    @patch('app.HISTORY_CACHE_TTL', 0)
+    def test_disabled_with_zero_ttl(self):
+        get_logs_from_firestore()
+        get_logs_from_firestore()
+        self.assertEqual(self.mock_query.call_count, 2)
+
+    def test_concurrent_refreshes_share_one_query(self):
+        release = threading.Event()
+
+        def slow_query():
+            release.wait(2)
+            return [row('shared')]
+        self.mock_query.side_effect = slow_query
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_logs_from_firestore())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(2)
+
+        self.assertEqual(self.mock_query.call_count, 1)
+        self.assertEqual(results, [[row('shared')]] * 8)
+
+    def test_failed_query_is_retried_by_next_caller(self):
+        self.mock_query.side_effect = [Exception("unavailable"), [row('second')]]
+        with self.assertRaises(Exception):
+            get_logs_from_firestore()
+        self.assertEqual(get_logs_from_firestore(), [row('second')])
+
+    def test_new_entries_are_prepended(self):
+        get_logs_from_firestore()
+        ts = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        update_history_cache([
+            {'timestamp': ts, 'source': '1.2.3.4', 'status': 'SUCCESS', 'message': 'older'},
+            {'timestamp': ts, 'source': '1.2.3.4', 'status': 'DENIED', 'message': 'newer'},
+        ])
+        logs = get_logs_from_firestore()
+        self.assertEqual([log['msg'] for log in logs], ['newer', 'older', 'first'])
+        self.assertEqual(logs[0]['iso_time'], '2025-01-01T12:00:00+00:00')
+        self.assertEqual(self.mock_query.call_count, 1)
+
+    @patch('app.LOG_HISTORY_LIMIT', 2)
+    def test_prepending_respects_history_limit(self):
+        get_logs_from_firestore()
+        update_history_cache([{'status': 'SUCCESS', 'message': m} for m in ('a', 'b')])
+        self.assertEqual([log['msg'] for log in get_logs_from_firestore()], ['b', 'a'])
+
+    def test_entries_during_cold_fetch_discard_result(self):
+        results = iter([[row('stale')], [row('raced'), row('stale')]])
+
+        def query_with_concurrent_write():
+            if self.mock_query.call_count == 1:
+                update_history_cache([{'status': 'SUCCESS', 'message': 'raced'}])
+            return next(results)
+        self.mock_query.side_effect = query_with_concurrent_write
+        # The first result is returned but not cached
+        get_logs_from_firestore()
+        self.assertEqual(len(get_logs_from_firestore()), 2)
+        self.assertEqual(self.mock_query.call_count, 2)
+
+    @patch('app.db')
+    def test_clear_history_invalidates(self, mock_db):
+        get_logs_from_firestore()
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'):
+            app.test_client().post('/clear-history', data={'admin_password': 'adminsecret'})
+        wait_for_clear_job(next(reversed(CLEAR_JOBS)), 5)
+        get_logs_from_firestore()
+        self.assertEqual(self.mock_query.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
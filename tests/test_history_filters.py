@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+from datetime import datetime, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import app, parse_history_filters, build_history_query, PREFIX_END
+
+class RecordingQuery:
+    """Records the where() clauses applied to a query chain."""
+    def __init__(self):
+        self.wheres = []
+        self.orders = []
+
+    def where(self, field, op, value):
+        self.wheres.append((field, op, value))
+        return self
+
+    def order_by(self, field, direction=None):
+        self.orders.append(field)
+        return self
+
+class TestParseHistoryFilters(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(parse_history_filters({}), {})
+        self.assertEqual(parse_history_filters({'status': '*', 'source': '  '}), {})
+
+    def test_statuses_and_source(self):
+        filters = parse_history_filters({'status': 'DENIED, CONN_FAIL', 'source': 'Slack:'})
+        self.assertEqual(filters, {'status': ['DENIED', 'CONN_FAIL'], 'source': 'Slack:'})
+
+    def test_dates(self):
+        filters = parse_history_filters({'since': '2025-01-01', 'until': '2025-01-07'})
+        self.assertEqual(filters['since'], datetime(2025, 1, 1, tzinfo=timezone.utc))
+        # A bare end date includes that whole day
+        self.assertEqual(filters['until'], datetime(2025, 1, 8, tzinfo=timezone.utc))
+        filters = parse_history_filters({'until': '2025-01-07T12:30:00+00:00'})
+        self.assertEqual(filters['until'], datetime(2025, 1, 7, 12, 30, tzinfo=timezone.utc))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_history_filters({'since': 'last week'})
+        with self.assertRaises(ValueError):
+            parse_history_filters({'status': 'HA_ERR_*,DENIED'})
+        with self.assertRaises(ValueError):
+            parse_history_filters({'status': ','.join(f'S{i}' for i in range(31))})
+
+class TestBuildHistoryQuery(unittest.TestCase):
+    def setUp(self):
+        self.patcher = patch('app.db')
+        self.mock_db = self.patcher.start()
+        self.query = RecordingQuery()
+        self.mock_db.collection.return_value = self.query
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_unfiltered_is_newest_first(self):
+        build_history_query()
+        self.assertEqual(self.query.wheres, [])
+        self.assertEqual(self.query.orders, ['timestamp', '__name__'])
+
+    def test_status_equality_and_in(self):
+        build_history_query(status=['DENIED'])
+        self.assertEqual(self.query.wheres, [('status', '==', 'DENIED')])
+        self.query.wheres.clear()
+        build_history_query(status=['DENIED', 'CONN_FAIL'])
+        self.assertEqual(self.query.wheres, [('status', 'in', ['DENIED', 'CONN_FAIL'])])
+
+    def test_prefixes_become_ranges(self):
+        since = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        build_history_query(status=['HA_ERR_*'], source='+1555', since=since)
+        self.assertEqual(self.query.wheres, [
+            ('status', '>=', 'HA_ERR_'), ('status', '<', 'HA_ERR_' + PREFIX_END),
+            ('source', '>=', '+1555'), ('source', '<', '+1555' + PREFIX_END),
+            ('timestamp', '>=', since),
+        ])
+
+class TestFilteredHistoryRoutes(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.patchers = [patch('app.ADMIN_PASSWORD', 'adminsecret'), patch('app.query_history_page', return_value=([], None))]
+        self.patchers[0].start()
+        self.mock_page = self.patchers[1].start()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_api_passes_filters(self):
+        response = self.client.get('/api/history', query_string={'status': 'CONN_FAIL', 'limit': 5},
+                                   headers={'X-Admin-Password': 'adminsecret'})
+        self.assertEqual(response.status_code, 200)
+        self.mock_page.assert_called_once_with(None, 5, {'status': ['CONN_FAIL']})
+
+    def test_api_rejects_bad_filter(self):
+        response = self.client.get('/api/history', query_string={'since': 'yesterday'},
+                                   headers={'X-Admin-Password': 'adminsecret'})
+        self.assertEqual(response.status_code, 400)
+        self.mock_page.assert_not_called()
+
+    @patch('app.get_logs_from_firestore')
+    def test_filtered_page_bypasses_cache(self, mock_logs):
+        response = self.client.post('/history', data={'admin_password': 'adminsecret', 'source': 'Slack:'})
+        self.assertEqual(response.status_code, 200)
+        mock_logs.assert_not_called()
+        self.assertEqual(self.mock_page.call_args[0][2], {'source': 'Slack:'})
+        self.assertIn(b'value="Slack:"', response.data)
+
+    @patch('app.get_logs_from_firestore', return_value=[])
+    def test_invalid_filter_shows_error(self, mock_logs):
+        response = self.client.post('/history', data={'admin_password': 'adminsecret', 'since': 'soon'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Invalid Filter", response.data)
+        mock_logs.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
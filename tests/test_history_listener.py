@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+from datetime import datetime, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import get_logs_from_firestore, start_history_listener, invalidate_history_cache
+
+class MockDoc:
+    def __init__(self, doc_id, msg):
+        self.id = doc_id
+        self.msg = msg
+
+    def to_dict(self):
+        return {
+            'timestamp': datetime(2025, 1, 1, tzinfo=timezone.utc),
+            'source': '127.0.0.1',
+            'status': 'SUCCESS',
+            'message': self.msg
+        }
+
+def change(doc):
+    c = MagicMock()
+    c.document = doc
+    return c
+
+class TestHistoryListener(unittest.TestCase):
+    def setUp(self):
+        invalidate_history_cache()
+        self.patchers = [
+            patch('app.db'),
+            patch('app.HISTORY_LISTENER', True),
+            patch('app.HISTORY_CACHE_TTL', 0),
+        ]
+        self.mock_db = self.patchers[0].start()
+        for p in self.patchers[1:]:
+            p.start()
+
+        query = self.mock_db.collection.return_value.order_by.return_value.limit.return_value
+        self.watch = query.on_snapshot.return_value
+        self.watch.is_active = True
+        self.mock_stream = query.stream
+        self.mock_stream.return_value = [MockDoc('q', 'from query')]
+
+        start_history_listener()
+        self.callback = query.on_snapshot.call_args[0][0]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        app_module._history_watch = None
+
+    def test_falls_back_to_query_until_first_snapshot(self):
+        self.assertEqual([log['msg'] for log in get_logs_from_firestore()], ['from query'])
+        self.mock_stream.assert_called_once()
+
+    def test_reads_from_ring_buffer(self):
+        docs = [MockDoc('b', 'newest'), MockDoc('a', 'older')]
+        self.callback(docs, [change(d) for d in docs], None)
+
+        logs = get_logs_from_firestore()
+        self.assertEqual([log['msg'] for log in logs], ['newest', 'older'])
+        self.assertEqual(logs[0]['iso_time'], '2025-01-01T00:00:00+00:00')
+        self.mock_stream.assert_not_called()
+
+    def test_unchanged_rows_are_not_reformatted(self):
+        older = MockDoc('a', 'older')
+        self.callback([older], [change(older)], None)
+        older.to_dict = MagicMock(side_effect=AssertionError("reformatted"))
+
+        newest = MockDoc('b', 'newest')
+        self.callback([newest, older], [change(newest)], None)
+        self.assertEqual([log['msg'] for log in get_logs_from_firestore()], ['newest', 'older'])
+
+    def test_dead_listener_falls_back_and_restarts(self):
+        docs = [MockDoc('a', 'stale')]
+        self.callback(docs, [change(d) for d in docs], None)
+        self.watch.is_active = False
+
+        with patch('app.HISTORY_LISTENER_RETRY', 0):
+            logs = get_logs_from_firestore()
+        self.assertEqual([log['msg'] for log in logs], ['from query'])
+        self.watch.unsubscribe.assert_called_once()
+        query = self.mock_db.collection.return_value.order_by.return_value.limit.return_value
+        self.assertEqual(query.on_snapshot.call_count, 2)
+
+    def test_restart_is_throttled(self):
+        self.watch.is_active = False
+        with patch('app.HISTORY_LISTENER_RETRY', 3600):
+            get_logs_from_firestore()
+        query = self.mock_db.collection.return_value.order_by.return_value.limit.return_value
+        self.assertEqual(query.on_snapshot.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import app, encode_history_cursor, decode_history_cursor, invalidate_history_cache
+
+BASE_TIME = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+class MockDoc:
+    def __init__(self, i):
+        self.id = f'doc{i}'
+        self.i = i
+
+    def to_dict(self):
+        return {
+            'timestamp': BASE_TIME - timedelta(minutes=self.i),
+            'source': '127.0.0.1',
+            'status': 'SUCCESS',
+            'message': f'Message {self.i}'
+        }
+
+class TestHistoryPagination(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.patchers = [patch('app.db'), patch('app.ADMIN_PASSWORD', 'adminsecret')]
+        self.mock_db = self.patchers[0].start()
+        self.patchers[1].start()
+        ordered = self.mock_db.collection.return_value.order_by.return_value.order_by.return_value
+        self.ordered = ordered
+        ordered.limit.return_value.stream.return_value = [MockDoc(i) for i in range(3)]
+        ordered.start_after.return_value.limit.return_value.stream.return_value = [MockDoc(3)]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def get_page(self, **params):
+        return self.client.get('/api/history', query_string=params,
+                               headers={'X-Admin-Password': 'adminsecret'})
+
+    def test_requires_admin_password(self):
+        response = self.client.get('/api/history')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/history', data={'admin_password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_first_page_and_cursor(self):
+        response = self.get_page(limit=3)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([log['id'] for log in data['logs']], ['doc0', 'doc1', 'doc2'])
+        self.ordered.limit.assert_called_once_with(3)
+        self.ordered.start_after.assert_not_called()
+
+        ts, doc_id = decode_history_cursor(data['next_cursor'])
+        self.assertEqual(ts, BASE_TIME - timedelta(minutes=2))
+        self.assertEqual(doc_id, 'doc2')
+
+    def test_next_page_starts_after_cursor(self):
+        cursor = self.get_page(limit=3).get_json()['next_cursor']
+        response = self.client.post('/api/history', query_string={'cursor': cursor, 'limit': 3},
+                                    data={'admin_password': 'adminsecret'})
+        data = response.get_json()
+        self.ordered.start_after.assert_called_once_with(
+            {'timestamp': BASE_TIME - timedelta(minutes=2), '__name__': 'doc2'})
+        self.assertEqual([log['msg'] for log in data['logs']], ['Message 3'])
+        # A short page is the last one
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.get_page(cursor='not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid cursor', response.get_json()['error'])
+
+    @patch('app.HISTORY_PAGE_MAX', 10)
+    def test_limit_is_clamped(self):
+        self.get_page(limit=1000)
+        self.ordered.limit.assert_called_with(10)
+        self.get_page(limit=0)
+        self.ordered.limit.assert_called_with(1)
+
+    def test_rows_without_id_have_no_cursor(self):
+        self.assertIsNone(encode_history_cursor({'iso_time': '', 'id': 'doc1'}))
+        self.assertIsNone(encode_history_cursor({'iso_time': BASE_TIME.isoformat(), 'id': None}))
+
+class TestHistoryPageScroll(unittest.TestCase):
+    def setUp(self):
+        invalidate_history_cache()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        invalidate_history_cache()
+
+    @patch('app.ADMIN_PASSWORD', 'adminsecret')
+    @patch('app.LOG_HISTORY_LIMIT', 2)
+    @patch('app.db')
+    def test_full_page_renders_scroll_cursor(self, mock_db):
+        mock_db.collection.return_value.order_by.return_value.limit.return_value.stream.return_value = [MockDoc(0), MockDoc(1)]
+        response = self.client.post('/history', data={'admin_password': 'adminsecret'})
+        html = response.data.decode('utf-8')
+        self.assertIn('id="history-more"', html)
+        self.assertIn(f'data-cursor="{encode_history_cursor({"iso_time": (BASE_TIME - timedelta(minutes=1)).isoformat(), "id": "doc1"})}"', html)
+
+    @patch('app.ADMIN_PASSWORD', 'adminsecret')
+    @patch('app.db')
+    def test_short_page_has_no_scroll_cursor(self, mock_db):
+        mock_db.collection.return_value.order_by.return_value.limit.return_value.stream.return_value = [MockDoc(0)]
+        response = self.client.post('/history', data={'admin_password': 'adminsecret'})
+        self.assertNotIn('id="history-more"', response.data.decode('utf-8'))
+
+if __name__ == '__main__':
+    unittest.main()
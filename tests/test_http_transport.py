@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import requests
+import app as app_module
+from app import (app, make_http_session, make_webhook_client, http_session_stats, cached_getaddrinfo,
+                 http_session, slack_http_session, PRINT_WORKERS)
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class TestHttpTransport(unittest.TestCase):
+    def test_destinations_have_their_own_pools(self):
+        self.assertIsNot(http_session, slack_http_session)
+        for session in (http_session, slack_http_session):
+            self.assertEqual(session.get_adapter('https://example.com')._pool_maxsize, PRINT_WORKERS)
+
+    def test_pool_size_setting(self):
+        with patch('app.HTTP_POOL_SIZE', 32):
+            session = make_webhook_client()
+        self.assertEqual(session.get_adapter('http://example.com')._pool_maxsize, 32)
+
+    def test_connections_are_reused_and_counted(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            session = make_http_session(2)
+            url = f'http://127.0.0.1:{server.server_port}/hook'
+            for _ in range(5):
+                self.assertEqual(session.post(url, json={'message': 'Hi'}, timeout=5).status_code, 200)
+            stats = http_session_stats(session)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(stats['127.0.0.1'], {'requests': 5, 'connections': 1, 'idle': 1, 'reused': 4})
+
+    def test_http2_client_when_enabled(self):
+        with patch('app.HTTP2', True), patch('app.httpx') as mock_httpx:
+            client = make_webhook_client()
+        self.assertIs(client, mock_httpx.Client.return_value)
+        self.assertTrue(mock_httpx.Client.call_args.kwargs['http2'])
+
+    def test_http2_falls_back_without_h2(self):
+        with patch('app.HTTP2', True), patch('app.httpx') as mock_httpx:
+            mock_httpx.Client.side_effect = ImportError("h2 not installed")
+            client = make_webhook_client()
+        self.assertIsInstance(client, requests.Session)
+
+    def test_health_reports_transport(self):
+        client = app.test_client()
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'):
+            data = client.get('/api/webhook-health', headers={'X-Admin-Password': 'adminsecret'}).get_json()
+        self.assertEqual(set(data['transport']['destinations']), {'webhook', 'slack'})
+        self.assertEqual(data['transport']['destinations']['slack']['pool_size'], PRINT_WORKERS)
+        self.assertFalse(data['transport']['dns_cache']['enabled'])
+
+class TestDnsCache(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [
+            patch('app.DNS_CACHE_TTL', 60),
+            patch.dict('app.DNS_CACHE', clear=True),
+            patch.dict('app.DNS_CACHE_STATS', {'hits': 0, 'misses': 0}),
+            patch('app._system_getaddrinfo', return_value=[('addr',)]),
+        ]
+        self.mock_resolve = [p.start() for p in self.patchers][-1]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_repeat_lookups_are_cached(self):
+        for _ in range(3):
+            self.assertEqual(cached_getaddrinfo('printer.local', 443), [('addr',)])
+        self.mock_resolve.assert_called_once_with('printer.local', 443)
+        self.assertEqual(app_module.DNS_CACHE_STATS, {'hits': 2, 'misses': 1})
+
+    def test_entries_expire(self):
+        cached_getaddrinfo('printer.local', 443)
+        with patch('app.time.monotonic', return_value=app_module.time.monotonic() + 61):
+            cached_getaddrinfo('printer.local', 443)
+        self.assertEqual(self.mock_resolve.call_count, 2)
+
+    def test_cache_is_bounded(self):
+        with patch('app.DNS_CACHE_MAX', 2):
+            for host in ('a', 'b', 'c'):
+                cached_getaddrinfo(host, 443)
+        self.assertEqual([key[0][0] for key in app_module.DNS_CACHE], ['b', 'c'])
+
+if __name__ == '__main__':
+    unittest.main()
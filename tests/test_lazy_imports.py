@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import subprocess
+import sys
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_defers_sdks_and_client(self):
+        # A fresh interpreter, so nothing else in the suite has touched them yet
+        script = (
+            "import sys\n"
+            "import app\n"
+            "print(sorted(name for name in app._LAZY_IMPORTS if name in vars(app)))\n"
+            "print(any(name.startswith(('google.cloud', 'signalwire')) for name in sys.modules))\n"
+            "app.app.test_client().get('/')\n"
+            "print(sorted(name for name in app._LAZY_IMPORTS if name in vars(app)))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split('\n')[:3], ['[]', 'False', '[]'])
+
+    def test_db_is_built_once(self):
+        with patch.dict(app_module.__dict__), patch.dict(app_module.LAZY_LOAD_TIMES), \
+                patch.object(app_module.get_firestore(), 'Client') as client:
+            app_module.__dict__.pop('db', None)
+            self.assertIs(app_module.get_db(), app_module.get_db())
+            self.assertIs(app_module.db, app_module.get_db())
+            client.assert_called_once_with(database="receipt-printer")
+            self.assertIn('db', app_module.LAZY_LOAD_TIMES)
+
+    def test_patched_module_attribute_is_used(self):
+        with patch('app.db') as mock_db:
+            self.assertIs(app_module.get_db(), mock_db)
+        with patch('app.pyarrow', None):
+            self.assertFalse(app_module.lazy_available('pyarrow'))
+
+    def test_missing_optional_package(self):
+        with patch.dict(app_module.__dict__), patch.dict(app_module._LAZY_IMPORTS, zstandard=lambda: None):
+            app_module.__dict__.pop('zstandard', None)
+            self.assertIsNone(app_module.lazy_import('zstandard'))
+            self.assertEqual(app_module.export_encodings(), ['gzip'])
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            app_module.not_a_real_attribute
+
+if __name__ == '__main__':
+    unittest.main()
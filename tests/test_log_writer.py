@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+import time
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import log_to_firestore, flush_log_buffer, get_log_writer_stats, LOG_BUFFER
+
+class TestLogWriter(unittest.TestCase):
+    def setUp(self):
+        LOG_BUFFER.clear()
+        # A fresh condition keeps any writer thread started by other tests
+        # parked on the old one, so flushes here are deterministic.
+        self.writer_patchers = [
+            patch('app.start_log_writer'),
+            patch('app.LOG_BUFFER_COND', threading.Condition()),
+            patch('app._log_commit_failures', 0),
+            patch('app._log_retry_at', 0.0),
+        ]
+        self.patchers = [patch('app.db')] + self.writer_patchers
+        self.mock_db = self.patchers[0].start()
+        for p in self.writer_patchers:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        LOG_BUFFER.clear()
+
+    def test_log_is_buffered_not_written(self):
+        log_to_firestore('1.2.3.4', 'SUCCESS', 'Hello')
+        self.mock_db.batch.assert_not_called()
+        self.mock_db.collection.return_value.document.return_value.set.assert_not_called()
+        self.assertEqual(get_log_writer_stats()['pending'], 1)
+
+        entry = LOG_BUFFER[0]
+        self.assertEqual(entry['source'], '1.2.3.4')
+        self.assertEqual(entry['status'], 'SUCCESS')
+        self.assertEqual(entry['message'], 'Hello')
+        self.assertIsNotNone(entry['timestamp'].tzinfo)
+
+    def test_flush_uses_one_batch_per_chunk(self):
+        before = get_log_writer_stats()
+        with patch('app.LOG_BATCH_SIZE', 3):
+            for i in range(7):
+                log_to_firestore('src', 'SUCCESS', f'msg{i}')
+            written = flush_log_buffer()
+
+        self.assertEqual(written, 7)
+        batch = self.mock_db.batch.return_value
+        self.assertEqual(self.mock_db.batch.call_count, 3)
+        self.assertEqual(batch.commit.call_count, 3)
+        self.assertEqual(batch.set.call_count, 7)
+        # Entries keep their order across batches
+        messages = [c.args[1]['message'] for c in batch.set.call_args_list]
+        self.assertEqual(messages, [f'msg{i}' for i in range(7)])
+
+        stats = get_log_writer_stats()
+        self.assertEqual(stats['flushes'] - before['flushes'], 3)
+        self.assertEqual(stats['entries'] - before['entries'], 7)
+        self.assertEqual(stats['last_flush_size'], 1)
+        self.assertGreaterEqual(stats['max_flush_size'], 3)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_flush_error_is_counted(self):
+        before = get_log_writer_stats()['errors']
+        self.mock_db.batch.return_value.commit.side_effect = Exception("unavailable")
+        log_to_firestore('src', 'SUCCESS', 'msg')
+        self.assertEqual(flush_log_buffer(), 0)
+        self.assertEqual(get_log_writer_stats()['errors'], before + 1)
+
+    def test_failed_batch_is_retried_first(self):
+        commit = self.mock_db.batch.return_value.commit
+        commit.side_effect = [Exception("unavailable"), None, None]
+        with patch('app.LOG_BATCH_SIZE', 2):
+            for i in range(3):
+                log_to_firestore('src', 'SUCCESS', f'msg{i}')
+            self.assertEqual(flush_log_buffer(), 0)
+            # Back at the front of the buffer, and the writer waits before trying again
+            self.assertEqual([e['message'] for e in LOG_BUFFER], ['msg0', 'msg1', 'msg2'])
+            self.assertGreater(app_module._log_retry_at, time.monotonic())
+            self.assertEqual(flush_log_buffer(), 3)
+        messages = [c.args[1]['message'] for c in self.mock_db.batch.return_value.set.call_args_list]
+        self.assertEqual(messages, ['msg0', 'msg1', 'msg0', 'msg1', 'msg2'])
+        self.assertEqual(app_module._log_commit_failures, 0)
+
+    def test_entries_are_dropped_after_retries(self):
+        before = get_log_writer_stats()['dropped']
+        commit = self.mock_db.batch.return_value.commit
+        commit.side_effect = Exception("unavailable")
+        with patch('app.LOG_WRITE_RETRIES', 2), patch('app.LOG_RETRY_BACKOFF_MS', 1), patch('app.LOG_BATCH_SIZE', 2):
+            for i in range(3):
+                log_to_firestore('src', 'SUCCESS', f'msg{i}')
+            # As at shutdown: sleeps through the backoff until each batch is written or given up on
+            self.assertEqual(flush_log_buffer(wait=True), 0)
+        self.assertEqual(commit.call_count, 6)
+        stats = get_log_writer_stats()
+        self.assertEqual(stats['dropped'] - before, 3)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_full_buffer_turns_entries_away(self):
+        before = get_log_writer_stats()['overflow']
+        with patch('app.LOG_BUFFER_MAX', 3):
+            for i in range(5):
+                log_to_firestore('src', 'DENIED', f'msg{i}')
+        # The oldest entries are kept, and the rest counted
+        self.assertEqual([e['message'] for e in LOG_BUFFER], ['msg0', 'msg1', 'msg2'])
+        self.assertEqual(get_log_writer_stats()['overflow'] - before, 2)
+        text = app_module.render_metrics()
+        self.assertIn('log_writer_dropped_total{reason="overflow"} ', text)
+        self.assertIn('log_writer_pending 3', text)
+
+    def test_stats_do_not_wait_for_a_commit(self):
+        stats = []
+        with app_module.LOG_FLUSH_LOCK:
+            reader = threading.Thread(target=lambda: stats.append(get_log_writer_stats()))
+            reader.start()
+            reader.join(2)
+        self.assertEqual(len(stats), 1)
+
+    def test_background_writer_flushes_after_interval(self):
+        for p in self.writer_patchers:
+            p.stop()
+            self.patchers.remove(p)
+        with patch('app.LOG_FLUSH_INTERVAL_MS', 10):
+            log_to_firestore('src', 'SUCCESS', 'background')
+            commit = self.mock_db.batch.return_value.commit
+            deadline = time.time() + 2
+            while not commit.called and time.time() < deadline:
+                time.sleep(0.01)
+        commit.assert_called_once()
+        self.assertEqual(LOG_BUFFER, [])
+        self.assertTrue(app_module._log_writer_thread.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import asyncio
+import re
+import sys
+import threading
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import (app, InstrumentedExecutor, collect_metrics, deliver_webhook, firestore_op, firestore_stream, inc_counter,
+                 is_number_whitelisted, observe, render_metrics, WHITELIST_CACHE)
+
+def metric_value(text, series):
+    """Value of one exposition line, e.g. 'whitelist_cache_hits_total', or 0 if absent."""
+    match = re.search(r'^' + re.escape(series) + r' (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0
+
+def in_thread(fn):
+    thread = threading.Thread(target=fn)
+    thread.start()
+    thread.join()
+
+class TestMetricShards(unittest.TestCase):
+    def test_threads_are_summed_including_finished_ones(self):
+        before = collect_metrics().get(('executor_tasks_started_total', (('executor', 'shard-test'),)), 0)
+        threads = [threading.Thread(target=lambda: [inc_counter('executor_tasks_started_total', executor='shard-test')
+                                                    for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        inc_counter('executor_tasks_started_total', executor='shard-test')
+        totals = collect_metrics()
+        self.assertEqual(totals[('executor_tasks_started_total', (('executor', 'shard-test'),))], before + 401)
+        # Folding finished threads' shards in doesn't count them twice
+        self.assertEqual(collect_metrics(), totals)
+
+    def test_histogram_exposition(self):
+        in_thread(lambda: [observe('firestore_rpc_duration_seconds', s, operation='hist-test') for s in (0.003, 0.2, 20)])
+        text = render_metrics()
+        self.assertIn('# TYPE firestore_rpc_duration_seconds histogram', text)
+        self.assertEqual(metric_value(text, 'firestore_rpc_duration_seconds_bucket{operation="hist-test",le="0.005"}'), 1)
+        self.assertEqual(metric_value(text, 'firestore_rpc_duration_seconds_bucket{operation="hist-test",le="0.25"}'), 2)
+        self.assertEqual(metric_value(text, 'firestore_rpc_duration_seconds_bucket{operation="hist-test",le="+Inf"}'), 3)
+        self.assertEqual(metric_value(text, 'firestore_rpc_duration_seconds_count{operation="hist-test"}'), 3)
+        self.assertAlmostEqual(metric_value(text, 'firestore_rpc_duration_seconds_sum{operation="hist-test"}'), 20.203)
+
+    def test_firestore_errors_are_counted(self):
+        with self.assertRaises(RuntimeError):
+            with firestore_op('error-test'):
+                raise RuntimeError("unavailable")
+        text = render_metrics()
+        self.assertEqual(metric_value(text, 'firestore_rpc_errors_total{operation="error-test"}'), 1)
+        self.assertEqual(metric_value(text, 'firestore_rpc_duration_seconds_count{operation="error-test"}'), 1)
+
+    def test_streams_time_only_the_firestore_side(self):
+        def docs():
+            yield 1
+            raise RuntimeError("deadline exceeded")
+        stream = firestore_stream('stream-test', docs())
+        self.assertEqual(next(stream), 1)
+        with patch('app.time.perf_counter', side_effect=[100.0, 100.5]):
+            with self.assertRaises(RuntimeError):
+                next(stream)
+        text = render_metrics()
+        self.assertEqual(metric_value(text, 'firestore_rpc_errors_total{operation="stream-test"}'), 1)
+        self.assertEqual(metric_value(text, 'firestore_rpc_duration_seconds_count{operation="stream-test"}'), 1)
+        self.assertLess(metric_value(text, 'firestore_rpc_duration_seconds_sum{operation="stream-test"}'), 0.6)
+
+    def test_executor_gauges(self):
+        pool = InstrumentedExecutor('gauge-test', max_workers=1)
+        started, release = threading.Event(), threading.Event()
+        running = pool.submit(lambda: started.set() or release.wait(5))
+        started.wait(5)
+        queued = pool.submit(lambda: None)
+        try:
+            text = render_metrics()
+            self.assertEqual(metric_value(text, 'executor_max_workers{executor="gauge-test"}'), 1)
+            self.assertEqual(metric_value(text, 'executor_queue_depth{executor="gauge-test"}'), 1)
+            self.assertEqual(metric_value(text, 'executor_active_workers{executor="gauge-test"}'), 1)
+        finally:
+            release.set()
+        self.assertTrue(running.result(5))
+        queued.result(5)
+        text = render_metrics()
+        self.assertEqual(metric_value(text, 'executor_active_workers{executor="gauge-test"}'), 0)
+        self.assertEqual(metric_value(text, 'executor_tasks_finished_total{executor="gauge-test"}'), 2)
+        pool.shutdown()
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [patch('app.ADMIN_PASSWORD', 'adminsecret'), patch('app.WEBHOOK_RETRIES', 0),
+                         patch.dict('app.WEBHOOK_BREAKERS', clear=True), patch('app.db')]
+        for p in self.patchers:
+            p.start()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        WHITELIST_CACHE.clear()
+
+    def scrape(self):
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer adminsecret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/plain')
+        return response.get_data(as_text=True)
+
+    def test_requires_admin_password(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        self.assertEqual(self.client.get('/metrics', headers={'X-Admin-Password': 'adminsecret'}).status_code, 200)
+
+    def test_route_latency(self):
+        series = 'http_request_duration_seconds_count{method="GET",route="/",status="200"}'
+        before = metric_value(self.scrape(), series)
+        self.client.get('/')
+        self.client.get('/')
+        self.client.get('/missing')
+        text = self.scrape()
+        self.assertEqual(metric_value(text, series), before + 2)
+        self.assertGreater(metric_value(text, 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}'), 0)
+
+    def test_webhook_latency_by_status(self):
+        series = 'webhook_request_duration_seconds_count{status="%s"}'
+        before = self.scrape()
+        with patch('app.http_session.post', return_value=MagicMock(status_code=503)):
+            deliver_webhook('http://printer.test/hook', {'message': 'Hi'})
+        with patch('app.http_session.post', side_effect=ConnectionError("refused")):
+            with self.assertRaises(ConnectionError):
+                deliver_webhook('http://printer.test/hook', {'message': 'Hi'})
+        after = self.scrape()
+        self.assertEqual(metric_value(after, series % 503), metric_value(before, series % 503) + 1)
+        self.assertEqual(metric_value(after, series % 'error'), metric_value(before, series % 'error') + 1)
+
+    def test_export_paths_are_timed(self):
+        operations = ['export_watermark', 'export_delta', 'warmup_read', 'history_listener_start', 'sms_pending_set']
+        names = [f'firestore_rpc_duration_seconds_count{{operation="{op}"}}' for op in operations]
+        before = self.scrape()
+        cursor = app_module.encode_history_cursor({'iso_time': '2024-01-01T00:00:00+00:00', 'id': 'doc1'})
+        app_module.export_watermark()
+        list(app_module.delta_stream(app_module.ndjson_chunks, None, cursor))
+        app_module.warm_firestore()
+        with patch('app._history_watch', None):
+            app_module.start_history_listener()
+        asyncio.run(app_module._write_sms_pending_async(AsyncMock(), {'body': 'Hi'}))
+        after = self.scrape()
+        self.assertEqual([metric_value(after, n) - metric_value(before, n) for n in names], [1] * len(names))
+
+    def test_whole_export_is_timed(self):
+        series = 'export_duration_seconds_count{format="ndjson",outcome="%s"}'
+        docs = [MagicMock(id=f'doc{i}', to_dict=MagicMock(return_value={'message': f'msg{i}'})) for i in range(3)]
+        app_module.db.collection.return_value.order_by.return_value.stream.side_effect = lambda: iter(docs)
+        before = self.scrape()
+        with patch('app.EXPORT_CHUNK_SIZE', 1):
+            response = self.client.post('/download-csv', data={'admin_password': 'adminsecret', 'format': 'ndjson'})
+            self.assertEqual(len(response.get_data().splitlines()), 3)
+        # Abandoned part way, as when the client disconnects
+            response = self.client.post('/download-csv', data={'admin_password': 'adminsecret', 'format': 'ndjson'})
+            response.close()
+        after = self.scrape()
+        self.assertEqual(metric_value(after, series % 'complete'), metric_value(before, series % 'complete') + 1)
+        self.assertEqual(metric_value(after, series % 'cancelled'), metric_value(before, series % 'cancelled') + 1)
+
+    def test_log_writer_counters(self):
+        names = ['log_writer_flushes_total', 'log_writer_entries_total', 'log_flush_duration_seconds_count']
+        before = self.scrape()
+        # A fresh condition keeps any running writer thread from taking these entries
+        with patch('app.start_log_writer'), patch('app.LOG_BUFFER_COND', threading.Condition()):
+            app_module.log_to_firestore('src', 'SUCCESS', 'one')
+            app_module.log_to_firestore('src', 'SUCCESS', 'two')
+            app_module.flush_log_buffer()
+        after = self.scrape()
+        self.assertEqual([metric_value(after, n) - metric_value(before, n) for n in names], [1, 2, 1])
+        self.assertEqual(metric_value(after, 'log_writer_last_flush_size'), 2)
+
+    def test_whitelist_cache_counters(self):
+        WHITELIST_CACHE.clear()
+        names = ['whitelist_cache_hits_total', 'whitelist_cache_misses_total',
+                 'whitelist_cache_evictions_total{reason="capacity"}', 'firestore_rpc_duration_seconds_count{operation="whitelist_query"}']
+        before = self.scrape()
+        with patch('app.WHITELIST_CACHE_LIMIT', 1):
+            is_number_whitelisted('+15550001')
+            is_number_whitelisted('+15550001')
+            is_number_whitelisted('+15550002')
+        after = self.scrape()
+        self.assertEqual([metric_value(after, n) - metric_value(before, n) for n in names], [1, 2, 1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
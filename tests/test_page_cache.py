@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import gzip
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import app, PAGE_CACHE
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        PAGE_CACHE.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        PAGE_CACHE.clear()
+
+    def test_index_rendered_once(self):
+        first = self.client.get('/')
+        with patch('app.render_template', side_effect=AssertionError("page re-rendered")):
+            second = self.client.get('/')
+        self.assertEqual(first.data, second.data)
+        self.assertIn(b'<title>Remote Print</title>', second.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(second.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(second.mimetype, 'text/html')
+
+    def test_404_cached_with_status(self):
+        self.client.get('/missing')
+        with patch('app.render_template', side_effect=AssertionError("page re-rendered")):
+            response = self.client.get('/other-missing')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(b'<title>Page Not Found</title>', response.data)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/').headers['ETag']
+        response = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(self.client.get('/', headers={'If-None-Match': '"stale"'}).status_code, 200)
+
+    def test_if_none_match_does_not_apply_to_404(self):
+        etag = self.client.get('/missing').headers['ETag']
+        response = self.client.get('/missing', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(b'<title>Page Not Found</title>', response.data)
+        self.assertEqual(self.client.get('/missing', headers={'If-None-Match': '*'}).status_code, 404)
+
+    def test_compressed_variant_has_its_own_etag(self):
+        plain = self.client.get('/')
+        # tearDown clears the cache, so dropping the Brotli variant here doesn't leak
+        for entry in PAGE_CACHE.values():
+            entry['variants'].pop('br', None)
+        compressed = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertNotEqual(compressed.headers['ETag'], plain.headers['ETag'])
+
+    def test_char_limit_is_part_of_key(self):
+        with patch('app.CHARACTER_LIMIT', 50):
+            self.assertIn(b'maxlength="50"', self.client.get('/').data)
+        with patch('app.CHARACTER_LIMIT', None):
+            self.assertNotIn(b'maxlength=', self.client.get('/').data)
+        self.assertEqual(len(PAGE_CACHE), 2)
+
+    @patch('app.executor')
+    def test_post_is_not_cached(self, mock_executor):
+        response = self.client.post('/', data={'password': 'wrong', 'message': 'hi'})
+        self.assertIn(b'Access Denied', response.data)
+        self.assertNotIn('ETag', response.headers)
+        self.assertEqual(PAGE_CACHE, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import sys
 
 # Mock dependencies
@@ -23,5 +23,12 @@ class TestPageMetadata(unittest.TestCase):
         self.assertIn('<html lang="en">', ERROR_404_HTML)
         self.assertIn('<title>Page Not Found</title>', ERROR_404_HTML)
 
+    def test_pages_are_not_recompiled_per_request(self):
+        client = app.test_client()
+        with patch.object(app.jinja_env, 'compile', side_effect=AssertionError("template recompiled")):
+            self.assertIn(b'<title>Remote Print</title>', client.get('/').data)
+            self.assertIn(b'<title>Print History</title>', client.get('/history').data)
+            self.assertIn(b'<title>Page Not Found</title>', client.get('/missing').data)
+
 if __name__ == '__main__':
     unittest.main()
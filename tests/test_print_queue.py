@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import sys
+import tempfile
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import app
+
+class TestPrintQueue(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.spool_path = os.path.join(self.tmpdir.name, 'spool.sqlite3')
+        app_module.open_print_queue(self.spool_path)
+
+        self.patchers = [
+            patch('app.ACCESS_PASSWORD', 'secret'),
+            patch('app.WEBHOOK_URL', 'http://fake-printer'),
+            patch('app.PRINT_QUEUE_MAX', 2),
+            patch('app.executor'),
+        ]
+        self.started = [p.start() for p in self.patchers]
+        self.mock_executor = self.started[-1]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        app_module.open_print_queue(':memory:')
+        self.tmpdir.cleanup()
+
+    def spooled_jobs(self):
+        return app_module._print_queue_conn.execute('SELECT kind, args FROM jobs ORDER BY id').fetchall()
+
+    def test_job_is_spooled_until_it_runs(self):
+        response = self.client.post('/', data={'password': 'secret', 'message': 'Hello'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"PRINT_SUCCESS", response.data)
+        self.assertEqual(self.spooled_jobs(), [('print', '["127.0.0.1", "http://fake-printer", "Hello"]')])
+        self.assertEqual(app_module.get_print_queue_depth(), 1)
+
+        # Run the job the executor was handed
+        fn, *args = self.mock_executor.submit.call_args[0]
+        with patch('app.process_print_async') as mock_process:
+            fn(*args)
+        mock_process.assert_called_once_with('127.0.0.1', 'http://fake-printer', 'Hello')
+        self.assertEqual(self.spooled_jobs(), [])
+        self.assertEqual(app_module.get_print_queue_depth(), 0)
+
+    def test_index_backpressure_when_full(self):
+        for _ in range(2):
+            self.client.post('/', data={'password': 'secret', 'message': 'Hello'})
+
+        response = self.client.post('/', data={'password': 'secret', 'message': 'One too many'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '5')
+        self.assertIn(b"QUEUE_FULL", response.data)
+        # The rejected message is kept in the textarea so the user can retry
+        self.assertIn(b">One too many</textarea>", response.data)
+        self.assertEqual(len(self.spooled_jobs()), 2)
+
+    @patch('app.is_number_whitelisted', return_value=True)
+    def test_sms_backpressure_when_full(self, _):
+        for _ in range(2):
+            self.client.post('/sms', data={'From': '+1234567890', 'Body': 'Hello'})
+
+        response = self.client.post('/sms', data={'From': '+1234567890', 'Body': 'Hello'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    @patch('app.check_slack_rate_limit', return_value=(True, None))
+    def test_slack_backpressure_when_full(self, _):
+        data = {'user_id': 'U1', 'user_name': 'tester', 'text': 'Hello'}
+        for _ in range(2):
+            self.client.post('/slack', data=data)
+
+        response = self.client.post('/slack', data=data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("busy", response.json['text'])
+        self.assertIn('Retry-After', response.headers)
+
+    def test_replay_after_restart(self):
+        self.client.post('/', data={'password': 'secret', 'message': 'Survivor'})
+
+        # Simulate a new process opening the same spool file
+        app_module.open_print_queue(self.spool_path)
+        self.assertEqual(app_module.get_print_queue_depth(), 1)
+        self.mock_executor.reset_mock()
+
+        self.assertEqual(app_module.replay_print_queue(), 1)
+        fn, job_id, kind, args = self.mock_executor.submit.call_args[0]
+        self.assertEqual(kind, 'print')
+        self.assertEqual(args, ['127.0.0.1', 'http://fake-printer', 'Survivor'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+import time
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import app, executor, sample_stacks, collapsed_stacks, PROFILE_LOCK
+
+def slow_print_job(release):
+    release.wait(5)
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.patcher = patch('app.ADMIN_PASSWORD', 'adminsecret')
+        self.patcher.start()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_samples_executor_workers(self):
+        release = threading.Event()
+        future = executor.submit(slow_print_job, release)
+        try:
+            stacks, rounds = sample_stacks(0.05, 0.01)
+        finally:
+            release.set()
+        future.result(5)
+        self.assertGreaterEqual(rounds, 2)
+        matching = [stack for stack in stacks if ';slow_print_job (test_profiler.py:' in stack]
+        self.assertTrue(matching)
+        # The worker's thread name, without its number, is the root frame
+        self.assertTrue(all(stack.startswith('ThreadPoolExecutor-0;') for stack in matching))
+        self.assertGreaterEqual(sum(stacks[stack] for stack in matching), 2)
+        # The sampling thread itself is left out
+        self.assertFalse(any('sample_stacks' in stack for stack in stacks))
+
+    def test_collapsed_format(self):
+        self.assertEqual(collapsed_stacks({'main;b (x.py:3)': 2, 'main;a (x.py:1)': 5}),
+                         'main;a (x.py:1) 5\nmain;b (x.py:3) 2\n')
+
+    def test_endpoint(self):
+        self.assertEqual(self.client.get('/api/profile').status_code, 401)
+        with patch('app.PROFILE_MAX_SECONDS', 0.1):
+            start = time.monotonic()
+            response = self.client.get('/api/profile?seconds=60&interval_ms=5', headers={'X-Admin-Password': 'adminsecret'})
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.folded', response.headers['Content-disposition'])
+        self.assertGreater(int(response.headers['X-Profile-Samples']), 1)
+        for line in response.get_data(as_text=True).splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(count.isdigit())
+            self.assertIn(';', stack)
+
+    def test_rejects_non_finite_values(self):
+        headers = {'X-Admin-Password': 'adminsecret'}
+        for query in ('seconds=nan', 'seconds=inf', 'seconds=0.1&interval_ms=nan', 'seconds=0.1&interval_ms=-inf'):
+            self.assertEqual(self.client.get(f'/api/profile?{query}', headers=headers).status_code, 400, query)
+        self.assertFalse(PROFILE_LOCK.locked())
+
+    def test_one_profile_at_a_time(self):
+        with PROFILE_LOCK:
+            response = self.client.post('/api/profile', data={'admin_password': 'adminsecret', 'seconds': '0.1'})
+        self.assertEqual(response.status_code, 409)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import app, MemoryRateLimiter, FirestoreRateLimiter, index_rate_limiter, sms_rate_limiter
+
+class TestMemoryRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [patch('app.db'), patch('app.executor')]
+        self.mock_db, self.mock_executor = [p.start() for p in self.patchers]
+        self.mock_executor.submit.side_effect = lambda fn, *args: fn(*args)
+        self.doc_ref = self.mock_db.collection.return_value.document.return_value
+        self.doc_ref.get.return_value.exists = False
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    @patch('app.time.time')
+    def test_sliding_window_and_block(self, mock_time):
+        limiter = MemoryRateLimiter()
+        mock_time.return_value = 1000.0
+        self.assertEqual(limiter.hit('k', 2, 60), (True, None, False))
+        self.assertEqual(limiter.hit('k', 2, 60), (True, None, False))
+        self.assertEqual(limiter.hit('k', 2, 60), (False, 60, True))
+
+        # Still blocked half way through the block
+        mock_time.return_value = 1030.0
+        allowed, retry_after, just_blocked = limiter.hit('k', 2, 60)
+        self.assertFalse(allowed)
+        self.assertFalse(just_blocked)
+        self.assertAlmostEqual(retry_after, 30.0)
+
+        # Block and window have both expired
+        mock_time.return_value = 1061.0
+        self.assertEqual(limiter.hit('k', 2, 60), (True, None, False))
+        # Other keys are independent
+        self.assertEqual(limiter.hit('other', 2, 60), (True, None, False))
+
+    def test_memory_only_limiter_never_touches_firestore(self):
+        limiter = MemoryRateLimiter()
+        limiter.hit('k', 5, 60)
+        self.mock_db.collection.assert_not_called()
+        self.mock_executor.submit.assert_not_called()
+
+    def test_state_loaded_once_then_served_from_memory(self):
+        recent = datetime.now(timezone.utc) - timedelta(seconds=5)
+        self.doc_ref.get.return_value.exists = True
+        self.doc_ref.get.return_value.to_dict.return_value = {
+            'timestamps': [recent.replace(tzinfo=None)],
+            'blocked_until': None
+        }
+        limiter = MemoryRateLimiter('slack_ratelimits')
+
+        self.assertTrue(limiter.hit('U1', 2, 60)[0])
+        self.assertEqual(limiter.hit('U1', 2, 60)[:2], (False, 60))
+        self.assertEqual(self.doc_ref.get.call_count, 1)
+
+        # State was written back in compact form, with the block
+        state = self.doc_ref.set.call_args[0][0]
+        self.assertEqual(state['count'], 2)
+        self.assertEqual(state['prev_count'], 0)
+        self.assertNotIn('timestamps', state)
+        self.assertIsNotNone(state['blocked_until'])
+
+    def test_sync_back_is_coalesced(self):
+        self.mock_executor.submit.side_effect = None
+        limiter = MemoryRateLimiter('slack_ratelimits')
+        for _ in range(3):
+            limiter.hit('U1', 10, 60)
+        self.assertEqual(self.mock_executor.submit.call_count, 1)
+
+        # Once the pending write runs, the next hit schedules another
+        fn, key = self.mock_executor.submit.call_args[0]
+        fn(key)
+        self.assertEqual(self.doc_ref.set.call_args[0][0]['count'], 3)
+        limiter.hit('U1', 10, 60)
+        self.assertEqual(self.mock_executor.submit.call_count, 2)
+
+    def test_load_error_fails_open(self):
+        self.doc_ref.get.side_effect = Exception("unavailable")
+        limiter = MemoryRateLimiter('slack_ratelimits')
+        self.assertTrue(limiter.hit('U1', 1, 60)[0])
+
+    def test_key_count_is_bounded(self):
+        limiter = MemoryRateLimiter(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            limiter.hit(key, 1, 60)
+        self.assertEqual(list(limiter._entries), ['b', 'c'])
+
+    def test_concurrent_inserts_never_lose_a_key(self):
+        def slow_get():
+            time.sleep(0.001)
+            return MagicMock(exists=False)
+        self.doc_ref.get.side_effect = slow_get
+        limiter = MemoryRateLimiter('slack_ratelimits', max_keys=1)
+        lock = limiter._lock
+
+        class YieldingLock:
+            # Lets other threads run between any two locked sections
+            def __enter__(self):
+                lock.acquire()
+
+            def __exit__(self, *exc):
+                lock.release()
+                time.sleep(0.001)
+        limiter._lock = YieldingLock()
+        errors = []
+
+        def worker(key):
+            try:
+                for _ in range(20):
+                    limiter.hit(key, 1000, 60)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(f'k{i}',)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(limiter._entries), 1)
+
+    @patch('app.time.time')
+    def test_previous_window_is_weighted(self, mock_time):
+        limiter = MemoryRateLimiter()
+        mock_time.return_value = 1000.0
+        for _ in range(4):
+            limiter.hit('k', 4, 60)
+
+        # 45s into the next window a quarter of the old hits still count
+        mock_time.return_value = 1105.0
+        self.assertTrue(limiter.hit('k', 4, 60)[0])
+        self.assertTrue(limiter.hit('k', 4, 60)[0])
+        self.assertTrue(limiter.hit('k', 4, 60)[0])
+        self.assertEqual(limiter.hit('k', 4, 60)[:2], (False, 60))
+
+class TestFirestoreRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [
+            patch('app.db'),
+            # Run the transaction body once, without the client's retry loop
+            patch('app.firestore.transactional', lambda fn: fn),
+        ]
+        self.mock_db = self.patchers[0].start()
+        self.patchers[1].start()
+        self.doc_ref = self.mock_db.collection.return_value.document.return_value
+        self.snapshot = self.doc_ref.get.return_value
+        self.transaction = self.mock_db.transaction.return_value
+        self.limiter = FirestoreRateLimiter('slack_ratelimits')
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_first_hit_creates_counter(self):
+        self.snapshot.exists = False
+        self.assertEqual(self.limiter.hit('U1', 2, 60), (True, None, False))
+        self.doc_ref.get.assert_called_once_with(transaction=self.transaction)
+        ref, state = self.transaction.set.call_args[0]
+        self.assertIs(ref, self.doc_ref)
+        self.assertEqual(state['count'], 1)
+        self.assertIsNone(state['blocked_until'])
+
+    def test_limit_reached_blocks(self):
+        self.snapshot.exists = True
+        self.snapshot.to_dict.return_value = {
+            'window_start': datetime.now(timezone.utc), 'count': 2, 'prev_count': 0, 'blocked_until': None
+        }
+        self.assertEqual(self.limiter.hit('U1', 2, 60), (False, 60, True))
+        self.assertIsNotNone(self.transaction.set.call_args[0][1]['blocked_until'])
+
+    def test_blocked_key_is_not_rewritten(self):
+        self.snapshot.exists = True
+        self.snapshot.to_dict.return_value = {
+            'window_start': datetime.now(timezone.utc), 'count': 0, 'prev_count': 0,
+            'blocked_until': datetime.now(timezone.utc) + timedelta(minutes=5)
+        }
+        allowed, retry_after, just_blocked = self.limiter.hit('U1', 2, 60)
+        self.assertFalse(allowed)
+        self.assertFalse(just_blocked)
+        self.assertGreater(retry_after, 290)
+        self.transaction.set.assert_not_called()
+
+    def test_fails_open_on_error(self):
+        self.doc_ref.get.side_effect = Exception("unavailable")
+        self.assertEqual(self.limiter.hit('U1', 2, 60), (True, None, False))
+
+class TestIngressRateLimits(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        index_rate_limiter.reset()
+        sms_rate_limiter.reset()
+        self.patchers = [
+            patch('app.ACCESS_PASSWORD', 'secret'),
+            patch('app.log_to_firestore'),
+            patch('app.enqueue_print_job'),
+            patch('app.is_number_whitelisted', return_value=True),
+        ]
+        for p in self.patchers:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    @patch('app.INDEX_RATE_LIMIT', 2)
+    def test_index_limited_by_ip(self):
+        for _ in range(2):
+            response = self.client.post('/', data={'password': 'wrong', 'message': 'Hi'})
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/', data={'password': 'secret', 'message': 'Hi'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(b"RATE_LIMITED", response.data)
+        self.assertIn('Retry-After', response.headers)
+
+        # A different client is unaffected
+        response = self.client.post('/', data={'password': 'secret', 'message': 'Hi'},
+                                    headers={'X-Forwarded-For': '10.0.0.2'})
+        self.assertEqual(response.status_code, 200)
+
+    @patch('app.SMS_RATE_LIMIT', 1)
+    def test_sms_limited_by_number(self):
+        response = self.client.post('/sms', data={'From': '+1234567890', 'Body': 'Hi'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/sms', data={'From': '+1234567890', 'Body': 'Hi'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_limits_disabled_by_default(self):
+        for _ in range(5):
+            response = self.client.post('/', data={'password': 'secret', 'message': 'Hi'})
+            self.assertEqual(response.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import MagicMock, patch, ANY
+import sys
+import threading
+from datetime import timedelta
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+from app import (app, parse_retention_rules, retention_days_for, retention_enabled, log_to_firestore,
+                 prune_history, run_retention_pruner, LOG_BUFFER)
+
+RULES = {'DENIED': 7, 'SUCCESS': 90, 'HA_ERR_*': 30, 'HA_ERR_5*': 3}
+
+class TestRetentionPolicy(unittest.TestCase):
+    def test_parse_rules(self):
+        self.assertEqual(parse_retention_rules(' DENIED=7, SUCCESS=90,,HA_ERR_*=30 '),
+                         {'DENIED': 7, 'SUCCESS': 90, 'HA_ERR_*': 30})
+        self.assertEqual(parse_retention_rules('DENIED=soon'), {})
+
+    @patch('app.RETENTION_RULES', RULES)
+    @patch('app.RETENTION_DAYS', 365)
+    def test_days_for_status(self):
+        self.assertEqual(retention_days_for('DENIED'), 7)
+        self.assertEqual(retention_days_for('HA_ERR_404'), 30)
+        # The longest matching prefix wins
+        self.assertEqual(retention_days_for('HA_ERR_503'), 3)
+        self.assertEqual(retention_days_for('CONN_FAIL'), 365)
+
+    def test_disabled_by_default(self):
+        self.assertFalse(retention_enabled())
+        self.assertEqual(retention_days_for('SUCCESS'), 0)
+
+class TestExpiresAt(unittest.TestCase):
+    def setUp(self):
+        LOG_BUFFER.clear()
+        self.patchers = [
+            patch('app.start_log_writer'),
+            patch('app.LOG_BUFFER_COND', threading.Condition()),
+            patch('app.RETENTION_RULES', RULES),
+        ]
+        for p in self.patchers:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        LOG_BUFFER.clear()
+
+    def test_expiry_follows_status_rule(self):
+        log_to_firestore('1.2.3.4', 'DENIED', 'Hi')
+        entry = LOG_BUFFER[0]
+        self.assertEqual(entry['expires_at'] - entry['timestamp'], timedelta(days=7))
+
+    def test_no_expiry_without_rule(self):
+        log_to_firestore('1.2.3.4', 'CONN_FAIL', 'Hi')
+        self.assertNotIn('expires_at', LOG_BUFFER[0])
+
+class TestPruner(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [patch('app.db'), patch('app.delete_query_results'), patch('app._count_query')]
+        self.mock_db, self.mock_delete, self.mock_count = [p.start() for p in self.patchers]
+        self.collection = self.mock_db.collection.return_value
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_prunes_expired_entries(self):
+        self.mock_delete.return_value = 3
+        self.assertEqual(prune_history(), {'expired': 3, 'over_count': 0})
+        self.collection.where.assert_called_once_with('expires_at', '<', ANY)
+        self.mock_delete.assert_called_once_with(self.collection.where.return_value)
+        self.mock_count.assert_not_called()
+
+    @patch('app.RETENTION_MAX_COUNT', 100)
+    def test_prunes_oldest_beyond_max_count(self):
+        self.mock_count.return_value = 130
+        self.mock_delete.side_effect = [0, 30]
+        self.assertEqual(prune_history(), {'expired': 0, 'over_count': 30})
+        self.collection.order_by.return_value.limit.assert_called_once_with(30)
+        self.mock_delete.assert_called_with(self.collection.order_by.return_value.limit.return_value)
+
+    @patch('app.RETENTION_MAX_COUNT', 100)
+    def test_under_max_count_deletes_nothing(self):
+        self.mock_count.return_value = 80
+        self.mock_delete.return_value = 0
+        self.assertEqual(prune_history(), {'expired': 0, 'over_count': 0})
+        self.assertEqual(self.mock_delete.call_count, 1)
+
+    def test_runs_are_reported(self):
+        self.mock_delete.return_value = 2
+        before = run_retention_pruner()['total_pruned']
+        stats = run_retention_pruner()
+        self.assertEqual(stats['last_expired'], 2)
+        self.assertEqual(stats['total_pruned'], before + 2)
+        self.assertIsNone(stats['last_error'])
+
+        self.mock_delete.side_effect = Exception("unavailable")
+        stats = run_retention_pruner()
+        self.assertEqual(stats['last_error'], 'unavailable')
+        self.assertEqual(stats['last_expired'], 0)
+
+    @patch('app.RETENTION_RULES', RULES)
+    def test_status_endpoint(self):
+        client = app.test_client()
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'):
+            self.assertEqual(client.get('/api/retention').status_code, 401)
+            data = client.get('/api/retention', headers={'X-Admin-Password': 'adminsecret'}).get_json()
+        self.assertTrue(data['policy']['enabled'])
+        self.assertEqual(data['policy']['rules']['DENIED'], 7)
+        self.assertIn('total_pruned', data['stats'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@ sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
 from app import app
+from helpers import page_with_assets
 
 class TestShakeAnimation(unittest.TestCase):
     def setUp(self):
@@ -18,7 +19,7 @@ class TestShakeAnimation(unittest.TestCase):
         """Verify that the shake animation CSS is present in the rendered HTML."""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for keyframes definition
         self.assertIn('@keyframes shake', html)
@@ -39,9 +40,9 @@ class TestShakeAnimation(unittest.TestCase):
         """Verify that the shake animation CSS is present in the History page HTML."""
         response = self.client.get('/history')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
-        # Since SHARED_CSS is used, it should be here too
+        # The shared stylesheet is linked here too
         self.assertIn('@keyframes shake', html)
         self.assertIn('animation: shake 0.4s', html)
 
@@ -11,11 +11,13 @@ sys.modules['google.cloud.firestore'] = MagicMock()
 sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
-from app import app, db
+from app import app, db, slack_rate_limiter
 
 class TestSlack(unittest.TestCase):
     def setUp(self):
         self.client = app.test_client()
+        # Rate limit state lives in memory between requests
+        slack_rate_limiter.reset()
         # Reset mocks
         db.collection.return_value.document.return_value.get.return_value.exists = False
         db.collection.return_value.document.return_value.get.return_value.to_dict.return_value = {}
@@ -25,6 +27,9 @@ class TestSlack(unittest.TestCase):
             patch('app.SLACK_MESSAGE_LIMIT', 2),
             patch('app.SLACK_LIMIT_PERIOD', 1),
             patch('app.WEBHOOK_URL', 'http://fake-printer'),
+            # One delivery attempt per job, with fresh circuit breakers
+            patch('app.WEBHOOK_RETRIES', 0),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
             patch('app.executor')
         ]
         self.started_patchers = []
@@ -81,17 +86,18 @@ class TestSlack(unittest.TestCase):
         self.assertEqual(args[0], 'http://response-url')
         self.assertEqual(args[2], 'Hello Printer')
 
-        # Check Firestore update (timestamps updated)
-        # Should set timestamps with one entry (now)
-        found_timestamps_update = False
+        # Check Firestore update (compact counter updated)
+        # Should set a count of one hit in the current window
+        found_counter_update = False
         for call in mock_doc_ref.set.call_args_list:
             args, _ = call
-            if 'timestamps' in args[0]:
-                found_timestamps_update = True
-                self.assertEqual(len(args[0]['timestamps']), 1)
+            if 'count' in args[0]:
+                found_counter_update = True
+                self.assertEqual(args[0]['count'], 1)
+                self.assertNotIn('timestamps', args[0])
                 break
 
-        self.assertTrue(found_timestamps_update, "Did not find update to timestamps")
+        self.assertTrue(found_counter_update, "Did not find update to counter")
 
     @patch('app.process_slack_async')
     def test_slack_event_api(self, mock_process_async):
@@ -213,8 +219,9 @@ class TestSlack(unittest.TestCase):
         self.assertIn(b"Sending to printer", response.data)
         mock_process_async.assert_called_once()
 
+    @patch('app.slack_http_session.post')
     @patch('app.http_session.post')
-    def test_process_slack_async_success(self, mock_post):
+    def test_process_slack_async_success(self, mock_post, mock_reply):
         """Test the async background worker function directly for success."""
         from app import process_slack_async
         
@@ -223,44 +230,42 @@ class TestSlack(unittest.TestCase):
         process_slack_async('http://response-url', 'http://webhook', 'message', 'Source')
         
         # Check webhook call
-        mock_post.assert_any_call('http://webhook', json={'message': 'message'}, timeout=10)
-        # Check response call
-        mock_post.assert_any_call('http://response-url', json={"text": "✅ Message sent to printer!", "response_type": "ephemeral"})
+        mock_post.assert_called_once_with('http://webhook', json={'message': 'message'}, timeout=10)
+        # Check response call, made through Slack's own connection pool
+        mock_reply.assert_called_once_with('http://response-url', json={"text": "✅ Message sent to printer!", "response_type": "ephemeral"}, timeout=10)
 
+    @patch('app.slack_http_session.post')
     @patch('app.http_session.post')
-    def test_process_slack_async_failure(self, mock_post):
+    def test_process_slack_async_failure(self, mock_post, mock_reply):
         """Test the async background worker function for webhook failure."""
         from app import process_slack_async
         
         # Webhook returns 500, Slack response returns 200
-        mock_post.side_effect = [
-            MagicMock(status_code=500),
-            MagicMock(status_code=200)
-        ]
+        mock_post.return_value = MagicMock(status_code=500)
+        mock_reply.return_value = MagicMock(status_code=200)
         
         process_slack_async('http://response-url', 'http://webhook', 'message', 'Source')
         
         # Verify Slack response indicates error
-        # We look at the second call to post
-        self.assertEqual(mock_post.call_count, 2)
-        args, kwargs = mock_post.call_args_list[1]
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(mock_reply.call_count, 1)
+        args, kwargs = mock_reply.call_args
         self.assertIn("❌ Error: 500", kwargs['json']['text'])
 
+    @patch('app.slack_http_session.post')
     @patch('app.http_session.post')
-    def test_process_slack_async_exception(self, mock_post):
+    def test_process_slack_async_exception(self, mock_post, mock_reply):
         """Test the async background worker function for connection exception."""
         from app import process_slack_async
         
         # Webhook raises exception
-        mock_post.side_effect = [
-            Exception("Connection failed"),
-            MagicMock(status_code=200)
-        ]
+        mock_post.side_effect = Exception("Connection failed")
+        mock_reply.return_value = MagicMock(status_code=200)
         
         process_slack_async('http://response-url', 'http://webhook', 'message', 'Source')
         
-        self.assertEqual(mock_post.call_count, 2)
-        args, kwargs = mock_post.call_args_list[1]
+        self.assertEqual(mock_post.call_count, 1)
+        args, kwargs = mock_reply.call_args
         self.assertIn("❌ Connection failed", kwargs['json']['text'])
 
 if __name__ == '__main__':
@@ -49,6 +49,9 @@ class TestSMS(unittest.TestCase):
             patch('app.SIGNALWIRE_FROM_NUMBER', 'fake_from'),
             patch('app.ACCESS_PASSWORD', 'secret'),
             patch('app.WEBHOOK_URL', 'http://fake-printer'),
+            # One delivery attempt per job, with fresh circuit breakers
+            patch('app.WEBHOOK_RETRIES', 0),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
             patch('app.executor')
         ]
         self.started_patchers = []
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import gzip
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import app, asset_url, register_asset, SHARED_CSS, SHARED_JS
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_pages_link_fingerprinted_assets(self):
+        css, js = asset_url('shared.css'), asset_url('shared.js')
+        self.assertRegex(css, r'^/assets/shared\.[0-9a-f]{12}\.css$')
+        self.assertRegex(js, r'^/assets/shared\.[0-9a-f]{12}\.js$')
+        for path in ('/', '/history', '/missing'):
+            html = self.client.get(path).data.decode('utf-8')
+            self.assertIn(f'<link rel="stylesheet" href="{css}">', html)
+            self.assertNotIn('@keyframes shake', html)
+        self.assertIn(f'<script src="{js}"></script>', self.client.get('/').data.decode('utf-8'))
+
+    def test_identity_response_is_cached_forever(self):
+        response = self.client.get(asset_url('shared.css'), headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertEqual(response.data.decode('utf-8'), SHARED_CSS)
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_gzip_variant(self):
+        with patch.dict(app_module.STATIC_ASSETS[asset_url('shared.js').rsplit('/', 1)[1]]['variants']) as variants:
+            variants.pop('br', None)
+            response = self.client.get(asset_url('shared.js'), headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data).decode('utf-8'), SHARED_JS)
+
+    @unittest.skipUnless(app_module.brotli, "brotli not installed")
+    def test_brotli_preferred(self):
+        response = self.client.get(asset_url('shared.js'), headers={'Accept-Encoding': 'gzip, deflate, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(app_module.brotli.decompress(response.data).decode('utf-8'), SHARED_JS)
+
+    def test_revalidation_returns_304(self):
+        url = asset_url('shared.css')
+        etag = self.client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_unknown_asset_is_404(self):
+        self.assertEqual(self.client.get('/assets/shared.000000000000.css').status_code, 404)
+
+    def test_fingerprint_follows_content(self):
+        with patch.dict(app_module.STATIC_ASSETS), patch.dict(app_module.ASSET_URLS):
+            register_asset('shared.css', SHARED_CSS + '\n.new-rule { color: red; }', 'text/css')
+            changed = asset_url('shared.css')
+            self.assertIn(b'.new-rule', self.client.get(changed, headers={'Accept-Encoding': 'identity'}).data)
+        self.assertNotEqual(changed, asset_url('shared.css'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
 from app import app, db
+from helpers import page_with_assets
 
 class TestUXEnhancement(unittest.TestCase):
     def setUp(self):
@@ -51,7 +52,7 @@ class TestUXEnhancement(unittest.TestCase):
         """Verify that the password toggle button and wrapper exist in the HTML."""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for the wrapper with relative positioning
         self.assertIn('style="position: relative;"', html)
@@ -78,7 +79,7 @@ class TestUXEnhancement(unittest.TestCase):
         """Verify the textarea resize behavior in CSS and auto-resize JS."""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for CSS changes
         self.assertIn('resize: none', html)
@@ -122,7 +123,7 @@ class TestUXEnhancement(unittest.TestCase):
         """Verify that :focus-visible styles are defined in CSS for keyboard accessibility."""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for the specific CSS rule we added
         self.assertIn('button:focus-visible, a:focus-visible', html)
@@ -132,7 +133,7 @@ class TestUXEnhancement(unittest.TestCase):
         """Verify that danger buttons have hover states and disabled states apply universally."""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for danger button hover state
         self.assertIn('.btn-danger:hover { background-color: var(--danger-hover); }', html)
@@ -144,7 +145,7 @@ class TestUXEnhancement(unittest.TestCase):
         """Verify that OS-aware keyboard shortcut logic exists in SHARED_JS."""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         self.assertIn("navigator.userAgent.toLowerCase().includes('mac')", html)
         self.assertIn("<kbd>⌘ Cmd</kbd> + <kbd>Enter</kbd>", html)
@@ -181,7 +182,7 @@ class TestUXEnhancement(unittest.TestCase):
         from app import ADMIN_PASSWORD
         response = self.client.post('/history', data={'admin_password': ADMIN_PASSWORD})
         self.assertEqual(response.status_code, 200)
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         # Check for sticky th
         self.assertIn('position: sticky; top: 0; z-index: 10;', html)
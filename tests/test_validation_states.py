@@ -9,6 +9,7 @@ sys.modules['signalwire'] = MagicMock()
 sys.modules['signalwire.rest'] = MagicMock()
 
 from app import app, ACCESS_PASSWORD
+from helpers import page_with_assets
 
 class TestValidationStates(unittest.TestCase):
     def setUp(self):
@@ -50,7 +51,7 @@ class TestValidationStates(unittest.TestCase):
 
     def test_js_listener_exists(self):
         response = self.client.get('/')
-        html = response.data.decode('utf-8')
+        html = page_with_assets(self.client, response)
 
         self.assertIn("this.classList.remove('input-error');", html)
         self.assertIn("this.removeAttribute('aria-invalid');", html)
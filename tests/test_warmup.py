@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import app, run_warmup, start_warmup, PAGE_CACHE
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.patchers = [
+            patch.dict('app.WARMUP_STATUS', {'state': 'pending', 'seconds': None, 'steps': {}}),
+            patch('app.db'),
+            patch('app.http_session'),
+            patch('app.get_signalwire_client'),
+            patch('app.WEBHOOK_URL', 'https://hooks.example.com/api/webhook/secret'),
+        ]
+        _, self.mock_db, self.mock_http, self.mock_signalwire, _ = [p.start() for p in self.patchers]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_steps_run_and_are_timed(self):
+        PAGE_CACHE.clear()
+        run_warmup()
+        self.mock_db.collection.return_value.limit.assert_called_once_with(1)
+        # Only the host is contacted, never the webhook path itself
+        self.mock_http.head.assert_called_once_with('https://hooks.example.com/', timeout=10)
+        self.mock_signalwire.assert_called_once()
+        self.assertTrue(any(key[0] == 'index.html' for key in PAGE_CACHE))
+
+        status = app_module.WARMUP_STATUS
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(list(status['steps']), ['firestore', 'webhook', 'signalwire', 'pages'])
+        self.assertTrue(all(step['ok'] and step['seconds'] >= 0 for step in status['steps'].values()))
+
+    def test_failed_step_does_not_stop_the_rest(self):
+        self.mock_db.collection.side_effect = Exception("unavailable")
+        run_warmup()
+        steps = app_module.WARMUP_STATUS['steps']
+        self.assertFalse(steps['firestore']['ok'])
+        self.assertTrue(steps['webhook']['ok'])
+        self.assertEqual(app_module.WARMUP_STATUS['state'], 'done')
+
+    def test_healthz_waits_for_warmup(self):
+        release = threading.Event()
+        self.mock_db.collection.side_effect = lambda name: release.wait(5) and MagicMock()
+        with patch('app.WARMUP', True):
+            thread = start_warmup()
+            response = self.client.get('/healthz')
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(response.get_json()['ready'])
+            release.set()
+            thread.join(5)
+            response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(data['ready'])
+        self.assertIn('webhook', data['warmup']['steps'])
+        self.assertNotIn('secret', response.get_data(as_text=True))
+
+    def test_healthz_ready_when_disabled(self):
+        with patch('app.WARMUP', False):
+            self.assertEqual(self.client.get('/healthz').status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
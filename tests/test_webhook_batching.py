@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import asyncio
+import sys
+import threading
+import time
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import (app, deliver_message, deliver_message_async, _take_batch,
+                 process_slack_async, WebhookCircuitOpen)
+
+class TestWebhookBatching(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [
+            patch('app.WEBHOOK_BATCH_WINDOW_MS', 100),
+            patch('app.WEBHOOK_BATCH_MAX', 20),
+            patch('app.WEBHOOK_BATCH_MAX_BYTES', 16 * 1024),
+            patch('app.WEBHOOK_RETRIES', 0),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
+            patch.dict('app.WEBHOOK_BATCH_STATS', {'batches': 0, 'messages': 0, 'max_batch': 0}),
+            patch('app.http_session.post'),
+        ]
+        self.mock_post = [p.start() for p in self.patchers][-1]
+        self.mock_post.return_value = MagicMock(status_code=200)
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def deliver_concurrently(self, messages):
+        results = {}
+
+        def worker(msg):
+            try:
+                results[msg] = deliver_message('http://printer', msg)
+            except Exception as e:
+                results[msg] = e
+        threads = [threading.Thread(target=worker, args=(m,)) for m in messages]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_burst_is_sent_as_one_payload(self):
+        messages = [f'Message {i}' for i in range(10)]
+        results = self.deliver_concurrently(messages)
+        self.mock_post.assert_called_once()
+        args, kwargs = self.mock_post.call_args
+        self.assertEqual(args[0], 'http://printer')
+        self.assertEqual(sorted(kwargs['json']['messages']), sorted(messages))
+        self.assertTrue(all(r.status_code == 200 for r in results.values()))
+        self.assertEqual(app_module.WEBHOOK_BATCH_STATS['max_batch'], 10)
+
+    def test_batches_are_capped_by_count(self):
+        with patch('app.WEBHOOK_BATCH_MAX', 4):
+            self.deliver_concurrently([f'Message {i}' for i in range(10)])
+        sizes = [len(c.kwargs['json']['messages']) for c in self.mock_post.call_args_list]
+        self.assertEqual(sum(sizes), 10)
+        self.assertTrue(all(size <= 4 for size in sizes))
+
+    def test_take_batch_respects_bytes(self):
+        pending = [(f'm{i}', 10, 0, None) for i in range(5)]
+        with patch('app.WEBHOOK_BATCH_MAX_BYTES', 25):
+            self.assertEqual(len(_take_batch(pending)), 2)
+        self.assertEqual(len(pending), 3)
+        # An oversized message still goes out, alone
+        pending = [('big', 100, 0, None), ('small', 1, 0, None)]
+        with patch('app.WEBHOOK_BATCH_MAX_BYTES', 25):
+            self.assertEqual(_take_batch(pending), [('big', 100, 0, None)])
+
+    def test_failure_fans_out_to_every_message(self):
+        self.mock_post.side_effect = Exception("refused")
+        results = self.deliver_concurrently(['a', 'b', 'c'])
+        self.assertEqual(self.mock_post.call_count, 1)
+        self.assertTrue(all(str(r) == 'refused' for r in results.values()))
+
+    def test_open_breaker_reaches_each_job(self):
+        with patch('app.BREAKER_THRESHOLD', 1):
+            self.mock_post.return_value = MagicMock(status_code=500)
+            self.deliver_concurrently(['a'])
+            results = self.deliver_concurrently(['b', 'c'])
+        self.assertTrue(all(isinstance(r, WebhookCircuitOpen) for r in results.values()))
+
+    def test_slow_destination_does_not_hold_up_others(self):
+        release = threading.Event()
+
+        def post(url, **kwargs):
+            if url == 'http://slow':
+                release.wait(5)
+            return MagicMock(status_code=200)
+        self.mock_post.side_effect = post
+        slow = threading.Thread(target=deliver_message, args=('http://slow', 'a'))
+        slow.start()
+        time.sleep(0.2)
+        start = time.monotonic()
+        self.assertEqual(deliver_message('http://fast', 'b').status_code, 200)
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        slow.join(5)
+
+    def test_wait_for_batch_times_out(self):
+        release = threading.Event()
+
+        def post(url, **kwargs):
+            release.wait(5)
+            return MagicMock(status_code=200)
+        self.mock_post.side_effect = post
+        with patch('app.WEBHOOK_BATCH_WAIT', 0.3):
+            results = self.deliver_concurrently(['a'])
+            # 'b' queues behind the batch still in flight and is withdrawn once its wait runs out
+            results.update(self.deliver_concurrently(['b']))
+        release.set()
+        time.sleep(0.3)
+        self.assertEqual(str(results['a']), 'No webhook reply within 0.3s')
+        self.assertEqual(str(results['b']), 'Webhook batch not sent within 0.3s')
+        self.assertEqual([c.kwargs['json']['messages'] for c in self.mock_post.call_args_list], [['a']])
+
+    def test_results_reach_slack_replies(self):
+        self.mock_post.return_value = MagicMock(status_code=503)
+        with patch('app.log_to_firestore') as mock_log, patch('app.slack_http_session.post') as mock_reply:
+            process_slack_async('http://slack/reply', 'http://printer', 'Hi', 'Slack: bob')
+        mock_log.assert_called_once_with('Slack: bob', 'HA_ERR_503', 'Hi')
+        mock_reply.assert_called_once_with('http://slack/reply', json={"text": "❌ Error: 503", "response_type": "ephemeral"}, timeout=10)
+
+    def test_async_waits_without_a_thread(self):
+        async def burst():
+            return await asyncio.gather(*(deliver_message_async('http://printer', f'm{i}') for i in range(30)))
+        results = asyncio.run(burst())
+        self.assertEqual(len(results), 30)
+        self.assertLessEqual(self.mock_post.call_count, 2)
+
+    def test_disabled_by_default_posts_single_message(self):
+        with patch('app.WEBHOOK_BATCH_WINDOW_MS', 0):
+            deliver_message('http://printer', 'Hi')
+        self.mock_post.assert_called_once_with('http://printer', json={"message": 'Hi'}, timeout=10)
+
+    def test_health_reports_batching(self):
+        self.deliver_concurrently(['a', 'b'])
+        client = app.test_client()
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'):
+            data = client.get('/api/webhook-health', headers={'X-Admin-Password': 'adminsecret'}).get_json()
+        self.assertEqual(data['batching']['messages'], 2)
+        self.assertEqual(data['batching']['window_ms'], 100)
+        self.assertEqual(data['batching']['pending'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import asyncio
+import sys
+import threading
+import time
+
+# Mock dependencies before importing app
+sys.modules['google.cloud'] = MagicMock()
+sys.modules['google.cloud.firestore'] = MagicMock()
+sys.modules['signalwire'] = MagicMock()
+sys.modules['signalwire.rest'] = MagicMock()
+
+import app as app_module
+from app import (app, CircuitBreaker, WebhookCircuitOpen, backoff_delay, deliver_webhook, deliver_webhook_async,
+                 get_breaker, redact_url, process_print_async)
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_half_opens_after_cooldown(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=10)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.status()['state'], 'open')
+        self.assertGreater(breaker.retry_after(), 9)
+
+        with patch('app.time.monotonic', return_value=time.monotonic() + 11):
+            # Exactly one trial call is let through
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+        self.assertEqual(breaker.status(), {'state': 'closed', 'consecutive_failures': 0, 'times_opened': 1, 'rejected': 2})
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=10)
+        breaker.record_failure()
+        with patch('app.time.monotonic', return_value=time.monotonic() + 11):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.status()['times_opened'], 2)
+
+    def test_zero_threshold_never_opens(self):
+        breaker = CircuitBreaker(threshold=0, cooldown=10)
+        for _ in range(100):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def test_backoff_is_capped_full_jitter(self):
+        with patch('app.WEBHOOK_BACKOFF_MS', 500), patch('app.WEBHOOK_BACKOFF_MAX_MS', 2000):
+            with patch('app.random.uniform', side_effect=lambda low, high: high):
+                self.assertEqual([backoff_delay(n) for n in range(4)], [0.5, 1.0, 2.0, 2.0])
+            with patch('app.random.uniform', side_effect=lambda low, high: low):
+                self.assertEqual(backoff_delay(3), 0)
+
+    def test_redacts_webhook_path(self):
+        self.assertEqual(redact_url('https://hooks.nabucasa.com/secret-id'), 'https://hooks.nabucasa.com/…')
+
+class TestDelivery(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [
+            patch('app.WEBHOOK_RETRIES', 2),
+            patch('app.BREAKER_THRESHOLD', 3),
+            patch('app.backoff_delay', return_value=0),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
+            patch('app.http_session.post'),
+        ]
+        self.mock_post = [p.start() for p in self.patchers][-1]
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_retries_transient_errors(self):
+        self.mock_post.side_effect = [Exception("reset"), MagicMock(status_code=503), MagicMock(status_code=200)]
+        self.assertEqual(deliver_webhook('http://printer', {'message': 'Hi'}).status_code, 200)
+        self.assertEqual(self.mock_post.call_count, 3)
+        self.assertEqual(get_breaker('http://printer').status()['state'], 'closed')
+
+    def test_client_errors_are_not_retried(self):
+        self.mock_post.return_value = MagicMock(status_code=404)
+        self.assertEqual(deliver_webhook('http://printer', {}).status_code, 404)
+        self.assertEqual(self.mock_post.call_count, 1)
+
+    def test_gives_up_after_retries(self):
+        self.mock_post.side_effect = Exception("refused")
+        with patch('app.log_to_firestore') as mock_log:
+            process_print_async('1.2.3.4', 'http://printer', 'Hi')
+        mock_log.assert_called_once_with('1.2.3.4', 'CONN_FAIL', 'refused')
+        self.assertEqual(self.mock_post.call_count, 3)
+
+    def test_open_breaker_fails_fast(self):
+        self.mock_post.return_value = MagicMock(status_code=500)
+        self.assertEqual(deliver_webhook('http://printer', {}).status_code, 500)
+        self.mock_post.reset_mock()
+        with self.assertRaises(WebhookCircuitOpen):
+            deliver_webhook('http://printer', {})
+        self.mock_post.assert_not_called()
+        # Breakers are tracked per URL
+        self.assertEqual(deliver_webhook('http://other-printer', {}).status_code, 500)
+
+    def test_async_delivery_shares_breaker(self):
+        http = MagicMock()
+        http.post = AsyncMock(side_effect=[MagicMock(status_code=502), MagicMock(status_code=200)])
+        with patch('app.async_http', http):
+            r = asyncio.run(deliver_webhook_async('http://printer', {'message': 'Hi'}))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(http.post.await_count, 2)
+        self.assertEqual(get_breaker('http://printer').status()['consecutive_failures'], 0)
+
+class TestParking(unittest.TestCase):
+    def setUp(self):
+        app_module.open_print_queue(':memory:')
+        self.patchers = [
+            patch('app.WEBHOOK_RETRIES', 0),
+            patch('app.BREAKER_THRESHOLD', 1),
+            patch('app.BREAKER_COOLDOWN', 0.2),
+            patch.dict('app.WEBHOOK_BREAKERS', clear=True),
+            patch.dict('app.PARKED_JOBS', clear=True),
+            patch.dict('app.PARKED_TRIALS', clear=True),
+            patch('app.log_to_firestore'),
+            patch('app.executor'),
+            patch('app.http_session.post'),
+        ]
+        started = [p.start() for p in self.patchers]
+        self.mock_log, self.mock_executor, self.mock_post = started[-3:]
+        self.mock_executor.submit.side_effect = lambda fn, *args: fn(*args)
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+
+    def test_jobs_are_parked_while_open_and_delivered_on_recovery(self):
+        self.mock_post.return_value = MagicMock(status_code=500)
+        app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', 'First')
+        self.mock_log.assert_called_once_with('1.2.3.4', 'HA_ERR_500', 'First')
+
+        # The webhook is not called while the breaker is open; the job stays spooled
+        self.mock_post.reset_mock()
+        self.mock_post.return_value = MagicMock(status_code=200)
+        app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', 'Second')
+        self.mock_post.assert_not_called()
+        self.assertEqual(app_module.get_parked_jobs(), 1)
+        self.assertEqual(app_module.get_print_queue_depth(), 1)
+
+        deadline = time.time() + 2
+        while app_module.get_print_queue_depth() and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(app_module.get_print_queue_depth(), 0)
+        self.assertEqual(app_module.get_parked_jobs(), 0)
+        self.mock_log.assert_called_with('1.2.3.4', 'SUCCESS', 'Second')
+
+    def wait_for_empty_queue(self):
+        deadline = time.time() + 3
+        while app_module.get_print_queue_depth() and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(app_module.get_print_queue_depth(), 0)
+
+    def test_one_trial_then_release_without_a_thread_per_job(self):
+        self.mock_post.return_value = MagicMock(status_code=500)
+        app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', 'Opens the breaker')
+        threads = threading.active_count()
+        self.mock_post.reset_mock()
+        self.mock_post.return_value = MagicMock(status_code=200)
+        for i in range(50):
+            app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', f'Parked {i}')
+        self.assertEqual(app_module.get_parked_jobs(), 50)
+        # At most the one scheduler thread, however many jobs are parked
+        self.assertLessEqual(threading.active_count(), threads + 1)
+
+        self.wait_for_empty_queue()
+        # Each job reached the webhook once, and none were turned away again after the cooldown
+        self.assertEqual(self.mock_post.call_count, 50)
+        self.assertEqual(get_breaker('http://printer').status()['rejected'], 50)
+
+    def test_failed_trial_waits_for_next_cooldown(self):
+        self.mock_post.return_value = MagicMock(status_code=500)
+        app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', 'Opens the breaker')
+        for i in range(5):
+            app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer', f'Parked {i}')
+        self.mock_post.reset_mock()
+        self.mock_post.side_effect = [MagicMock(status_code=500)] + [MagicMock(status_code=200)] * 4
+        self.wait_for_empty_queue()
+        # The first trial failed and was logged; the second closed the breaker for the rest
+        self.assertEqual(self.mock_post.call_count, 5)
+        self.assertEqual(get_breaker('http://printer').status()['times_opened'], 2)
+
+    def test_health_endpoint(self):
+        self.mock_post.return_value = MagicMock(status_code=500)
+        app_module.enqueue_print_job('print', '1.2.3.4', 'http://printer/secret', 'Hi')
+        client = app.test_client()
+        with patch('app.ADMIN_PASSWORD', 'adminsecret'):
+            self.assertEqual(client.get('/api/webhook-health').status_code, 401)
+            data = client.get('/api/webhook-health', headers={'X-Admin-Password': 'adminsecret'}).get_json()
+        self.assertEqual(data['webhooks'][0]['url'], 'http://printer/…')
+        self.assertEqual(data['webhooks'][0]['state'], 'open')
+        self.assertIn('retry_after', data['webhooks'][0])
+        self.assertEqual(data['parked_jobs'], 0)
+
+if __name__ == '__main__':
+    unittest.main()